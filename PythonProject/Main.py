@@ -1,14 +1,59 @@
+import atexit
 from threading import Thread
-from etl_worker import ETLWorker
 from metrics_api import MetricsAPI
-#from metrics import CollectMetrics
+from search_index import SearchIndex
+from metrics import CollectMetrics
+from query_registry import QueryRegistry
 #from 'MongoDB Connection'.mongodb_connection import MongoInsert
 
-etl_worker = ETLWorker()
-api_server = MetricsAPI(r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\logs\metrics_log.json")
+HISTORY_PATH = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\logs\metrics_history.bin"
+SEARCH_DIR = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\search"
+SNAPSHOT_DIR = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\snapshot"
 
 
-Thread(target=etl_worker.run, daemon=True).start()
+def sql_server_sink():
+    # imported on first use, like run_etl, so the API starts without loading the ETL
+    from etl_worker import ETLWorker
+    from sinks import SqlServerSink
+    return SqlServerSink(ETLWorker.CONNECTION_STRING)
+
+
+def run_etl():
+    # imported in the ETL thread, so the API is serving while the ETL loads and warms its SeenIndex
+    from etl_worker import ETLWorker
+    from seen_index import SeenIndex
+    from spool import Spool
+    from metrics_history import MetricsHistory
+    from stats_refresh import StatsRefresher
+    from snapshot_export import SnapshotExporter
+    from sinks import SnapshotSink, StatsSink
+    etl_worker = ETLWorker(batch_size=25, fetch_workers=4, load_workers=1, queue_depth=100,
+                           seen=SeenIndex(bloom_videos=True),
+                           spool=Spool(r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\spool"),
+                           history=MetricsHistory(HISTORY_PATH), search_index=search_index)
+    sink = etl_worker.connect()
+    can_refresh, can_export = isinstance(sink, StatsSink), isinstance(sink, SnapshotSink)
+    sink.close()
+    if can_refresh:
+        # re-reads view/like counts of stored videos from its own hourly budget, pausing while discovery backs off
+        refresher = StatsRefresher(sink_factory=etl_worker.sink_factory, requests_per_hour=600,
+                                   yield_to=etl_worker.query_scheduler().budget)
+        Thread(target=refresher.run, daemon=True).start()
+    if can_export:
+        # appends the new rows to the columnar snapshot that /metrics/snapshot computes over
+        exporter = SnapshotExporter(SNAPSHOT_DIR, sink_factory=etl_worker.sink_factory)
+        Thread(target=exporter.run, kwargs={"every": 300}, daemon=True).start()
+    etl_worker.run_pipelined()
+
+
+search_index = SearchIndex(SEARCH_DIR)  # shared: the ETL adds to it, the API serves /search
+atexit.register(search_index.close)  # flush the buffered videos
+# /metrics/sql: the database/*.sql figures, at most one run of each query per 30 seconds
+collector = CollectMetrics(QueryRegistry(sql_server_sink, pool_size=2, ttl=30))
+api_server = MetricsAPI(r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\logs\metrics_log.json",
+                        history_file=HISTORY_PATH, search_index=search_index, snapshot_dir=SNAPSHOT_DIR,
+                        collector=collector)
+
+Thread(target=run_etl, daemon=True).start()
 api_server.run()
-#CollectMetrics.run()
 #MongoInsert.run()
\ No newline at end of file
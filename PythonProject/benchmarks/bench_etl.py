@@ -0,0 +1,313 @@
+"""
+End-to-end ETL throughput without network or SQL Server: YTSearch runs against a YoutubeDL whose
+extract_info replays the payloads in fixtures/extract_info.json (ids, titles and counters are varied so
+every record is new), and ETLWorker loads the records into a SQLiteSink.
+
+    python benchmarks/bench_etl.py --records 100000 --batch-size 25 --output bench.json
+    python benchmarks/bench_etl.py --records 100000 --compare bench.json
+
+Reports records/sec, per record latency (from the start of its extraction to the commit of its batch),
+database round trips per record, peak RSS and the time spent per stage, as JSON. --keep-raw measures
+records that carry the full sanitized info dict. --compare exits with
+status 1 when a metric got worse than the baseline by more than --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yt_dlp
+from etl_worker import ETLWorker
+from query_scheduler import QueryScheduler, RequestBudget
+from seen_index import SeenIndex
+from sinks import SQLiteSink
+from yt_search import YTSearch, YoutubeDLPool
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FIXTURE_PATH = Path(__file__).resolve().parent / "fixtures" / "extract_info.json"
+CATEGORIES = ["Film & Animation", "Autos & Vehicles", "Music", "Pets & Animals", "Sports", "Travel & Events",
+              "Gaming", "People & Blogs", "Comedy", "Entertainment", "News & Politics", "Howto & Style",
+              "Education", "Science & Technology", "Nonprofits & Activism"]
+TAGS = ["family", "birthday", "vlog", "school", "project", "tutorial", "draft", "upload", "test", "trip",
+        "wedding", "recital", "game", "practice", "review", "demo", "lecture", "meeting", "party", "holiday"]
+# (metric, True when higher is better) for --compare
+COMPARED = [("records_per_sec", True), ("latency_ms.p50", False), ("latency_ms.p99", False),
+            ("round_trips_per_record", False), ("peak_rss_mb", False)]
+
+
+class Corpus:
+    """
+    Synthetic YouTube built from the recorded payloads: every search returns playlists_per_search new
+    playlists, every playlist videos_per_playlist new videos, playlists_per_channel playlists share a channel.
+    """
+    def __init__(self, fixture_path: Path, playlists_per_search: int = 20, videos_per_playlist: int = 25,
+                 playlists_per_channel: int = 4, first_playlist: int = 0):
+        with open(fixture_path, "r", encoding="utf-8") as f:
+            fixtures = json.load(f)
+        self.search_template = fixtures["search"]
+        self.playlist_template = fixtures["playlist"]
+        # kept serialized so every call pays for parsing a fresh response, as a real extraction does
+        self.video_blob = json.dumps(fixtures["video"])
+        self.playlists_per_search = playlists_per_search
+        self.videos_per_playlist = videos_per_playlist
+        self.playlists_per_channel = playlists_per_channel
+        self.next_playlist = first_playlist
+
+    @staticmethod
+    def video_id(n: int) -> str:
+        return f"v{n:010d}"
+
+    def channel_id(self, playlist_n: int) -> str:
+        return f"UC{playlist_n // self.playlists_per_channel:022d}"
+
+    def extract(self, url: str) -> dict:
+        if "search_query=" in url:
+            return self.search_page()
+        if "list=PL" in url:
+            return self.playlist_page(int(url.rsplit("list=PL", 1)[1]))
+        return self.video_page(int(url.rsplit("v=v", 1)[1]))
+
+    def search_page(self) -> dict:
+        entry = self.search_template["entries"][0]
+        entries = []
+        for playlist_n in range(self.next_playlist, self.next_playlist + self.playlists_per_search):
+            playlist_id = f"PL{playlist_n:032d}"
+            entries.append({**entry, "id": playlist_id, "url": f"https://www.youtube.com/playlist?list={playlist_id}",
+                            "title": f"Playlist {playlist_n}", "channel_id": self.channel_id(playlist_n)})
+        self.next_playlist += self.playlists_per_search
+        return {**self.search_template, "entries": entries}
+
+    def playlist_page(self, playlist_n: int) -> dict:
+        entry = self.playlist_template["entries"][0]
+        first = playlist_n * self.videos_per_playlist
+        entries = [{**entry, "id": self.video_id(n), "url": f"https://www.youtube.com/watch?v={self.video_id(n)}",
+                    "title": f"Video {n}", "playlist_index": n - first + 1}
+                   for n in range(first, first + self.videos_per_playlist)]
+        return {**self.playlist_template, "id": f"PL{playlist_n:032d}", "title": f"Playlist {playlist_n}",
+                "channel_id": self.channel_id(playlist_n), "entries": entries}
+
+    def video_page(self, n: int) -> dict:
+        video = json.loads(self.video_blob)
+        channel_id = self.channel_id(n // self.videos_per_playlist)
+        video.update({
+            "id": self.video_id(n), "title": f"Video {n}", "display_id": self.video_id(n),
+            "webpage_url": f"https://www.youtube.com/watch?v={self.video_id(n)}",
+            "channel_id": channel_id, "channel_url": f"https://www.youtube.com/channel/{channel_id}",
+            "channel": f"Channel {channel_id[-6:]}", "uploader": f"Channel {channel_id[-6:]}",
+            "duration": 30 + n * 37 % 3600, "view_count": n * 7919 % 250000, "like_count": n * 131 % 5000,
+            "upload_date": f"20{10 + n % 14:02d}{1 + n % 12:02d}{1 + n % 28:02d}",
+            "categories": [CATEGORIES[n % len(CATEGORIES)]],
+            "tags": [TAGS[(n + k * 3) % len(TAGS)] for k in range(n % 6)],
+        })
+        return video
+
+
+class ReplayYoutubeDL(yt_dlp.YoutubeDL):
+    corpus: Corpus = None
+
+    def extract_info(self, url, download=True, *args, **kwargs):
+        return self.corpus.extract(url)
+
+
+class CountingCursor:
+    """Counts execute/executemany calls, i.e. the round trips a client/server database would see."""
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.calls = 0
+
+    def execute(self, *args):
+        self.calls += 1
+        return self.cursor.execute(*args)
+
+    def executemany(self, *args):
+        self.calls += 1
+        return self.cursor.executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class StageTimer:
+    def __init__(self):
+        self.totals = {}
+
+    def wrap(self, stage: str, func):
+        self.totals.setdefault(stage, 0.0)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.totals[stage] += time.perf_counter() - start
+        return timed
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(records: int, batch_size: int, metrics_every: int, db_path: str, bloom: bool,
+                  playlists_per_search: int, videos_per_playlist: int, keep_raw: bool = False) -> dict:
+    ReplayYoutubeDL.corpus = Corpus(FIXTURE_PATH, playlists_per_search, videos_per_playlist)
+    timer = StageTimer()
+    events = []
+    work_dir = os.path.dirname(os.path.abspath(db_path))
+
+    worker = ETLWorker(batch_size=batch_size, metrics_every=metrics_every, seen=SeenIndex(bloom_videos=bloom),
+                       sink_factory=lambda: SQLiteSink(db_path))
+    worker.METRICS_PATH = os.path.join(work_dir, "bench_metrics.json")
+    worker.events = lambda error_msg, values: events.append(error_msg)
+    worker.write_metrics = timer.wrap("write_metrics", worker.write_metrics)
+    load = timer.wrap("load", worker.load)
+    sink = worker.connect()
+    sink.cursor = CountingCursor(sink.cursor)
+
+    search = YTSearch(pool=YoutubeDLPool({}), seen=worker.seen, keep_raw=keep_raw,
+                      scheduler=QueryScheduler(budget=RequestBudget(None)))  # measures the ETL, not the budget
+    search.pool = YoutubeDLPool({"flat": {**search.COMMON_YTDLP_OPTS, "extract_flat": True},
+                                 "full": search.COMMON_YTDLP_OPTS}, factory=ReplayYoutubeDL)
+    build_record = YTSearch.build_record
+    YTSearch.build_record = staticmethod(timer.wrap("build_record", build_record))
+
+    latencies = []
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            worker.warm(sink)
+            setup_calls = sink.cursor.calls
+            records_iter = search.iter_video_metadata()
+            batch, batch_starts = [], []
+            started = time.perf_counter()
+            fetch_time = 0.0
+            for _ in range(records):
+                record_start = time.perf_counter()
+                record = next(records_iter)
+                fetch_time += time.perf_counter() - record_start
+                batch.append(record)
+                batch_starts.append(record_start)
+                if len(batch) >= batch_size:
+                    load(batch, sink)
+                    done = time.perf_counter()
+                    latencies.extend(done - start for start in batch_starts)
+                    batch, batch_starts = [], []
+            if batch:
+                load(batch, sink)
+                done = time.perf_counter()
+                latencies.extend(done - start for start in batch_starts)
+            elapsed = time.perf_counter() - started
+    finally:
+        YTSearch.build_record = staticmethod(build_record)
+        search.pool.close()
+
+    stored = sink.conn.execute("SELECT COUNT(*) FROM Video").fetchone()[0]
+    round_trips = sink.cursor.calls - setup_calls
+    sink.close()
+    latencies.sort()
+    stages = {
+        "extract": fetch_time - timer.totals["build_record"],
+        "build_record": timer.totals["build_record"],
+        "load": timer.totals["load"] - timer.totals["write_metrics"],
+        "write_metrics": timer.totals["write_metrics"],
+    }
+    return {
+        "records": records,
+        "stored_videos": stored,
+        "elapsed_s": round(elapsed, 3),
+        "records_per_sec": round(records / elapsed, 1),
+        "latency_ms": {key: round(percentile(latencies, pct) * 1000, 3)
+                       for key, pct in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))},
+        "round_trips_per_record": round(round_trips / records, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages_s": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+        "events": len(events),
+    }
+
+
+def lookup(result: dict, dotted: str):
+    for key in dotted.split("."):
+        if not isinstance(result, dict):
+            return None
+        result = result.get(key)
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for metric, higher_is_better in COMPARED:
+        new, old = lookup(result, metric), lookup(baseline, metric)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append(f"{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline ETL benchmark against a local SQLite database.")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--metrics-every", type=int, default=5)
+    parser.add_argument("--playlists-per-search", type=int, default=20)
+    parser.add_argument("--videos-per-playlist", type=int, default=25)
+    parser.add_argument("--bloom", action="store_true", help="SeenIndex with a BloomFilter for videos")
+    parser.add_argument("--keep-raw", action="store_true", help="records carry the full info dict (YTSearch keep_raw)")
+    parser.add_argument("--db", default=None, help="SQLite file to load into (default: a fresh temp file)")
+    parser.add_argument("--output", default=None, help="write the JSON result here as well as to stdout")
+    parser.add_argument("--compare", default=None, help="baseline JSON from an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression (default 10%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run_benchmark(args.records, args.batch_size, args.metrics_every,
+                               args.db or os.path.join(tmp, "bench.db"), args.bloom,
+                               args.playlists_per_search, args.videos_per_playlist, args.keep_raw)
+    report = {
+        "benchmark": "etl",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "tolerance")},
+        **result,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,88 @@
+"""
+Caller-side cost of ETLWorker.events: the old implementation (open events.txt in append mode, write
+the message and the values, close, for every event) against EventLog.log, for a re-discovery burst
+where most events are duplicate key errors and a few are other failures.
+
+    python benchmarks/bench_events.py --events 50000 --duplicate-share 0.95
+
+Prints one JSON object with per-call latency percentiles (microseconds), total caller time and the
+number of lines and bytes written.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from event_log import EventLog
+
+DUPLICATE = ("Violation of PRIMARY KEY constraint 'PK__Video__5D0F8C5A'. Cannot insert duplicate key in object "
+             "'dbo.Video'. The duplicate key value is ({}).")
+OTHER = "String or binary data would be truncated in table 'BD_Project.dbo.Video', column 'V_Title'. ({})"
+
+
+def open_per_event(path: str):
+    def events(error_msg: str, values: list):
+        with open(path, "a", encoding="utf-8") as event:
+            event.write(error_msg + "\n")
+            event.write(f"{values}\n")
+    return events
+
+
+def run(mode: str, messages: list[tuple[str, list]], directory: str) -> dict:
+    path = os.path.join(directory, f"{mode}.log")
+    event_log = EventLog(path, capacity=len(messages)) if mode == "event_log" else None
+    log = event_log.log if event_log else open_per_event(path)
+    latencies = []
+    start = time.perf_counter()
+    for message, values in messages:
+        call_start = time.perf_counter()
+        log(message, values)
+        latencies.append(time.perf_counter() - call_start)
+    caller_s = time.perf_counter() - start
+    if event_log:
+        event_log.close()
+    drained_s = time.perf_counter() - start
+    latencies.sort()
+    with open(path, encoding="utf-8") as f:
+        lines = sum(1 for _ in f)
+    return {
+        "mode": mode,
+        "p50_us": round(statistics.median(latencies) * 1e6, 2),
+        "p99_us": round(latencies[int(len(latencies) * 0.99) - 1] * 1e6, 2),
+        "max_us": round(latencies[-1] * 1e6, 2),
+        "caller_s": round(caller_s, 3),
+        "until_written_s": round(drained_s, 3),
+        "lines": lines,
+        "bytes": os.path.getsize(path),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Old per-event file writes vs. EventLog.")
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--duplicate-share", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    messages = []
+    for n in range(args.events):
+        video_id = f"vid{n:08d}"
+        template = DUPLICATE if random.random() < args.duplicate_share else OTHER
+        messages.append((template.format(video_id), [video_id]))
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run(mode, messages, tmp) for mode in ("open_per_event", "event_log")]
+
+    report = {"benchmark": "events", "params": vars(args), "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
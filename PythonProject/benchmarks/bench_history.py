@@ -0,0 +1,94 @@
+"""
+Cost of MetricsHistory: appending a snapshot, and /metrics/history-style queries over a full ring
+(default: 30 days at one sample per 10 s) at a few bucket sizes, compared with reading back the same
+samples as JSON lines, i.e. what appending to metrics_log.json would cost to query.
+
+    python benchmarks/bench_history.py --days 30 --interval 10
+
+Prints one JSON object with the median milliseconds per operation.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics_history import MetricsHistory
+
+
+def snapshot(i: int) -> dict:
+    return {
+        "video_count": 1000 + i, "channel_count": 300 + i // 3, "playlist_count": 50 + i // 20,
+        "avg_video_duration": random.uniform(200, 900), "avg_video_views": random.uniform(0, 5000),
+        "avg_video_likes": random.uniform(0, 50), "avg_playlist_duration": random.uniform(1000, 9000),
+        "longest_playlist": {"P_ID": "PL", "total_duration": 90000}, "top_video_by_views": {"V_Views": 10 ** 7},
+        "top_video_by_likes": {"V_Likes": 10 ** 5}, "top_video_by_duration": {"V_Duration": 36000},
+        "top_channel_by_videos": {"C_ID": "UC", "video_count": 400},
+    }
+
+
+def median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MetricsHistory append and query costs.")
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between samples")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    random.seed(1)
+    retention = args.days * 86400
+    with tempfile.TemporaryDirectory() as tmp:
+        history = MetricsHistory(os.path.join(tmp, "history.bin"), retention_s=retention, min_interval=args.interval)
+        jsonl_path = os.path.join(tmp, "history.jsonl")
+        now = time.time()
+        first = now - retention
+        start = time.perf_counter()
+        with open(jsonl_path, "w", encoding="utf-8") as jsonl:
+            for i in range(history.capacity):
+                metrics = snapshot(i)
+                history.append(metrics, first + i * args.interval)
+                jsonl.write(json.dumps({"t": first + i * args.interval, **metrics}) + "\n")
+        fill_s = time.perf_counter() - start
+
+        def query_jsonl():
+            with open(jsonl_path, encoding="utf-8") as f:
+                return [json.loads(line) for line in f]
+
+        later = (now + n * args.interval for n in range(1, 10 ** 9))
+        reader = MetricsHistory(history.path, readonly=True)
+        results = {
+            "samples": history.capacity,
+            "file_mb": round(os.path.getsize(history.path) / 2 ** 20, 1),
+            "append_us": round(median_ms(lambda: history.append(metrics, next(later)), 1000) * 1000, 2),
+            "query_ms": {
+                "last_hour_raw": median_ms(lambda: reader.query(now - 3600, now, args.interval), args.repeat),
+                "last_day_5min": median_ms(lambda: reader.query(now - 86400, now, 300), args.repeat),
+                "all_default_500_points": median_ms(lambda: reader.query(), args.repeat),
+                "all_1h_one_field": median_ms(lambda: reader.query(step=3600, fields=["video_count"]), args.repeat),
+                "jsonl_read_all": median_ms(query_jsonl, 3),
+            },
+            "fill_s": round(fill_s, 2),
+        }
+        reader.close()
+        history.close()
+
+    report = {"benchmark": "metrics_history", "params": vars(args), "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,155 @@
+"""
+StatsRefresher offline: a SQLite database of --videos stale videos spread over playlists, and a stand-in
+for yt_dlp that answers from a dict and counts the requests. Compares the outbound requests and time per
+refreshed video of a naive refresh (one full extraction and one single-row UPDATE per video) with
+StatsRefresher rounds (flat playlist reads, batched UPDATEs of the changed counters only).
+
+    python benchmarks/bench_refresh.py --videos 20000 --playlist-size 20 --batch-size 500
+
+Prints one JSON object; request counts are exact, timings exclude network latency.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from query_scheduler import QueryScheduler, RequestBudget
+from sinks import SQLiteSink
+from stats_refresh import StatsRefresher
+from yt_search import YTSearch
+
+
+class FakeYoutubeDL:
+    """Serves playlists (flat) and videos (full/stats) from the generated catalog."""
+    def __init__(self, catalog: dict, playlists: dict):
+        self.catalog = catalog
+        self.playlists = playlists
+        self.requests = 0
+
+    def extract_info(self, url: str, download: bool = False):
+        self.requests += 1
+        if "list=" in url:
+            playlist_id = url.split("list=")[1]
+            return {"id": playlist_id, "entries": [{"id": v, "view_count": self.catalog[v][0]}
+                                                   for v in self.playlists[playlist_id] if v in self.catalog]}
+        video_id = url.split("v=")[1]
+        if video_id not in self.catalog:
+            return None
+        views, likes = self.catalog[video_id]
+        return {"id": video_id, "view_count": views, "like_count": likes}
+
+
+class FakePool:
+    def __init__(self, ydl: FakeYoutubeDL):
+        self.ydl = ydl
+
+    @contextmanager
+    def checkout(self, flavor: str):
+        yield self.ydl
+
+
+def build(path: str, args) -> tuple[dict, dict]:
+    rng = random.Random(args.seed)
+    sink = SQLiteSink(path)
+    catalog, playlists, videos = {}, {}, []
+    for n in range(args.videos):
+        playlist_id = f"PL{n // args.playlist_size:06d}"
+        video_id = f"v{n:08d}"
+        views, likes = int(rng.paretovariate(1.2) * 100), rng.randint(0, 500)
+        videos.append((video_id, f"title {n}", views, likes, playlist_id, rng.uniform(1, 90)))
+        playlists.setdefault(playlist_id, []).append(video_id)
+        if rng.random() >= args.removed_share:
+            # most counters grew since they were stored, some did not move
+            catalog[video_id] = (views + rng.choice((0, rng.randint(1, 1000))), likes + rng.choice((0, 0, rng.randint(1, 20))))
+    sink.cursor.executemany("INSERT INTO Playlist (P_ID) VALUES (?)", [(p,) for p in playlists])
+    sink.cursor.executemany("INSERT INTO Video (V_ID, V_Title, V_URL, V_Views, V_Likes, V_P_ID, V_StatsUpdated) "
+                            "VALUES (?, ?, '', ?, ?, ?, datetime('now', '-' || ? || ' days'))", videos)
+    sink.close()
+    return catalog, playlists
+
+
+def naive(path: str, ydl: FakeYoutubeDL, count: int) -> dict:
+    sink = SQLiteSink(path)
+    start = time.perf_counter()
+    rows = sink.cursor.execute("SELECT V_ID FROM Video ORDER BY V_StatsUpdated LIMIT ?", [count]).fetchall()
+    for (video_id,) in rows:
+        info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}") or {}
+        sink.cursor.execute("UPDATE Video SET V_Views = ?, V_Likes = ?, V_StatsUpdated = CURRENT_TIMESTAMP WHERE V_ID = ?",
+                            [info.get("view_count"), info.get("like_count"), video_id])
+    elapsed = time.perf_counter() - start
+    sink.close()
+    return {"videos": len(rows), "requests": ydl.requests, "requests_per_video": round(ydl.requests / len(rows), 3),
+            "ms_per_video": round(elapsed / len(rows) * 1000, 3)}
+
+
+def refresher(path: str, ydl: FakeYoutubeDL, count: int, args) -> dict:
+    search = YTSearch(pool=FakePool(ydl), scheduler=QueryScheduler(["refresh"], RequestBudget(None)))
+    refresh = StatsRefresher(sink_factory=lambda: SQLiteSink(path), batch_size=args.batch_size, search=search,
+                             min_age_hours=0.5)
+    sink = refresh.sink_factory()
+    totals = {"changed": 0, "unchanged": 0, "unavailable": 0}
+    select_s = update_s = 0.0
+    stale_videos, update_stats = sink.stale_videos, sink.update_stats
+
+    def timed_select(*a):
+        nonlocal select_s
+        t = time.perf_counter()
+        try:
+            return stale_videos(*a)
+        finally:
+            select_s += time.perf_counter() - t
+
+    def timed_update(rows):
+        nonlocal update_s
+        t = time.perf_counter()
+        update_stats(rows)
+        update_s += time.perf_counter() - t
+
+    sink.stale_videos, sink.update_stats = timed_select, timed_update
+    start = time.perf_counter()
+    while sum(totals.values()) < count:
+        counts = refresh.refresh_once(sink)
+        if not sum(counts.values()):
+            break
+        for result, n in counts.items():
+            totals[result] += n
+    elapsed = time.perf_counter() - start
+    sink.close()
+    videos = sum(totals.values())
+    return {"videos": videos, **totals, "rounds": refresh.rounds, "requests": ydl.requests,
+            "requests_per_video": round(ydl.requests / videos, 3), "ms_per_video": round(elapsed / videos * 1000, 3),
+            "select_ms_per_round": round(select_s / refresh.rounds * 1000, 2),
+            "update_ms_per_round": round(update_s / refresh.rounds * 1000, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Naive per-video refresh vs. StatsRefresher.")
+    parser.add_argument("--videos", type=int, default=20000)
+    parser.add_argument("--refresh", type=int, default=10000, help="videos to refresh per mode")
+    parser.add_argument("--playlist-size", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--removed-share", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for mode in ("naive", "refresher"):
+            path = os.path.join(tmp, f"{mode}.db")
+            catalog, playlists = build(path, args)
+            ydl = FakeYoutubeDL(catalog, playlists)
+            results[mode] = naive(path, ydl, args.refresh) if mode == "naive" else refresher(path, ydl, args.refresh, args)
+
+    report = {"benchmark": "stats_refresh", "params": vars(args), "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
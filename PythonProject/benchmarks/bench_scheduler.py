@@ -0,0 +1,176 @@
+"""
+New videos per outbound request of the query scheduling and request pacing, offline and on a simulated
+clock: extract_info is stubbed by a synthetic YouTube where a few terms lead to many playlists, some to
+a handful and most to nothing new, and which throttles (returns None, as yt_dlp does with ignoreerrors)
+while it is asked more than --throttle-rate requests per second.
+
+    python benchmarks/bench_scheduler.py --requests 20000 --requests-per-sec 5
+
+Modes: fixed (uniform random queries at a steady --requests-per-sec that ignores failures, as before
+QueryScheduler), uniform (uniform queries, RequestBudget with backoff) and adaptive (QueryScheduler and
+RequestBudget). Above --throttle-rate only the budget's backoff keeps requests succeeding.
+Every video costs one request of its own, so at most videos_per_playlist / (videos_per_playlist + 1)
+new videos per request are possible.
+"""
+import argparse
+import collections
+import contextlib
+import json
+import os
+import random
+import sys
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from query_scheduler import QueryScheduler, RequestBudget
+from seen_index import SeenIndex
+from yt_search import YTSearch, YoutubeDLPool
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += max(0.0, seconds)
+
+
+class RequestLimitReached(Exception):
+    pass
+
+
+class StubYouTube:
+    """
+    `rich_share` of the words have rich_playlists playlists, `poor_share` one to three and the rest none.
+    A search returns per query word a page of that word's playlists at an offset derived from the whole
+    query, so the same query always returns the same page and other queries with the same word reach
+    other pages.
+    """
+    def __init__(self, words: list[str], clock: SimulatedClock, rich_share: float = 0.02, rich_playlists: int = 400,
+                 poor_share: float = 0.18, videos_per_playlist: int = 10, page_size: int = 20,
+                 throttle_rate: float = 6.0, throttle_window: float = 10.0, throttle_penalty: float = 30.0,
+                 latency: float = 0.1, limit: int | None = None):
+        rng = random.Random(7)
+        self.playlist_counts = {}
+        for word in words:
+            draw = rng.random()
+            self.playlist_counts[word] = (rich_playlists if draw < rich_share
+                                          else rng.randint(1, 3) if draw < rich_share + poor_share else 0)
+        self.clock = clock
+        self.videos_per_playlist = videos_per_playlist
+        self.page_size = page_size
+        self.throttle_rate = throttle_rate
+        self.throttle_window = throttle_window
+        self.throttle_penalty = throttle_penalty
+        self.latency = latency
+        self.limit = limit
+        self.recent = collections.deque()
+        self.throttled_until = 0.0
+        self.requests = 0
+        self.failed = 0
+
+    def extract(self, url: str):
+        if self.limit is not None and self.requests >= self.limit:
+            raise RequestLimitReached()
+        self.requests += 1
+        self.clock.sleep(self.latency)
+        now = self.clock()
+        self.recent.append(now)
+        while self.recent[0] < now - self.throttle_window:
+            self.recent.popleft()
+        if now >= self.throttled_until and len(self.recent) > self.throttle_rate * self.throttle_window:
+            self.throttled_until = now + self.throttle_penalty
+        if now < self.throttled_until:
+            self.failed += 1
+            return None
+        if "search_query=" in url:
+            return self.search_page(url.split("search_query=", 1)[1].split("&", 1)[0])
+        if "list=" in url:
+            return self.playlist_page(url.rsplit("list=", 1)[1])
+        video_id = url.rsplit("v=", 1)[1]
+        return {"id": video_id, "title": f"Video {video_id}", "channel_id": f"UC{video_id.split('.')[0]}"}
+
+    def search_page(self, encoded_query: str) -> dict:
+        words = encoded_query.split("+")
+        per_word = max(1, self.page_size // len(words))
+        entries = []
+        for word in words:
+            count = self.playlist_counts.get(word, 0)
+            if not count:
+                continue
+            offset = zlib.crc32(f"{encoded_query}|{word}".encode()) % count
+            for n in range(offset, min(count, offset + per_word)):
+                playlist_id = f"{word}.{n}"
+                entries.append({"id": playlist_id, "url": f"https://www.youtube.com/playlist?list={playlist_id}"})
+        return {"entries": entries}
+
+    def playlist_page(self, playlist_id: str) -> dict:
+        entries = [{"id": f"{playlist_id}.{n}", "playlist_index": n + 1} for n in range(self.videos_per_playlist)]
+        return {"id": playlist_id, "title": f"Playlist {playlist_id}", "entries": entries}
+
+
+class StubYoutubeDL:
+    youtube: StubYouTube = None
+
+    def __init__(self, opts: dict):
+        self.opts = opts
+
+    def extract_info(self, url, download=True, *args, **kwargs):
+        return self.youtube.extract(url)
+
+
+def run_mode(mode: str, words: list[str], requests: int, requests_per_sec: float, throttle_rate: float,
+             seed: int) -> dict:
+    random.seed(seed)
+    clock = SimulatedClock()
+    StubYoutubeDL.youtube = youtube = StubYouTube(words, clock, throttle_rate=throttle_rate, limit=requests)
+    if mode == "fixed":
+        budget = RequestBudget(requests_per_sec, error_threshold=10 ** 9, clock=clock, sleep=clock.sleep)
+    else:
+        budget = RequestBudget(requests_per_sec, clock=clock, sleep=clock.sleep)
+    scheduler = QueryScheduler(words, budget, explore=0.2 if mode == "adaptive" else 1.0)
+    seen = SeenIndex()
+    search = YTSearch(pool=YoutubeDLPool({}), seen=seen, scheduler=scheduler)
+    search.pool = YoutubeDLPool({"flat": {}, "full": {}}, factory=StubYoutubeDL)
+
+    new_videos = 0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            for record in search.iter_video_metadata():
+                seen.add_record(record)  # as if loaded right away
+                new_videos += 1
+        except RequestLimitReached:
+            pass
+    return {
+        "mode": mode,
+        "requests": youtube.requests,
+        "failed_requests": youtube.failed,
+        "new_videos": new_videos,
+        "new_videos_per_request": round(new_videos / youtube.requests, 4),
+        "simulated_s": round(clock(), 1),
+        "backoffs": budget.backoffs,
+        "scored_terms": len(scheduler.scores),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QueryScheduler vs. uniform queries against a stubbed extractor.")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=5000, help="size of the synthetic word list")
+    parser.add_argument("--requests-per-sec", type=float, default=5.0, help="RequestBudget rate")
+    parser.add_argument("--throttle-rate", type=float, default=6.0, help="rate above which the stub fails requests")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    words = [f"w{n:05d}" for n in range(args.words)]
+    results = [run_mode(mode, words, args.requests, args.requests_per_sec, args.throttle_rate, args.seed)
+               for mode in ("fixed", "uniform", "adaptive")]
+    base = results[0]["new_videos_per_request"]
+    for result in results:
+        result["vs_fixed"] = round(result["new_videos_per_request"] / base, 2) if base else None
+    print(json.dumps({"benchmark": "scheduler", "params": vars(args), "results": results}, indent=2))
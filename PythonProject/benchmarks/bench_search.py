@@ -0,0 +1,110 @@
+"""
+SearchIndex at scale, offline: indexes --docs synthetic videos (titles, descriptions and tags drawn
+from the search word list with a Zipf-like distribution), then measures opening the index from disk
+and /search latency for one to three term queries, against a linear scan of the titles as the
+no-index baseline.
+
+    python benchmarks/bench_search.py --docs 1000000 --queries 200
+
+Prints one JSON object with the timings in milliseconds unless noted otherwise.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from search_index import SearchIndex
+from startup import load_word_list
+from video_record import VideoRecord
+
+
+def corpus(words: list[str], count: int, seed: int):
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / (np.arange(len(words)) + 10.0)
+    weights /= weights.sum()
+    chunk = 10000
+    for start in range(0, count, chunk):
+        size = min(chunk, count - start)
+        title_words = rng.choice(len(words), size=(size, 6), p=weights)
+        description_words = rng.choice(len(words), size=(size, 30), p=weights)
+        tag_words = rng.choice(len(words), size=(size, 3), p=weights)
+        for n in range(size):
+            video_id = f"v{start + n:08d}"
+            yield VideoRecord(video_id, " ".join(words[w] for w in title_words[n]), None, channel=f"channel {n % 997}",
+                              description=" ".join(words[w] for w in description_words[n]),
+                              tags=[words[w] for w in tag_words[n]])
+
+
+def percentiles(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {"p50_ms": round(statistics.median(samples) * 1000, 3),
+            "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3)}
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SearchIndex indexing and query latency.")
+    parser.add_argument("--docs", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per term count")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    words = list(load_word_list("en", args.vocabulary))
+    random.seed(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(tmp)
+        titles = []
+        start = time.perf_counter()
+        for record in corpus(words, args.docs, args.seed):
+            index.add(record)
+            titles.append(record.title)
+        index.close()
+        for thread in [t for t in threading.enumerate() if t.name == "search-merge"]:
+            thread.join()
+        index.merge()
+        elapsed = time.perf_counter() - start
+        results["index_s"] = round(elapsed, 1)
+        results["docs_per_s"] = round(args.docs / elapsed)
+        results["segments"] = index.stats()["segments"]
+        results["disk_mb"] = round(sum(f.stat().st_size for f in Path(tmp).iterdir()) / 2 ** 20, 1)
+
+        open_s = []
+        for _ in range(5):
+            open_s.append(timed(lambda: SearchIndex(tmp)))
+        results["open_ms"] = round(min(open_s) * 1000, 3)
+
+        index = SearchIndex(tmp)
+        index.search("warm up")
+        common, rare = words[:200], words[200:]
+        for terms in (1, 2, 3):
+            queries = [" ".join(random.choice(common if random.random() < 0.5 else rare) for _ in range(terms))
+                       for _ in range(args.queries)]
+            results[f"query_{terms}_terms"] = percentiles([timed(lambda: index.search(q)) for q in queries])
+        results["query_page_10"] = percentiles([timed(lambda: index.search(random.choice(common), page=10))
+                                                for _ in range(args.queries)])
+        scan_terms = [random.choice(words) for _ in range(5)]
+        results["title_scan_baseline"] = percentiles([timed(lambda: [t for t in titles if term in t]) for term in scan_terms])
+
+    report = {"benchmark": "search_index", "params": vars(args), "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,80 @@
+"""
+Scaling of ShardedCrawler with the number of processes, offline: every shard replays the extract_info
+fixtures of bench_etl (each shard with its own range of playlist/video ids) into one SQLite file.
+
+    python benchmarks/bench_sharded.py --shards 1 2 4 8 --records-per-shard 5000
+
+Throughput is measured from the first progress report of any shard, so process start-up is left out.
+Prints one JSON object with records/sec and the speedup over the first shard count.
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_etl import Corpus, FIXTURE_PATH, ReplayYoutubeDL
+from sharded_crawler import ShardedCrawler, ShardWorker
+from sinks import SQLiteSink
+from yt_search import YTSearch, YoutubeDLPool
+
+PLAYLISTS_PER_SHARD = 10_000_000
+
+
+class ReplayShardWorker(ShardWorker):
+    def make_search(self) -> YTSearch:
+        sys.stdout = open(os.devnull, "w")  # runs in the shard process
+        ReplayYoutubeDL.corpus = Corpus(FIXTURE_PATH, first_playlist=self.shard * PLAYLISTS_PER_SHARD)
+        search = YTSearch(pool=YoutubeDLPool({}), seen=self.seen, scheduler=self.query_scheduler(self.word_list))
+        search.pool = YoutubeDLPool({"flat": {**search.COMMON_YTDLP_OPTS, "extract_flat": True},
+                                     "full": search.COMMON_YTDLP_OPTS}, factory=ReplayYoutubeDL)
+        return search
+
+
+class TimedCrawler(ShardedCrawler):
+    first_progress = None
+    counted_from = 0
+
+    def handle(self, message: tuple):
+        super().handle(message)
+        if message[0] == "progress" and self.first_progress is None:
+            self.first_progress = time.monotonic()
+            self.counted_from = self.parent.processed_count
+
+
+def run_scale(shards: int, records_per_shard: int, batch_size: int, work_dir: str) -> dict:
+    db_path = os.path.join(work_dir, f"shards_{shards}.db")
+    crawler = TimedCrawler(shards, expected_videos=1_000_000, metrics_path=os.path.join(work_dir, "metrics.json"),
+                           report_every=3600, requests_per_sec=None, worker_class=ReplayShardWorker, batch_size=batch_size, fetch_workers=1,
+                           metrics_every=batch_size, sink_factory=functools.partial(SQLiteSink, db_path))
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            total = crawler.run(max_records=shards * records_per_shard)
+        finally:
+            sys.stdout = stdout
+    elapsed = time.monotonic() - (crawler.first_progress or time.monotonic())
+    counted = total - crawler.counted_from
+    return {"shards": shards, "records": total, "records_per_sec": round(counted / max(elapsed, 1e-9), 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ShardedCrawler scaling benchmark (offline, SQLite).")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--records-per-shard", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=25)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in args.shards:
+            results.append(run_scale(shards, args.records_per_shard, args.batch_size, tmp))
+    base = results[0]["records_per_sec"]
+    for result in results:
+        result["speedup"] = round(result["records_per_sec"] / base, 2) if base else None
+    print(json.dumps({"benchmark": "sharded", "cpu_count": os.cpu_count(), "results": results}, indent=2))
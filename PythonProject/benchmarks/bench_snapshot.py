@@ -0,0 +1,119 @@
+"""
+Columnar snapshot vs. SQL for the metrics set, offline on SQLite: builds a database of --videos synthetic
+videos (channels, playlists and tags included), then times
+  - the full SQL pass over the tables (MetricsAggregator.seed, the queries of the reconcile), the baseline,
+  - the initial SnapshotExporter.export() and an incremental one after --growth new videos and as many
+    refreshed counters,
+  - SnapshotAnalytics.metrics() (same figures as the SQL pass) and report() (plus percentiles,
+    per-channel distributions and top tags).
+
+    python benchmarks/bench_snapshot.py --videos 1000000
+
+Prints one JSON object; the SQL and analytics timings are the median of --repeat runs in milliseconds.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import MetricsAggregator
+from sinks import SQLiteSink
+from snapshot_analytics import SnapshotAnalytics
+from snapshot_export import SnapshotExporter
+
+
+def fill(sink: SQLiteSink, start: int, count: int, channels: int, playlists: int, rng: random.Random):
+    chunk = 50000
+    for offset in range(start, start + count, chunk):
+        videos, tags = [], []
+        for n in range(offset, min(start + count, offset + chunk)):
+            video_id = f"v{n:09d}"
+            videos.append((video_id, f"video title {n}", f"https://www.youtube.com/watch?v={video_id}",
+                           rng.randint(30, 7200), int(rng.paretovariate(1.1) * 100), rng.randint(0, 5000),
+                           f"PL{rng.randrange(playlists):07d}", f"UC{int(rng.paretovariate(1.0)) % channels:07d}"))
+            tags.extend((f"tag{int(rng.paretovariate(0.8)) % 5000}", video_id) for _ in range(3))
+        sink.cursor.execute("BEGIN")
+        sink.cursor.executemany("INSERT INTO Video (V_ID, V_Title, V_URL, V_Duration, V_Views, V_Likes, V_P_ID, V_C_ID) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", videos)
+        sink.cursor.executemany("INSERT OR IGNORE INTO Tags (Tag, VT_V) VALUES (?, ?)", tags)
+        sink.cursor.execute("COMMIT")
+
+
+def figures(metrics: dict) -> dict:
+    # TOP 1 picks any of several videos tied for the maximum; compare the values, not which title came back
+    return {key: {k: v for k, v in value.items() if k != "V_Title"} if key.startswith("top_video") and value else value
+            for key, value in metrics.items()}
+
+
+def median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar snapshot export and analytics vs. SQL.")
+    parser.add_argument("--videos", type=int, default=1000000)
+    parser.add_argument("--growth", type=int, default=10000, help="videos added (and counters refreshed) before the incremental export")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    channels, playlists = max(1, args.videos // 50), max(1, args.videos // 20)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = SQLiteSink(os.path.join(tmp, "youtube.db"))
+        sink.cursor.executemany("INSERT INTO Channel (C_ID, C_Name) VALUES (?, ?)",
+                                [(f"UC{n:07d}", f"channel {n}") for n in range(channels)])
+        sink.cursor.executemany("INSERT INTO Playlist (P_ID, P_Title, P_C_ID) VALUES (?, ?, ?)",
+                                [(f"PL{n:07d}", f"playlist {n}", f"UC{n % channels:07d}") for n in range(playlists)])
+        start = time.perf_counter()
+        fill(sink, 0, args.videos, channels, playlists, rng)
+        results["fill_s"] = round(time.perf_counter() - start, 1)
+
+        aggregator = MetricsAggregator()
+        results["sql_metrics_ms"] = median_ms(lambda: (aggregator.seed(sink.cursor), aggregator.snapshot()), min(args.repeat, 3))
+
+        snapshot_dir = os.path.join(tmp, "snapshot")
+        exporter = SnapshotExporter(snapshot_dir, lambda: sink)
+        start = time.perf_counter()
+        added = exporter.export(sink)
+        elapsed = time.perf_counter() - start
+        results["initial_export"] = {"s": round(elapsed, 2), "rows": sum(added.values()),
+                                     "rows_per_s": round(sum(added.values()) / elapsed),
+                                     "disk_mb": round(sum(f.stat().st_size for f in Path(snapshot_dir).rglob("*") if f.is_file()) / 2 ** 20, 1)}
+
+        fill(sink, args.videos, args.growth, channels, playlists, rng)
+        refreshed = rng.sample(range(args.videos), min(args.growth, args.videos))
+        sink.update_stats([{"V_ID": f"v{n:09d}", "V_Views": rng.randint(0, 10 ** 7)} for n in refreshed])
+        start = time.perf_counter()
+        added = exporter.export(sink)
+        results["incremental_export"] = {"s": round(time.perf_counter() - start, 3), "rows": sum(added.values()),
+                                         "counters_patched": len(refreshed)}
+
+        analytics = SnapshotAnalytics(snapshot_dir)
+        snapshot_metrics = analytics.metrics()
+        aggregator.seed(sink.cursor)
+        results["same_as_sql"] = figures(snapshot_metrics) == figures(aggregator.snapshot())
+        results["analytics_metrics_ms"] = median_ms(analytics.metrics, args.repeat)
+        results["analytics_report_ms"] = median_ms(analytics.report, args.repeat)
+        results["speedup_metrics"] = round(results["sql_metrics_ms"] / results["analytics_metrics_ms"], 1)
+        sink.close()
+
+    report = {"benchmark": "snapshot", "params": vars(args), "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
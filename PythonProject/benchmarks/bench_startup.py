@@ -0,0 +1,105 @@
+"""
+Cold start costs, each measured in a fresh interpreter: module imports, YTSearch construction, loading
+the word list (wordfreq vs. the precompiled cache) and the time until the metrics API answers when it is
+started the way Main.py does it, with the ETL loading in a thread next to it.
+
+    python benchmarks/bench_startup.py --repeat 5 --output startup.json
+
+Prints one JSON object with the median and minimum seconds per scenario, interpreter start-up included.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = {
+    "interpreter": "pass",
+    "import_etl_worker": "import etl_worker",
+    "ytsearch": "from yt_search import YTSearch; YTSearch()",
+    "first_youtubedl": "from yt_search import YTSearch; YTSearch().pool.acquire('flat')",
+    "word_list_wordfreq": "from wordfreq import top_n_list; top_n_list('en', 50000)",
+    "word_list_cached": "from startup import load_word_list; load_word_list('en', 50000, cache_dir={cache_dir!r})",
+    "import_metrics_api": "import metrics_api",
+}
+
+API_SCRIPT = """
+import sys, threading
+from metrics_api import MetricsAPI
+
+def etl():
+    from etl_worker import ETLWorker
+    ETLWorker().make_search()
+
+threading.Thread(target=etl, daemon=True).start()
+MetricsAPI(sys.argv[1]).run(host="127.0.0.1", port=int(sys.argv[2]))
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_snippet(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def time_api_ready(metrics_path: str, timeout: float = 60.0) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", API_SCRIPT, metrics_path, str(port)], cwd=PROJECT_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=1).read()
+                return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                if process.poll() is not None:
+                    raise RuntimeError(f"API process exited with {process.returncode}")
+                time.sleep(0.005)
+        raise TimeoutError(f"API not ready after {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summarize(samples: list[float]) -> dict:
+    return {"median_s": round(statistics.median(samples), 3), "min_s": round(min(samples), 3)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start benchmark, one fresh interpreter per run.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="write the JSON result here as well as to stdout")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # the first load builds the cache: once in tmp for word_list_cached, once in the project's cache dir
+        time_snippet(SCENARIOS["word_list_cached"].format(cache_dir=tmp))
+        time_snippet("from startup import load_word_list; load_word_list()")
+        for name, code in SCENARIOS.items():
+            results[name] = summarize([time_snippet(code.format(cache_dir=tmp)) for _ in range(args.repeat)])
+        metrics_path = os.path.join(tmp, "metrics.json")
+        results["api_ready"] = summarize([time_api_ready(metrics_path) for _ in range(args.repeat)])
+
+    report = {"benchmark": "startup", "python": sys.version.split()[0], "repeat": args.repeat, "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
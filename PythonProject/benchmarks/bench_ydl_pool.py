@@ -0,0 +1,48 @@
+"""
+Per-call overhead of building a fresh YoutubeDL for every lookup vs. checking one out of YoutubeDLPool.
+extract_info is stubbed so only the YoutubeDL setup/teardown cost is measured, no network is used.
+
+    python benchmarks/bench_ydl_pool.py [calls]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yt_dlp
+from yt_search import YTSearch, YoutubeDLPool
+
+
+class StubYoutubeDL(yt_dlp.YoutubeDL):
+    def extract_info(self, url, download=True, *args, **kwargs):
+        return {"id": url, "title": "stub", "entries": []}
+
+
+def bench_fresh(opts: dict, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        with StubYoutubeDL({**opts, "extract_flat": True}) as ydl:
+            ydl.extract_info(f"https://www.youtube.com/watch?v={i}", download=False)
+    return (time.perf_counter() - start) / calls
+
+
+def bench_pool(opts: dict, calls: int) -> float:
+    pool = YoutubeDLPool({"flat": {**opts, "extract_flat": True}}, factory=StubYoutubeDL)
+    start = time.perf_counter()
+    for i in range(calls):
+        with pool.checkout("flat") as ydl:
+            ydl.extract_info(f"https://www.youtube.com/watch?v={i}", download=False)
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return elapsed / calls
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    opts = YTSearch(pool=YoutubeDLPool({})).COMMON_YTDLP_OPTS
+    fresh = bench_fresh(opts, calls)
+    pooled = bench_pool(opts, calls)
+    print(f"fresh YoutubeDL per call : {fresh * 1e3:9.3f} ms/call")
+    print(f"pooled YoutubeDL         : {pooled * 1e3:9.3f} ms/call")
+    print(f"speedup                  : {fresh / pooled:9.1f}x")
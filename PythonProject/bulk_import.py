@@ -0,0 +1,159 @@
+"""
+Bulk import of a YTSearch metadata dump (Mongo export as a JSON array or as one document per line).
+
+    python bulk_import.py "YouTubeDB.UnlistedVideoMetadata2.json" --batch-size 500 --workers 8
+
+The file is cut into top-level objects by a byte scanner, so memory stays constant no matter how big
+the dump is and every record has an exact end offset. Parsing and field projection run in a process
+pool, loading goes through ETLWorker's batched sink path. After every committed batch the end offset
+is saved to <dump>.checkpoint.json and a rerun resumes from there (--restart ignores it).
+"""
+import argparse
+import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from metrics import write_json_atomic
+from video_record import VideoRecord
+
+# everything up to and including the next bracket outside a string; fails when a string is still open
+# at the end of the buffer, so matching is always anchored at the current position. The possessive
+# quantifiers (Python 3.11+) keep a failed match linear instead of backtracking through the buffer.
+NEXT_BRACKET = re.compile(rb'(?:[^"\[\]{}]++|"(?:[^"\\]++|\\.)*+")*+([\[\]{}])', re.S)
+
+
+def container_depth(path: str) -> int:
+    """1 when the dump is a JSON array of records, 0 when records sit at the top level (JSON lines)."""
+    with open(path, "rb") as f:
+        head = f.read(4096).lstrip(b"\xef\xbb\xbf \t\r\n")
+    return 1 if head[:1] == b"[" else 0
+
+
+def iter_raw_records(path: str, start_offset: int = 0, chunk_size: int = 1 << 20):
+    """Yields (raw_json_bytes, end_offset) for every record object, starting at a record boundary."""
+    record_depth = container_depth(path)
+    depth = record_depth if start_offset else 0
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+        buf = b""
+        buf_start = start_offset
+        pos = 0
+        record_start = None
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buf += chunk
+            while True:
+                match = NEXT_BRACKET.match(buf, pos)
+                if match is None:
+                    break  # no complete bracket left in the buffer, read the next chunk
+                bracket = match.group(1)
+                if bracket in b"[{":
+                    if depth == record_depth and bracket == b"{":
+                        record_start = match.start(1)
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == record_depth and record_start is not None:
+                        yield buf[record_start:match.end()], buf_start + match.end()
+                        record_start = None
+                pos = match.end()
+            # only keep what an unfinished record or token still needs
+            cut = pos if record_start is None else record_start
+            buf = buf[cut:]
+            buf_start += cut
+            pos -= cut
+            if record_start is not None:
+                record_start -= cut
+
+
+def transform_batch(raw_records: list[bytes]) -> list[VideoRecord]:
+    """Runs in the worker processes: parse and project, so only the fields ETLWorker reads come back."""
+    records = []
+    for raw in raw_records:
+        try:
+            records.append(VideoRecord.from_dict(json.loads(raw)))
+        except (ValueError, AttributeError):
+            continue
+    return records
+
+
+def iter_batches(path: str, start_offset: int, batch_size: int):
+    batch = []
+    for raw, end_offset in iter_raw_records(path, start_offset):
+        batch.append(raw)
+        if len(batch) >= batch_size:
+            yield batch, end_offset
+            batch = []
+    if batch:
+        yield batch, end_offset
+
+
+def run_import(dump_path: str, batch_size: int = 500, workers: int | None = None, checkpoint_path: str | None = None,
+               restart: bool = False, report_every: float = 5.0, sink_factory=None):
+    from etl_worker import ETLWorker
+
+    checkpoint_path = checkpoint_path or dump_path + ".checkpoint.json"
+    checkpoint = {"offset": 0, "records": 0}
+    if not restart and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        print(f"[IMPORT] resuming at byte {checkpoint['offset']} ({checkpoint['records']} records done)")
+
+    worker = ETLWorker(batch_size=batch_size, sink_factory=sink_factory)
+    sink = worker.connect()
+    if sink.cursor is not None:
+        worker.metrics.seed(sink.cursor)
+
+    total_bytes = os.path.getsize(dump_path)
+    started = last_report = time.monotonic()
+    imported = 0
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        batches = iter_batches(dump_path, checkpoint["offset"], batch_size)
+        while True:
+            # keep every worker busy while the parent writes, but write strictly in file order
+            while len(in_flight) < workers * 2:
+                try:
+                    raw_batch, end_offset = next(batches)
+                except StopIteration:
+                    break
+                in_flight.append((pool.submit(transform_batch, raw_batch), end_offset, len(raw_batch)))
+            if not in_flight:
+                break
+            future, end_offset, raw_count = in_flight.popleft()
+            worker.process_batch(future.result(), sink)
+            imported += raw_count
+            checkpoint = {"offset": end_offset, "records": checkpoint["records"] + raw_count}
+            write_json_atomic(checkpoint_path, checkpoint)
+
+            now = time.monotonic()
+            if now - last_report >= report_every:
+                last_report = now
+                print(f"[IMPORT] {checkpoint['records']} records, {end_offset / max(total_bytes, 1):.1%} of file, "
+                      f"{imported / (now - started):.0f} records/sec")
+
+    worker.write_metrics(sink, worker.METRICS_PATH)
+    sink.close()
+    elapsed = time.monotonic() - started
+    print(f"[IMPORT] done: {imported} records in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} records/sec)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a JSON metadata dump into the database.")
+    parser.add_argument("dump", help="Mongo export: JSON array or one JSON document per line")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=None, help="transform processes (default: CPU count)")
+    parser.add_argument("--checkpoint", default=None, help="default: <dump>.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--sqlite", default=None, help="load into this SQLite file instead of SQL Server")
+    args = parser.parse_args()
+    sink_factory = None
+    if args.sqlite:
+        from sinks import SQLiteSink
+        sink_factory = lambda: SQLiteSink(args.sqlite)
+    run_import(args.dump, args.batch_size, args.workers, args.checkpoint, args.restart, sink_factory=sink_factory)
@@ -60,6 +60,51 @@ CREATE TABLE Tags (
     CONSTRAINT FK_Tags_Video FOREIGN KEY (VT_V)
         REFERENCES Video (V_ID)
 );
+GO
+
+-- Indexes for the metric queries (top_video_by_*, top_channel_by_video, longest_playlist, ...).
+-- Guarded, so this part can also be run against an existing database.
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Video_Views')
+    CREATE INDEX IX_Video_Views ON Video (V_Views DESC) INCLUDE (V_Title);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Video_Likes')
+    CREATE INDEX IX_Video_Likes ON Video (V_Likes DESC) INCLUDE (V_Title);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Video_Duration')
+    CREATE INDEX IX_Video_Duration ON Video (V_Duration DESC) INCLUDE (V_Title);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Video_Channel')
+    CREATE INDEX IX_Video_Channel ON Video (V_C_ID);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Video_Playlist')
+    CREATE INDEX IX_Video_Playlist ON Video (V_P_ID) INCLUDE (V_Duration);
+GO
+
+-- When V_Views / V_Likes were last read from YouTube (insert time, then stats_refresh.py).
+-- NULL for rows inserted before the column existed; those are refreshed first.
+IF COL_LENGTH('Video', 'V_StatsUpdated') IS NULL
+    ALTER TABLE Video ADD V_StatsUpdated DATETIME2 NULL
+        CONSTRAINT DF_Video_StatsUpdated DEFAULT SYSUTCDATETIME();
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Video_StatsUpdated')
+    CREATE INDEX IX_Video_StatsUpdated ON Video (V_StatsUpdated) INCLUDE (V_Views, V_Likes, V_P_ID);
+GO
+
+-- Insert order of every row, so snapshot_export.py only has to read the rows added since its last run.
+IF COL_LENGTH('Channel', 'C_Seq') IS NULL
+    ALTER TABLE Channel ADD C_Seq BIGINT IDENTITY(1,1) NOT NULL;
+IF COL_LENGTH('Playlist', 'P_Seq') IS NULL
+    ALTER TABLE Playlist ADD P_Seq BIGINT IDENTITY(1,1) NOT NULL;
+IF COL_LENGTH('Video', 'V_Seq') IS NULL
+    ALTER TABLE Video ADD V_Seq BIGINT IDENTITY(1,1) NOT NULL;
+IF COL_LENGTH('Tags', 'T_Seq') IS NULL
+    ALTER TABLE Tags ADD T_Seq BIGINT IDENTITY(1,1) NOT NULL;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Channel_Seq')
+    CREATE UNIQUE INDEX IX_Channel_Seq ON Channel (C_Seq);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Playlist_Seq')
+    CREATE UNIQUE INDEX IX_Playlist_Seq ON Playlist (P_Seq);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Video_Seq')
+    CREATE UNIQUE INDEX IX_Video_Seq ON Video (V_Seq);
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_Tags_Seq')
+    CREATE UNIQUE INDEX IX_Tags_Seq ON Tags (T_Seq);
+GO
 
 -- If you need to restart
 ALTER DATABASE [BD_Project] SET SINGLE_USER WITH ROLLBACK IMMEDIATE;
@@ -0,0 +1,5 @@
+SELECT AVG(CAST(total_duration AS FLOAT))
+FROM (SELECT SUM(ISNULL(V_Duration, 0)) AS total_duration
+      FROM Video
+      WHERE V_P_ID IS NOT NULL
+      GROUP BY V_P_ID) AS p
\ No newline at end of file
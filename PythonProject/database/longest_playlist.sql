@@ -1,5 +1,8 @@
-SELECT P_Title, SUM(ISNULL(V_Duration,0)) AS total_duration
-FROM Playlist
-JOIN Video ON Playlist.P_ID = Video.V_P_ID
-GROUP BY P_Title
-ORDER BY total_duration DESC
\ No newline at end of file
+-- per playlist (P_ID), not per P_Title: distinct ones sharing a name are not added up (see MetricsAggregator)
+SELECT TOP 1 P_Title, p.total_duration
+FROM (SELECT V_P_ID, SUM(ISNULL(V_Duration, 0)) AS total_duration
+      FROM Video
+      WHERE V_P_ID IS NOT NULL
+      GROUP BY V_P_ID) AS p
+JOIN Playlist ON Playlist.P_ID = p.V_P_ID
+ORDER BY p.total_duration DESC
\ No newline at end of file
@@ -1,5 +1,8 @@
-SELECT C_Name, COUNT(Video.V_ID) AS video_count
-FROM Channel
-JOIN Video ON Channel.C_ID = Video.V_C_ID
-GROUP BY C_Name
-ORDER BY video_count DESC
\ No newline at end of file
+-- per channel (C_ID), not per C_Name: distinct ones sharing a name are not added up (see MetricsAggregator)
+SELECT TOP 1 C_Name, c.video_count
+FROM (SELECT V_C_ID, COUNT(*) AS video_count
+      FROM Video
+      WHERE V_C_ID IS NOT NULL
+      GROUP BY V_C_ID) AS c
+JOIN Channel ON Channel.C_ID = c.V_C_ID
+ORDER BY c.video_count DESC
\ No newline at end of file
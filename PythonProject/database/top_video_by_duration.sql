@@ -1,3 +1,3 @@
-SELECT V_Title, V_Duration
+SELECT TOP 1 V_Title, V_Duration
 FROM Video
 ORDER BY V_Duration DESC
\ No newline at end of file
@@ -1,3 +1,3 @@
-SELECT V_Title, V_Likes
+SELECT TOP 1 V_Title, V_Likes
 FROM Video
 ORDER BY V_Likes DESC
\ No newline at end of file
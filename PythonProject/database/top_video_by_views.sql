@@ -1,3 +1,3 @@
-SELECT V_Title, V_Views
+SELECT TOP 1 V_Title, V_Views
 FROM Video
 ORDER BY V_Views DESC
\ No newline at end of file
@@ -1,35 +1,84 @@
-import json
-import pyodbc
-#import ijson
+import queue
+import threading
+import time
 from yt_search import YTSearch
-from metrics import CollectMetrics
+from query_scheduler import QueryScheduler, RequestBudget
+from seen_index import SeenIndex
+from video_record import VideoRecord
+from metrics import MetricsAggregator, write_json_atomic
+from metrics_history import MetricsHistory
+from search_index import SearchIndex
+from event_log import EventLog
+from sinks import Sink, SqlServerSink, TABLE_KEYS
+from spool import Spool
+from instrumentation import STAGE_SECONDS, RECORDS_LOADED, DUPLICATES_SKIPPED, DB_ERRORS
 
 
 class ETLWorker:
+    CONNECTION_STRING = ('Driver={ODBC Driver 17 for SQL Server};'
+                         'Server=CARVERLENYOGA7I;'
+                         'Database=BD_Project;'
+                         'Trusted_Connection=yes;')
+    METRICS_PATH = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\logs\metrics_log.json"
+    EVENTS_PATH = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\events\events.jsonl"
+    def __init__(self, batch_size: int = 1, batch_timeout_ms: int = 5000, metrics_every: int = 5,
+                 fetch_workers: int = 4, load_workers: int = 1, queue_depth: int = 100,
+                 seen: SeenIndex | None = None, reconcile_every: int = 1000, sink_factory=None,
+                 spool: Spool | None = None, requests_per_sec: float | None = 5.0,
+                 history: MetricsHistory | None = None, search_index: SearchIndex | None = None,
+                 event_log: EventLog | None = None):
+        """
+        batch_size > 1 switches run() to batched loading: records are buffered until batch_size
+        is reached (or batch_timeout_ms has passed since the first buffered record) and then written
+        with one multi-row MERGE per table and a single commit.
+        fetch_workers, load_workers and queue_depth only apply to run_pipelined().
+        seen is warmed from the database on start and shared with YTSearch; known videos are dropped
+        and known channels/playlists are not written again.
+        reconcile_every re-reads the metrics from SQL after that many records (0 = never).
+        sink_factory returns a new Sink (see sinks.py); every loader thread opens its own.
+        Defaults to SQL Server at CONNECTION_STRING.
+        spool makes run_pipelined() write every fetched record to disk first; loaders read from it and
+        resume at its committed position after a restart.
+        requests_per_sec is the extract_info budget shared by all fetch threads (None = only back off on errors).
+        history gets a sample of every metrics snapshot written (at most one per its min_interval).
+        search_index gets every newly stored video.
+        event_log receives failed batches and records; defaults to an EventLog at EVENTS_PATH, opened on the first event.
+        """
+        self.seen = seen
+        self.metrics = MetricsAggregator()
+        self.reconcile_every = reconcile_every
+        self.reconciled_at = 0
+        self.sink_factory = sink_factory or (lambda: SqlServerSink(self.CONNECTION_STRING))
+        self.spool = spool
+        self.history = history
+        self.search_index = search_index
+        self.event_log = event_log
+        self.event_log_lock = threading.Lock()
+        self.requests_per_sec = requests_per_sec
+        self.scheduler = None  # created with the first YTSearch, see query_scheduler()
+        self.scheduler_lock = threading.Lock()
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout_ms = batch_timeout_ms
+        self.metrics_every = metrics_every
+        self.fetch_workers = max(1, fetch_workers)
+        self.load_workers = max(1, load_workers)
+        self.queue_depth = max(1, queue_depth)
+        self.processed_count = 0
+        self.progress_lock = threading.Lock()
+        self.fetchers_running = 0
+        self.fetchers_lock = threading.Lock()
+
+    def connect(self) -> Sink:
+        return self.sink_factory()
+
  # ___________________________________ETL START___________________________________________________________________________
     def events(self, error_msg: str, values: list):
-        path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\events\events.txt"
-        with open(path, "a", encoding="utf-8") as event:
-            event.write(error_msg + "\n")
-            event.write(f"{values}\n")
-
-    def insert_row(self, value_dict: dict, columns: list[str], table_name: str, cursor):
-        col_list = ", ".join(columns)
-        placeholders = ", ".join(["?"] * len(columns))
-        sql = f"INSERT INTO {table_name} ({col_list}) VALUES ({placeholders})"
-        values = [value_dict[col] for col in columns]
-        #print(table_name," :   ",values)
-        try:
-            cursor.execute(sql, values)
-        except pyodbc.IntegrityError as e:
-            error_msg = str(e)
-            if "2627" in error_msg:# or "2601" in error_msg:
-                self.events(error_msg, [])
-                #print(".")
-            else:
-                self.events(error_msg, values)
-                raise e
-        return cursor
+        # queued for EventLog's writer thread, so a failing batch does not also wait on the disk
+        if self.event_log is None:
+            with self.event_log_lock:
+                if self.event_log is None:
+                    self.event_log = EventLog(self.EVENTS_PATH)
+        self.event_log.log(error_msg, values)
 
     def to_bit(self, transform: bool) -> int:
         if transform:
@@ -38,235 +87,391 @@ class ETLWorker:
             return 0
 
 # ___________________________________PARSE JSON/ETL___________________________________________________________________________
-    def extract_channel_data(self, record: dict, cursor, columns: list, table: str):
-        yt_meta = record.get('YtMetadata', {})
-        row = {
-            'C_ID': yt_meta.get('channel_id') or None,
-            'C_Name': yt_meta.get('channel') or None,
-            'C_URL': yt_meta.get('channel_url') or None,
-            'C_Uploader': yt_meta.get('uploader') or None
+    def channel_row(self, record: VideoRecord) -> dict:
+        return {
+            'C_ID': record.channel_id or None,
+            'C_Name': record.channel or None,
+            'C_URL': record.channel_url or None,
+            'C_Uploader': record.uploader or None
         }
-        self.insert_row(row, columns, table, cursor)
-
-    def extract_playlist_data(self, record: dict, cursor, columns: list, table: str):
-        yt_meta = record.get('YtMetadata', {})
-        row = {
-            'P_ID': record.get('PlaylistId') or None,
-            'P_Title': record.get('PlaylistTitle') or None,
-            'P_URL': record.get('PlaylistUrl') or None,
-            'P_C_ID': yt_meta.get('channel_id') or None
+
+    def playlist_row(self, record: VideoRecord) -> dict:
+        return {
+            'P_ID': record.playlist_id or None,
+            'P_Title': record.playlist_title or None,
+            'P_URL': record.playlist_url or None,
+            'P_C_ID': record.channel_id or None
         }
-        self.insert_row(row, columns, table, cursor)
-
-    def extract_video_data(self, record: dict, cursor, columns: list, table: str):
-        yt_meta = record.get('YtMetadata', {})
-        row = {
-            'V_ID': yt_meta.get('id') or None,
-            'V_Title': yt_meta.get('title') or None,
-            'V_URL': record.get('VideoUrl') or None,
-            'V_P_ID': record.get('PlaylistId') or None,
-            'V_Duration': yt_meta.get('duration') or None,
-            'V_Views': yt_meta.get('view_count') or None,
-            'V_Likes': yt_meta.get('like_count') or None,
-            'V_UploadDate': yt_meta.get('upload_date') or None,
-            'V_C_ID': yt_meta.get('channel_id') or None,
-            'V_Description': yt_meta.get('description') or None,
-            'V_Embed': self.to_bit(yt_meta.get('playable_in_embed'))
+
+    def video_row(self, record: VideoRecord) -> dict:
+        return {
+            'V_ID': record.video_id or None,
+            'V_Title': record.title or None,
+            'V_URL': record.video_url or None,
+            'V_P_ID': record.playlist_id or None,
+            'V_Duration': record.duration or None,
+            'V_Views': record.view_count or None,
+            'V_Likes': record.like_count or None,
+            'V_UploadDate': record.upload_date or None,
+            'V_C_ID': record.channel_id or None,
+            'V_Description': record.description or None,
+            'V_Embed': self.to_bit(record.playable_in_embed)
         }
-        self.insert_row(row, columns, table, cursor)
-
-
-    def upsert_category(self, cursor, category: str) -> int:
-        sql = """
-        MERGE Category AS target
-        USING (SELECT ? AS CT_Category) AS src
-            ON target.CT_Category = src.CT_Category
-        WHEN NOT MATCHED THEN
-            INSERT (CT_Category)
-            VALUES (src.CT_Category)
-        OUTPUT inserted.CT_ID, $action;
+
+    TAG_LENGTH = 50  # Tags.Tag VARCHAR(50)
+    CATEGORY_LENGTH = 30  # Category.CT_Category VARCHAR(30)
+    CASE_INSENSITIVE = ("Tag", "CT_Category")  # compared case-insensitively by the database collation
+
+    @staticmethod
+    def clean_names(names: list | None, length: int) -> list[str]:
+        # trimmed and cut to the column width; names differing only in case are one row in the database
+        cleaned = {}
+        for name in names or []:
+            if isinstance(name, str) and name.strip():
+                name = name.strip()[:length].rstrip()
+                cleaned.setdefault(name.casefold(), name)
+        return list(cleaned.values())
+
+    def tag_rows(self, record: VideoRecord) -> list[dict]:
+        return [{'Tag': tag, 'VT_V': record.video_id} for tag in self.clean_names(record.tags, self.TAG_LENGTH)]
+
+    def category_rows(self, record: VideoRecord) -> list[dict]:
+        return [{'VC_V': record.video_id, 'CT_Category': category}
+                for category in self.clean_names(record.categories, self.CATEGORY_LENGTH)]
+# ___________________________________END OF ETL___________________________________________________________________________
+
+# ___________________________________BATCH LOADING___________________________________________________________________________
+    @classmethod
+    def dedupe_rows(cls, rows: list[dict], keys: list[str]) -> list[dict]:
+        # first occurrence wins; rows with a missing key can never be inserted so they are dropped here
+        unique = {}
+        for row in rows:
+            key = tuple(row[k].casefold() if k in cls.CASE_INSENSITIVE and row[k] is not None else row[k] for k in keys)
+            if None in key or key in unique:
+                continue
+            unique[key] = row
+        return list(unique.values())
+
+    def unseen(self, records: list[VideoRecord]) -> list[VideoRecord]:
+        if self.seen is None:
+            return records
+        unseen = [r for r in records if not self.seen.has_video(r.video_id)]
+        if len(unseen) < len(records):
+            DUPLICATES_SKIPPED.labels(kind="video").inc(len(records) - len(unseen))
+        return unseen
+
+    def mark_seen(self, records: list[VideoRecord]):
+        # only after commit: a channel/playlist must be in the database before later batches skip it
+        if self.seen is not None:
+            for record in records:
+                self.seen.add_record(record)
+
+    def observe(self, record: VideoRecord):
+        self.metrics.observe(self.video_row(record), self.channel_row(record), self.playlist_row(record))
+
+    def batch_rows(self, records: list[VideoRecord]) -> dict[str, list[dict]]:
+        # rows per table for Sink.write_batch, known channels/playlists are left out
+        rows = {
+            'Channel': [row for row in map(self.channel_row, records)
+                        if not (self.seen and self.seen.has_channel(row['C_ID']))],
+            'Playlist': [row for row in map(self.playlist_row, records)
+                         if not (self.seen and self.seen.has_playlist(row['P_ID']))],
+            'Video': [self.video_row(r) for r in records],
+            'Tags': [row for r in records for row in self.tag_rows(r)],
+            'VideoCategory': [row for r in records for row in self.category_rows(r)],
+        }
+        return {table: self.dedupe_rows(table_rows, TABLE_KEYS[table]) for table, table_rows in rows.items()}
+
+    def committed(self, records: list[VideoRecord], new_videos: set[str]):
+        RECORDS_LOADED.inc(len(records))
+        if len(new_videos) < len(records):
+            DUPLICATES_SKIPPED.labels(kind="stored_video").inc(len(records) - len(new_videos))
+        self.mark_seen(records)
+        for record in records:
+            if record.video_id in new_videos:
+                new_videos.discard(record.video_id)  # a video repeated inside the batch is counted once
+                self.observe(record)
+                if self.search_index is not None:
+                    self.search_index.add(record)
+
+    def process_batch(self, records: list[VideoRecord | dict], sink: Sink) -> int:
         """
-        cursor.execute(sql, category)
-        row = cursor.fetchone()
-        if row is not None:
-            return row[0]
-        cursor.execute("SELECT CT_ID FROM Category WHERE CT_Category = ?", category)
-        existing = cursor.fetchone()
-        if existing:
-            return existing[0]
-
-    def insert_video_category(self, cursor, video_id: str, category_id: int):
-        sql = """
-        INSERT INTO VideoCategoryJunc (VC_V, VC_CT)
-        VALUES (?, ?);
+        Writes a batch of records through the sink in one transaction. Duplicates inside the batch
+        are removed here and rows that already exist are skipped by the sink, so re-discovered
+        content does not fail the batch. Legacy dict records (JSON dumps, Mongo) are projected first.
+        Returns the number of records that could not be written.
         """
-        cursor.execute(sql, (video_id, category_id))
-
-    def extract_category_data(self, record: dict, cursor):
-        yt_meta = record.get('YtMetadata', {})
-        categories = yt_meta.get("categories") or []
-        video_id = yt_meta.get("id")
-        for category in categories:
-            if not isinstance(category, str) or not category.strip():
-                continue
-            category_clean = category.strip()
-            category_id = self.upsert_category(cursor, category_clean)
-            self.insert_video_category(cursor, video_id, category_id)
-
-    def extract_tags_data(self, record: dict, cursor, columns: list, table: str):
-        yt_meta = record.get('YtMetadata', {})
-        video_id = yt_meta.get("id")
-        tags = yt_meta.get('tags') or []
-        for tag in tags:
-            row_dict = {
-                'Tag': tag,
-                'VT_V': video_id
-            }
-            self.insert_row(row_dict, columns, table, cursor)
-# ___________________________________END OF ETL___________________________________________________________________________
+        records = self.unseen([VideoRecord.coerce(r) for r in records])
+        if not records:
+            return 0
+        try:
+            new_videos = sink.write_batch(self.batch_rows(records))
+        except sink.errors as e:
+            DB_ERRORS.labels(scope="batch").inc()
+            # one bad row (e.g. an over-long title) fails the whole batch, so fall back to
+            # the single record path to keep every good record in the batch
+            self.events(f"batch of {len(records)} failed, retrying per record: {e}", [])
+            failed = 0
+            for record in records:
+                try:
+                    self.process_record(record, sink)
+                except sink.errors as record_error:
+                    failed += 1
+                    DB_ERRORS.labels(scope="record").inc()
+                    self.events(str(record_error), [record.video_id])
+            return failed
+        self.committed(records, new_videos)
+        return 0
+#___________________________________END OF BATCH LOADING___________________________________________________________________________
 
 # ___________________________________METRIC LOG WRITING___________________________________________________________________________
-    def write_metrics(self, cursor, path="metrics_log.json"):
-        metrics = {}
-
-        # Total counts
-        cursor.execute("SELECT COUNT(*) FROM Video")
-        metrics["video_count"] = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM Channel")
-        metrics["channel_count"] = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM Playlist")
-        metrics["playlist_count"] = cursor.fetchone()[0]
-
-        # Average values
-        cursor.execute("SELECT AVG(V_Duration) FROM Video")
-        metrics["avg_video_duration"] = cursor.fetchone()[0]
-        cursor.execute("SELECT AVG(V_Views) FROM Video")
-        metrics["avg_video_views"] = cursor.fetchone()[0]
-        cursor.execute("SELECT AVG(V_Likes) FROM Video")
-        metrics["avg_video_likes"] = cursor.fetchone()[0]
-
-        # Playlist metrics
-        cursor.execute("""
-            SELECT P_Title, SUM(ISNULL(V_Duration,0)) AS total_duration
-            FROM Playlist
-            JOIN Video ON Playlist.P_ID = Video.V_P_ID
-            GROUP BY P_Title
-            ORDER BY total_duration DESC
-        """)
-        playlist_durations = cursor.fetchall()
-        if playlist_durations:
-            metrics["longest_playlist"] = {
-                "P_Title": playlist_durations[0][0],
-                "total_duration": playlist_durations[0][1]
-            }
-            # Average playlist length
-            avg_playlist_len = float(sum(row[1] for row in playlist_durations) / len(playlist_durations))
-            metrics["avg_playlist_duration"] = avg_playlist_len
-        else:
-            metrics["longest_playlist"] = {"P_Title": None, "total_duration": 0}
-            metrics["avg_playlist_duration"] = 0
-
-        # Top video by views
-        cursor.execute("""
-            SELECT V_Title, V_Views
-            FROM Video
-            ORDER BY V_Views DESC
-        """)
-        top_by_views = cursor.fetchone()
-        metrics["top_video_by_views"] = {"V_Title": top_by_views[0],
-                                         "V_Views": top_by_views[1]} if top_by_views else None
-
-        # Top video by likes
-        cursor.execute("""
-            SELECT V_Title, V_Likes
-            FROM Video
-            ORDER BY V_Likes DESC
-        """)
-        top_by_likes = cursor.fetchone()
-        metrics["top_video_by_likes"] = {"V_Title": top_by_likes[0],
-                                         "V_Likes": top_by_likes[1]} if top_by_likes else None
-
-        # Top video by duration
-        cursor.execute("""
-            SELECT V_Title, V_Duration
-            FROM Video
-            ORDER BY V_Duration DESC
-        """)
-        top_by_duration = cursor.fetchone()
-        metrics["top_video_by_duration"] = {"V_Title": top_by_duration[0],
-                                            "V_Duration": top_by_duration[1]} if top_by_duration else None
-
-        # Top channel by number of videos
-        cursor.execute("""
-            SELECT C_Name, COUNT(Video.V_ID) AS video_count
-            FROM Channel
-            JOIN Video ON Channel.C_ID = Video.V_C_ID
-            GROUP BY C_Name
-            ORDER BY video_count DESC
-        """)
-        top_channel = cursor.fetchone()
-        metrics["top_channel_by_videos"] = {"C_Name": top_channel[0],
-                                            "video_count": top_channel[1]} if top_channel else None
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(metrics, f, indent=4)
+    def warm(self, sink: Sink):
+        # sinks without SQL (Mongo) start from an empty index and this session's counts
+        if sink.cursor is None:
+            return
+        if self.seen is not None:
+            self.seen.warm(sink.cursor)
+        self.metrics.seed(sink.cursor)
+
+    def write_metrics(self, sink: Sink, path="metrics_log.json"):
+        # snapshot of the in-memory aggregate; the full SQL pass only runs on first use and every
+        # reconcile_every records, to correct drift (e.g. rows written by another process)
+        with STAGE_SECONDS.time(stage="write_metrics"):
+            due = self.reconcile_every and self.processed_count - self.reconciled_at >= self.reconcile_every
+            if sink.cursor is not None and (not self.metrics.seeded or due):
+                self.metrics.seed(sink.cursor)
+                self.reconciled_at = self.processed_count
+            snapshot = self.metrics.snapshot()
+            write_json_atomic(path, snapshot)
+            if self.history is not None:
+                self.history.append(snapshot)
 #___________________________________END OF LOG WRITING___________________________________________________________________________
 
 #___________________________________RUN POINT___________________________________________________________________________
 
-    def process_record(self, record: dict, cursor):
-        tables = {
-            'Channel': {'func': self.extract_channel_data, 'columns': ["C_ID", "C_Name", "C_URL", "C_Uploader"]},
-            'Playlist': {'func': self.extract_playlist_data, 'columns': ["P_ID", "P_Title", "P_URL", "P_C_ID"]},
-            'Video': {'func': self.extract_video_data, 'columns': ["V_ID", "V_Title", "V_URL", "V_P_ID", "V_Duration", "V_Views", "V_Likes", "V_UploadDate", "V_C_ID", "V_Description", "V_Embed"]},
-            'Tags': {'func': self.extract_tags_data, 'columns': ["Tag", "VT_V"]}
-        }
-        #for table, info in tables.items():
-            #extraction_function = info['func']
-            #extraction_function(record, cursor, info['columns'], table)
-        self.extract_channel_data(record, cursor, tables['Channel']['columns'], 'Channel')
-        cursor.connection.commit()
-        self.extract_playlist_data(record, cursor, tables['Playlist']['columns'], 'Playlist')
-        cursor.connection.commit()
-        self.extract_video_data(record, cursor, tables['Video']['columns'], 'Video')
-        cursor.connection.commit()
-        self.extract_tags_data(record, cursor, tables['Tags']['columns'], 'Tags')
-        cursor.connection.commit()
-        self.extract_category_data(record, cursor)
-        cursor.connection.commit()
-
-    def run(self):
-        conn = pyodbc.connect('Driver={ODBC Driver 17 for SQL Server};'
-                              'Server=CARVERLENYOGA7I;'
-                              'Database=BD_Project;'
-                              'Trusted_Connection=yes;')
-        cursor = conn.cursor()
-        processed_count = 0
-        search = YTSearch()
-        while True:
-            record = search.fetch_random_video_metadata() # Run the API connection code
-            if record:
-                self.process_record(record, cursor)
-                processed_count += 1
-                if processed_count % 5 == 0:
-                    self.write_metrics(cursor, r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\logs\metrics_log.json")
-                    #CollectMetrics.write_metrics(cursor, 1, r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\logs\metrics_log.json")
-
-
-#For file reading
-#    def run(self):
-#        conn = pyodbc.connect('Driver={ODBC Driver 17 for SQL Server};'
-#                              'Server=CARVERLENYOGA7I;'
-#                              'Database=BD_Project;'
-#                              'Trusted_Connection=yes;')
-#        cursor = conn.cursor()
-#        processed_count = 0
-#        path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\DSA 469 Big Data\YouTubeDB.UnlistedVideoMetadata2 (1).json"
-#        with open(path, "r", encoding='utf-8') as f:
-#            #data = json.load(f)
-#            for record in ijson.items(f, 'item'):
-#                if processed_count == 0:
-#                    print("collected json file")
-#                self.process_record(record, cursor)
-#                processed_count += 1
-#                if processed_count % 50 == 0:
-#                    self.write_metrics(cursor)
\ No newline at end of file
+    def process_record(self, record: VideoRecord | dict, sink: Sink):
+        records = self.unseen([VideoRecord.coerce(record)])
+        if records:
+            self.committed(records, sink.write_batch(self.batch_rows(records)))
+
+    def query_scheduler(self, word_list: list[str] | None = None) -> QueryScheduler:
+        # one scheduler and request budget for every fetch thread, so term scores and backoff are shared
+        with self.scheduler_lock:
+            if self.scheduler is None:
+                self.scheduler = QueryScheduler(word_list, RequestBudget(self.requests_per_sec))
+            return self.scheduler
+
+    def make_search(self) -> YTSearch:
+        return YTSearch(seen=self.seen, scheduler=self.query_scheduler())
+
+    def load(self, batch: list[VideoRecord], sink: Sink):
+        if self.batch_size == 1 and len(batch) == 1:
+            self.process_record(batch[0], sink)
+        else:
+            self.process_batch(batch, sink)
+        self.record_progress(len(batch), sink)
+
+    def record_progress(self, count: int, sink: Sink):
+        with self.progress_lock:
+            previous_count = self.processed_count
+            self.processed_count += count
+            due = self.processed_count // self.metrics_every > previous_count // self.metrics_every
+            if due:
+                self.write_metrics(sink, self.METRICS_PATH)
+
+    def run(self, stop=None):
+        """
+        stop: an Event checked between records (a multiprocessing one in sharded_crawler.py); the batch in flight is written.
+        The search runs in a thread of its own, so a partial batch is written once batch_timeout_ms has
+        passed even while the search is still waiting on YouTube for the next record.
+        """
+        sink = self.connect()
+        self.warm(sink)
+        stop = stop or threading.Event()
+        records = queue.Queue(maxsize=self.batch_size)
+        self.fetchers_running = 1
+        threading.Thread(target=self.fetch_worker, args=(records, stop), daemon=True, name="fetch-0").start()
+        try:
+            self.load_queued(records, stop, sink)
+        finally:
+            sink.close()
+
+#___________________________________PIPELINED RUN___________________________________________________________________________
+    def fetch_worker(self, records: queue.Queue, stop: threading.Event, spool: Spool | None = None):
+        try:
+            search = self.make_search()  # yt_dlp state is not shared between threads, so every fetcher owns one
+            for record in search.iter_video_metadata():
+                if stop.is_set():
+                    return
+                if spool is not None:
+                    spool.append(record)  # never waits for the loaders, the spool absorbs a slow database
+                    continue
+                # put() blocks while the queue is full, which throttles fetchers to the loaders' pace
+                while not stop.is_set():
+                    try:
+                        records.put(record, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+        except BaseException as e:
+            # loaders only finish once stop is set, so they would wait on the empty queue forever
+            stop.set()
+            print(f"[FETCH] {threading.current_thread().name} died, stopping the pipeline: {e!r}")
+            self.events(f"fetcher died: {e!r}", [])
+            raise
+        finally:
+            with self.fetchers_lock:
+                self.fetchers_running -= 1
+                if not self.fetchers_running:
+                    stop.set()  # nothing more will be fetched: loaders drain the queue and exit
+
+    def load_worker(self, records: queue.Queue, stop: threading.Event):
+        try:
+            if self.spool is not None:
+                return self.load_spooled(stop)
+            self.load_queued(records, stop)
+        except BaseException as e:
+            # without this loader the queue fills up and the fetchers would wait on it forever
+            stop.set()
+            print(f"[LOAD] {threading.current_thread().name} died, stopping the pipeline: {e!r}")
+            self.events(f"loader died: {e!r}", [])
+            raise
+
+    def load_queued(self, records: queue.Queue, stop: threading.Event, sink: Sink | None = None):
+        """Loads the queue in batches until stop is set and the queue is drained; opens its own sink unless given one."""
+        own_sink = sink is None
+        sink = sink or self.connect()
+        batch = []
+        batch_started = 0.0
+        try:
+            while not stop.is_set() or not records.empty():
+                wait = self.batch_timeout_ms / 1000
+                if batch:
+                    wait = max(0.0, wait - (time.monotonic() - batch_started))
+                try:
+                    # woken at least every second to notice stop
+                    record = records.get(timeout=min(wait, 1.0) or 0.01)
+                    if not batch:
+                        batch_started = time.monotonic()
+                    batch.append(record)
+                except queue.Empty:
+                    pass
+                waited_ms = (time.monotonic() - batch_started) * 1000
+                if batch and (len(batch) >= self.batch_size or waited_ms >= self.batch_timeout_ms):
+                    self.load_logged(batch, sink)
+                    batch = []
+        except KeyboardInterrupt:  # only in run(), where the main thread is the loader
+            stop.set()
+            print("[LOAD] stopping, writing the batch in flight")
+        if batch:
+            self.load_logged(batch, sink)
+        if own_sink:
+            sink.close()
+
+    def load_logged(self, batch: list[VideoRecord], sink: Sink):
+        # rows the database rejects are handled by process_batch; records that fail otherwise are logged
+        # and skipped, not the loader. Database errors that get this far (a dead connection) end the loader.
+        try:
+            self.load(batch, sink)
+        except sink.errors:
+            raise
+        except Exception:
+            self.process_isolated(batch, sink)
+
+    def load_spooled(self, stop: threading.Event):
+        """
+        Loader in spool mode: the spool's committed position only moves once a batch is written. While
+        the database is unreachable the batch is retried with backoff instead of being dropped; rows the
+        database rejects, and records that cannot be turned into rows at all, are logged and skipped.
+        """
+        sink = None
+        while not stop.is_set():
+            batch, position = self.spool.read_batch(self.batch_size, self.batch_timeout_ms / 1000)
+            if not batch:
+                continue
+            backoff = 1.0
+            while True:
+                try:
+                    sink = sink or self.connect()
+                except Exception as e:  # connect() failing, before there is a sink to know the driver's errors
+                    print(f"[SPOOL] database unreachable: {e}")
+                else:
+                    try:
+                        if not self.process_isolated(batch, sink) or sink.healthy():
+                            break
+                    except sink.errors as e:
+                        print(f"[SPOOL] database unreachable: {e}")
+                if sink is not None:
+                    try:
+                        sink.close()
+                    except Exception:
+                        pass
+                    sink = None
+                if stop.is_set():
+                    return  # not committed, loaded again on the next start
+                print(f"[SPOOL] batch of {len(batch)} kept in the spool, retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            self.spool.commit(position)
+            self.record_progress(len(batch), sink)
+        if sink is not None:
+            sink.close()
+
+    def process_isolated(self, records: list[VideoRecord], sink: Sink) -> int:
+        """
+        process_batch, except that a record the row builders fail on (a malformed spool line, a bug) is
+        logged as a failed record instead of failing the batch again on every retry. Database errors
+        are passed on. Returns the number of records that could not be written.
+        """
+        try:
+            return self.process_batch(records, sink)
+        except sink.errors:
+            raise
+        except Exception as e:
+            self.events(f"batch of {len(records)} not loadable, retrying per record: {e!r}", [])
+        failed = 0
+        for record in records:
+            try:
+                failed += self.process_batch([record], sink)
+            except sink.errors:
+                raise
+            except Exception as e:
+                failed += 1
+                DB_ERRORS.labels(scope="unloadable").inc()
+                self.events(f"record not loadable: {e!r}", [getattr(record, "video_id", None)])
+        return failed
+
+    def run_pipelined(self, stop=None):
+        """
+        Overlaps scraping and loading: fetch_workers threads feed a queue bounded by queue_depth (or the
+        spool), load_workers threads (one sink each) drain it in batches. Setting `stop` ends the run
+        like Ctrl+C does.
+        """
+        sink = self.connect()
+        self.warm(sink)
+        sink.close()
+        records = queue.Queue(maxsize=self.queue_depth)
+        stop = stop or threading.Event()
+        workers = [threading.Thread(target=self.fetch_worker, args=(records, stop, self.spool), daemon=True, name=f"fetch-{i}")
+                   for i in range(self.fetch_workers)]
+        self.fetchers_running = self.fetch_workers
+        workers += [threading.Thread(target=self.load_worker, args=(records, stop), daemon=True, name=f"load-{i}")
+                    for i in range(self.load_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            # the loaders finish once stop is set and the queue is drained; a fetcher still inside an
+            # extraction then sees stop on its next record and is not waited for
+            loaders = workers[self.fetch_workers:]
+            while any(worker.is_alive() for worker in loaders):
+                for worker in loaders:
+                    worker.join(timeout=1)
+        except KeyboardInterrupt:
+            # loaders write what they already hold; fetchers may be inside an extraction and are left behind
+            print("[LOAD] stopping, writing the batches in flight (Ctrl+C again to abort)")
+            stop.set()
+            for worker in workers[self.fetch_workers:]:
+                worker.join(timeout=self.batch_timeout_ms / 1000 + 30)
+        if self.spool is not None:
+            self.spool.close()
+#___________________________________END OF PIPELINED RUN___________________________________________________________________________
@@ -0,0 +1,141 @@
+"""
+ETL events (failed batches, rejected records) as JSON lines, written off the load threads: log() appends
+the event to a bounded buffer and returns, a background thread writes whatever has collected every
+flush_interval seconds in one go and rotates the file by size. Duplicate key errors are not written one
+by one; they are counted per table and written as one summary line per table and interval.
+"""
+import atexit
+import collections
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from instrumentation import EVENTS_LOGGED, EVENTS_DROPPED
+
+# table of a SQL Server 2627/2601, SQLite or MongoDB E11000 duplicate key message
+DUPLICATE_OBJECT = re.compile(r"in object '([^']+)'|UNIQUE constraint failed: ([\w.]+)|collection: ([\w.]+)")
+
+
+def timestamp(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec="milliseconds")
+
+
+class EventLog:
+    SAMPLE_SIZE = 5  # values kept per duplicate key summary
+
+    def __init__(self, path: str, max_bytes: int = 10 * 2 ** 20, backups: int = 5, capacity: int = 10000,
+                 flush_interval: float = 1.0):
+        """
+        capacity bounds the buffer; events logged while it is full are dropped and counted
+        (etl_events_dropped_total) rather than blocking the caller. The file is rotated to path.1 ..
+        path.<backups> once it exceeds max_bytes.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.capacity = max(1, capacity)
+        self.pending = collections.deque()  # append/popleft are atomic, so log() takes no lock
+        self.logged = {kind: EVENTS_LOGGED.labels(kind=kind) for kind in ("duplicate_key", "error")}
+        self.duplicates = {}  # message without the key value -> [count, first seen, sample values]
+        self.duplicates_lock = threading.Lock()
+        self.file = None
+        self.closed = threading.Event()
+        self.writer = threading.Thread(target=self.write_loop, name="event-log", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    # ______LOGGING______
+    def log(self, message: str, values: list | None = None, kind: str | None = None):
+        """Never blocks: duplicate key errors only bump a counter, anything else is buffered or dropped."""
+        if kind is None:
+            kind = "duplicate_key" if ("duplicate key" in message or "E11000" in message
+                                       or "UNIQUE constraint failed" in message) else "error"
+        if kind == "duplicate_key":
+            # grouped by the message minus the key value; the writer works out the table
+            group = message.partition(" The duplicate key value")[0].partition(" dup key:")[0]
+            with self.duplicates_lock:
+                entry = self.duplicates.get(group)
+                if entry is None:
+                    entry = self.duplicates[group] = [0, time.time(), []]
+                entry[0] += 1
+                if values and len(entry[2]) < self.SAMPLE_SIZE:
+                    entry[2].extend(values[:self.SAMPLE_SIZE - len(entry[2])])
+            self.logged[kind].inc()
+            return
+        if len(self.pending) >= self.capacity:
+            EVENTS_DROPPED.inc()
+            return
+        self.pending.append((time.time(), kind, message, values))
+        (self.logged.get(kind) or EVENTS_LOGGED.labels(kind=kind)).inc()
+
+    # ______WRITING______
+    def write_loop(self):
+        while True:
+            closing = self.closed.wait(self.flush_interval)
+            lines = [self.format(*self.pending.popleft()) for _ in range(len(self.pending))]
+            lines.extend(self.summaries())
+            if lines:
+                self.write(lines)
+            if closing:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                return
+
+    @staticmethod
+    def format(ts: float, kind: str, message: str, values: list | None) -> str:
+        return json.dumps({"ts": timestamp(ts), "kind": kind, "message": message, "values": values or []},
+                          separators=(",", ":"), ensure_ascii=False, default=str)
+
+    def summaries(self) -> list[str]:
+        with self.duplicates_lock:
+            groups, self.duplicates = self.duplicates, {}
+        tables = {}
+        for message, (count, since, sample) in groups.items():
+            match = DUPLICATE_OBJECT.search(message)
+            table = next((name for name in match.groups() if name), "unknown") if match else "unknown"
+            entry = tables.setdefault(table, [0, since, []])
+            entry[0] += count
+            entry[1] = min(entry[1], since)
+            entry[2].extend(sample[:self.SAMPLE_SIZE - len(entry[2])])
+        now = time.time()
+        return [json.dumps({"ts": timestamp(now), "kind": "duplicate_key", "table": table, "count": count,
+                            "since": timestamp(since), "sample": sample}, separators=(",", ":"), default=str)
+                for table, (count, since, sample) in tables.items()]
+
+    def write(self, lines: list[str]):
+        try:
+            if self.file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write("\n".join(lines) + "\n")
+            self.file.flush()
+            if self.file.tell() >= self.max_bytes:
+                self.rotate()
+        except OSError as e:
+            EVENTS_DROPPED.inc(len(lines))
+            print(f"[EVENTS] {len(lines)} events not written: {e}")
+
+    def rotate(self):
+        self.file.close()
+        self.file = None
+        for n in range(self.backups - 1, 0, -1):
+            older = Path(f"{self.path}.{n}")
+            if older.exists():
+                os.replace(older, f"{self.path}.{n + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            self.path.unlink()
+
+    def close(self):
+        """Writes what is buffered and the pending duplicate counts, then stops the writer."""
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.writer.join()
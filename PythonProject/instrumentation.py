@@ -0,0 +1,187 @@
+import bisect
+import math
+import threading
+import time
+
+# seconds; a video extraction takes ~1 s, a batched MERGE a few ms
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Registry:
+    """Every metric registers itself here; render() produces the Prometheus text exposition format."""
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), registry: Registry | None = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, **labels):
+        """Child series for one label combination; keep the result around on hot paths."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self.new_child())
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def series(self):
+        with self.lock:
+            items = list(self.children.items())
+        for key, child in sorted(items):
+            yield dict(zip(self.labelnames, key)), child
+
+
+class CounterChild:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for labels, child in self.series():
+            yield f"{self.name}{format_labels(labels)} {format_value(child.value)}"
+
+
+class Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, not cumulative; the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> Timer:
+        return Timer(self)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS,
+                 registry: Registry | None = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self, **labels) -> Timer:
+        return Timer(self.labels(**labels))
+
+    def samples(self):
+        for labels, child in self.series():
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{format_labels({**labels, 'le': format_value(bound)})} {cumulative}"
+            yield f"{self.name}_sum{format_labels(labels)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(labels)} {count}"
+
+
+# ______PIPELINE METRICS______
+STAGE_SECONDS = Histogram("etl_stage_seconds", "Time per pipeline stage (search, playlist, video, project, sanitize, commit, write_metrics).", ("stage",))
+TABLE_WRITE_SECONDS = Histogram("etl_table_write_seconds", "Time to write one batch into one table.", ("table",))
+VIDEOS_FETCHED = Counter("etl_videos_fetched_total", "Video metadata records produced by YTSearch.")
+RECORDS_LOADED = Counter("etl_records_loaded_total", "Records handed to a sink and committed.")
+DUPLICATES_SKIPPED = Counter("etl_duplicates_skipped_total", "Content skipped because it was already known.", ("kind",))
+DOWNLOAD_ERRORS = Counter("etl_download_errors_total", "yt_dlp DownloadErrors per extraction stage.", ("stage",))
+DB_ERRORS = Counter("etl_db_errors_total", "Failed sink writes, per batch and per single record retry; unloadable: records no rows could be built from.", ("scope",))
+OUTBOUND_REQUESTS = Counter("etl_outbound_requests_total", "extract_info calls made against YouTube, per stage.", ("stage",))
+REQUEST_BACKOFFS = Counter("etl_request_backoffs_total", "Pauses of the shared request budget after repeated request failures.")
+METRIC_QUERY_SECONDS = Histogram("etl_metric_query_seconds", "Time per metric query of database/*.sql (cache misses only).", ("query",))
+METRIC_QUERY_CACHE_HITS = Counter("etl_metric_query_cache_hits_total", "Metric query results served from QueryRegistry's cache.", ("query",))
+EVENTS_LOGGED = Counter("etl_events_logged_total", "Events handed to the EventLog (duplicate key errors are written as summaries).", ("kind",))
+SNAPSHOT_LATE_ROWS = Counter("etl_snapshot_late_rows_total", "Rows committed below SnapshotExporter's lookback window, found by the count check and read again.", ("table",))
+STATS_REFRESHED = Counter("etl_stats_refreshed_total", "Videos re-read by StatsRefresher, by outcome (changed, unchanged, unavailable).", ("result",))
+EVENTS_DROPPED = Counter("etl_events_dropped_total", "Events lost because the EventLog queue was full or the file could not be written.")
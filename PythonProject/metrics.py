@@ -1,99 +1,216 @@
 import json
+import os
+import threading
+import time
+from query_registry import QueryRegistry
+
 
 class CollectMetrics:
-        def __main__(self, cursor, activate: int=0, path="metrics_log.json"):
-            metrics = {}
-
-            # Total counts
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\video_count.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            metrics["video_count"] = cursor.fetchone()[0]
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\channel_count.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            metrics["channel_count"] = cursor.fetchone()[0]
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\playlist_count.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            metrics["playlist_count"] = cursor.fetchone()[0]
-
-            # Average values
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\ave_video_duration.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            metrics["avg_video_duration"] = cursor.fetchone()[0]
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\ave_video_views.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            metrics["avg_video_views"] = cursor.fetchone()[0]
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\ave_video_likes.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            metrics["avg_video_likes"] = cursor.fetchone()[0]
-
-            # Playlist metrics
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\longest_playlist.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            playlist_durations = cursor.fetchall()
-            if playlist_durations:
-                metrics["longest_playlist"] = {
-                    "P_Title": playlist_durations[0][0],
-                    "total_duration": playlist_durations[0][1]
-                }
-                # Average playlist length
-                avg_playlist_len = float(sum(row[1] for row in playlist_durations) / len(playlist_durations))
-                metrics["avg_playlist_duration"] = avg_playlist_len
+    """
+    The metrics_log.json figures straight from SQL Server with the queries of database/*.sql, without
+    the in-memory MetricsAggregator. The queries run concurrently through a QueryRegistry, each result
+    is reused for the registry's ttl.
+    """
+    SCALARS = {"video_count": "video_count", "channel_count": "channel_count", "playlist_count": "playlist_count",
+               "avg_video_duration": "ave_video_duration", "avg_video_views": "ave_video_views",
+               "avg_video_likes": "ave_video_likes"}
+    TOP = {"top_video_by_views": ("top_video_by_views", "V_Title", "V_Views"),
+           "top_video_by_likes": ("top_video_by_likes", "V_Title", "V_Likes"),
+           "top_video_by_duration": ("top_video_by_duration", "V_Title", "V_Duration"),
+           "top_channel_by_videos": ("top_channel_by_video", "C_Name", "video_count")}
+
+    def __init__(self, registry: QueryRegistry):
+        self.registry = registry
+
+    def collect(self) -> dict:
+        rows = self.registry.run_all()
+        metrics = {key: rows[query][0] if rows[query] else None for key, query in self.SCALARS.items()}
+
+        longest = rows["longest_playlist"]
+        if longest:
+            metrics["longest_playlist"] = {"P_Title": longest[0], "total_duration": longest[1]}
+            metrics["avg_playlist_duration"] = float(rows["avg_playlist_duration"][0] or 0)
+        else:
+            metrics["longest_playlist"] = {"P_Title": None, "total_duration": 0}
+            metrics["avg_playlist_duration"] = 0
+
+        for key, (query, label, value) in self.TOP.items():
+            row = rows[query]
+            metrics[key] = {label: row[0], value: row[1]} if row else None
+        return metrics
+
+    def write_metrics(self, path="metrics_log.json"):
+        write_json_atomic(path, self.collect())
+
+    def run(self, path="metrics_log.json", every: float = 60.0, stop: threading.Event | None = None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.write_metrics(path)
+            stop.wait(every)
+
+
+def write_json_atomic(path: str, data, retries: int = 5):
+    """
+    Write to a temp file and swap it in, so readers never see a half-written file. On Windows the
+    swap fails while another process has the target open, so it is retried briefly.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+    for attempt in range(retries):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(0.05)
+
+
+class MetricsAggregator:
+    """
+    Keeps the metrics_log.json figures in memory. seed() reads them from the database once, after
+    that observe() updates them in O(1) for every newly stored video, so writing the metrics log is
+    a snapshot instead of ten queries over the whole Video table. Calling seed() again reconciles
+    with the database.
+    Per-channel and per-playlist tallies are keyed by C_ID / P_ID, like database/top_channel_by_video.sql
+    and longest_playlist.sql. The original queries grouped by C_Name / P_Title, which added up unrelated
+    channels that share a name and playlists that share a title ("Music", "Favorites"). The reported
+    name or title is that of the single top channel or playlist.
+    """
+    TRACKED = {"V_Duration": "avg_video_duration", "V_Views": "avg_video_views", "V_Likes": "avg_video_likes"}
+    TOP = {"V_Views": "top_video_by_views", "V_Likes": "top_video_by_likes", "V_Duration": "top_video_by_duration"}
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seeded = False
+        self.reset()
+
+    def reset(self):
+        self.video_count = 0
+        self.channel_count = 0
+        self.playlist_count = 0
+        self.sums = {col: [0, 0] for col in self.TRACKED}  # column -> [sum, non-null count]
+        self.top = {col: None for col in self.TOP}  # column -> (V_Title, value)
+        self.channels = {}  # C_ID -> [C_Name, video_count]
+        self.playlists = {}  # P_ID -> [P_Title, total_duration, video_count]
+        self.top_channel = None
+        self.longest_playlist = None
+        self.playlists_with_videos = 0
+        self.playlist_duration_sum = 0
+
+    def seed(self, cursor):
+        with self.lock:
+            self.reset()
+            cursor.execute("SELECT COUNT(*) FROM Video")
+            self.video_count = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM Channel")
+            self.channel_count = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM Playlist")
+            self.playlist_count = cursor.fetchone()[0]
+
+            for col in self.TRACKED:
+                cursor.execute(f"SELECT SUM({col}), COUNT({col}) FROM Video")
+                total, count = cursor.fetchone()
+                self.sums[col] = [total or 0, count or 0]
+            for col in self.TOP:
+                cursor.execute(f"SELECT V_Title, {col} FROM Video WHERE {col} = (SELECT MAX({col}) FROM Video)")
+                row = cursor.fetchone()
+                self.top[col] = (row[0], row[1]) if row else None
+
+            cursor.execute("""
+                SELECT C_ID, C_Name, COUNT(V_ID)
+                FROM Channel
+                LEFT JOIN Video ON Channel.C_ID = Video.V_C_ID
+                GROUP BY C_ID, C_Name
+            """)
+            for c_id, c_name, video_count in cursor.fetchall():
+                self.channels[c_id] = [c_name, video_count]
+                self.check_top_channel(c_id)
+
+            cursor.execute("""
+                SELECT P_ID, P_Title, SUM(COALESCE(V_Duration, 0)), COUNT(V_ID)
+                FROM Playlist
+                LEFT JOIN Video ON Playlist.P_ID = Video.V_P_ID
+                GROUP BY P_ID, P_Title
+            """)
+            for p_id, p_title, total_duration, video_count in cursor.fetchall():
+                self.playlists[p_id] = [p_title, total_duration or 0, video_count]
+                if video_count:
+                    self.playlists_with_videos += 1
+                    self.playlist_duration_sum += total_duration or 0
+                    self.check_longest_playlist(p_id)
+            self.seeded = True
+
+    def check_top_channel(self, c_id):
+        if self.top_channel is None or self.channels[c_id][1] > self.channels[self.top_channel][1]:
+            self.top_channel = c_id
+
+    def check_longest_playlist(self, p_id):
+        if self.longest_playlist is None or self.playlists[p_id][1] > self.playlists[self.longest_playlist][1]:
+            self.longest_playlist = p_id
+
+    def observe(self, video: dict, channel: dict, playlist: dict):
+        """video/channel/playlist are the rows ETLWorker wrote for one newly inserted video."""
+        with self.lock:
+            self.video_count += 1
+            for col, totals in self.sums.items():
+                value = video.get(col)
+                if value is None:
+                    continue
+                totals[0] += value
+                totals[1] += 1
+                if col in self.top and (self.top[col] is None or value > self.top[col][1]):
+                    self.top[col] = (video.get('V_Title'), value)
+
+            c_id = video.get('V_C_ID')
+            if c_id:
+                if c_id not in self.channels:
+                    self.channels[c_id] = [channel.get('C_Name'), 0]
+                    self.channel_count += 1
+                self.channels[c_id][1] += 1
+                self.check_top_channel(c_id)
+
+            p_id = video.get('V_P_ID')
+            if p_id:
+                if p_id not in self.playlists:
+                    self.playlists[p_id] = [playlist.get('P_Title'), 0, 0]
+                    self.playlist_count += 1
+                entry = self.playlists[p_id]
+                if entry[2] == 0:
+                    self.playlists_with_videos += 1
+                entry[1] += video.get('V_Duration') or 0
+                entry[2] += 1
+                self.playlist_duration_sum += video.get('V_Duration') or 0
+                self.check_longest_playlist(p_id)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            metrics = {
+                "video_count": self.video_count,
+                "channel_count": self.channel_count,
+                "playlist_count": self.playlist_count,
+            }
+            # integer division to match SQL Server's AVG over BIGINT columns
+            for col, key in self.TRACKED.items():
+                total, count = self.sums[col]
+                metrics[key] = total // count if count else None
+
+            if self.longest_playlist is not None:
+                p_title, total_duration, _ = self.playlists[self.longest_playlist]
+                metrics["longest_playlist"] = {"P_Title": p_title, "total_duration": total_duration}
+                metrics["avg_playlist_duration"] = float(self.playlist_duration_sum / self.playlists_with_videos)
             else:
                 metrics["longest_playlist"] = {"P_Title": None, "total_duration": 0}
                 metrics["avg_playlist_duration"] = 0
 
-            # Top video by views
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\top_video_by_views.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            top_by_views = cursor.fetchone()
-            metrics["top_video_by_views"] = {"V_Title": top_by_views[0],
-                                             "V_Views": top_by_views[1]} if top_by_views else None
-
-            # Top video by likes
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\top_video_by_likes.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            top_by_likes = cursor.fetchone()
-            metrics["top_video_by_likes"] = {"V_Title": top_by_likes[0],
-                                             "V_Likes": top_by_likes[1]} if top_by_likes else None
-
-            # Top video by duration
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\top_video_by_duration.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            top_by_duration = cursor.fetchone()
-            metrics["top_video_by_duration"] = {"V_Title": top_by_duration[0],
-                                                "V_Duration": top_by_duration[1]} if top_by_duration else None
-
-            # Top channel by number of videos
-            path = r"C:\Users\carve\OneDrive\Documents\computer doc\'25 zFall\PythonProject\database\top_channel_by_video.sql"
-            with open(path, 'r', encoding='UTF-8') as sql:
-                SQL = str(sql)
-                cursor.execute(SQL)
-            top_channel = cursor.fetchone()
-            metrics["top_channel_by_videos"] = {"C_Name": top_channel[0],
-                                                "video_count": top_channel[1]} if top_channel else None
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(metrics, f, indent=4)
-            activate -= 1
-
-        if name == __main__():
-            main()
\ No newline at end of file
+            for col, key in self.TOP.items():
+                top = self.top[col]
+                metrics[key] = {"V_Title": top[0], col: top[1]} if top else None
+
+            if self.top_channel is not None and self.channels[self.top_channel][1]:
+                c_name, video_count = self.channels[self.top_channel]
+                metrics["top_channel_by_videos"] = {"C_Name": c_name, "video_count": video_count}
+            else:
+                metrics["top_channel_by_videos"] = None
+            return metrics
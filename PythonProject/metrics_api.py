@@ -1,23 +1,169 @@
 #available at Invoke-RestMethod http://localhost:8000/metrics
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+import asyncio
+import hashlib
 import json
+import math
+import threading
+from datetime import datetime
 from pathlib import Path
 import uvicorn
+from instrumentation import REGISTRY
+from metrics import CollectMetrics
+from startup import lazy_import
+
+# only needed once /metrics/history, /search or /metrics/snapshot is configured, so they (and numpy) load on first use
+metrics_history = lazy_import("metrics_history")
+search_index = lazy_import("search_index")
+snapshot_analytics = lazy_import("snapshot_analytics")
 
 class MetricsAPI:
-    def __init__(self, metrics_file="metrics_log.json"):
+    def __init__(self, metrics_file="metrics_log.json", stream_interval: float = 1.0,
+                 history_file: str | None = None, search_index: "search_index.SearchIndex | None" = None,
+                 snapshot_dir: str | None = None, collector: CollectMetrics | None = None):
         self.metrics_file = metrics_file
+        self.stream_interval = stream_interval
+        # read-only view of the ETL's MetricsHistory file, for /metrics/history
+        self.history = metrics_history.MetricsHistory(history_file, readonly=True) if history_file else None
+        # shared with the ETLWorker of this process, which adds the videos it stores
+        self.search_index = search_index
+        # columnar copy of the tables written by SnapshotExporter, for /metrics/snapshot
+        self.analytics = snapshot_analytics.SnapshotAnalytics(snapshot_dir) if snapshot_dir else None
+        # the same figures straight from the database/*.sql queries, for /metrics/sql
+        self.collector = collector
+        # parsed metrics are kept pre-serialized and only reloaded when the file's mtime/size change
+        self.cached_stamp = None
+        self.cached_body = None
+        self.cached_etag = None
+        self.cache_lock = threading.Lock()
 
-    def run(self):
-        app = FastAPI()
+    def load_metrics(self) -> tuple[bytes | None, str | None]:
         metrics_path = Path(self.metrics_file)
+        try:
+            stat = metrics_path.stat()
+        except FileNotFoundError:
+            return None, None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self.cache_lock:
+            if stamp != self.cached_stamp:
+                try:
+                    with metrics_path.open("r", encoding="utf-8") as f:
+                        metrics = json.load(f)
+                except (OSError, ValueError):
+                    # caught mid-write by an older writer, serve the last good copy
+                    return self.cached_body, self.cached_etag
+                self.cached_body = json.dumps(metrics, separators=(",", ":")).encode("utf-8")
+                self.cached_etag = '"' + hashlib.sha1(self.cached_body).hexdigest()[:20] + '"'
+                self.cached_stamp = stamp
+            return self.cached_body, self.cached_etag
+
+    @staticmethod
+    def etag_matches(if_none_match: str | None, etag: str) -> bool:
+        if not if_none_match:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    @staticmethod
+    def parse_time(value: str | None, name: str) -> float | None:
+        # unix seconds or ISO 8601
+        if value is None or value == "":
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            pass
+        else:
+            if not math.isfinite(seconds):
+                raise HTTPException(status_code=400, detail=f"{name} must be a finite time")
+            return seconds
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"{name} must be unix seconds or ISO 8601")
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI()
 
         @app.get("/metrics")
-        def get_metrics():
-            if not metrics_path.exists():
+        def get_metrics(request: Request):
+            body, etag = self.load_metrics()
+            if body is None:
                 raise HTTPException(status_code=404, detail="Metrics not found")
-            with metrics_path.open("r", encoding="utf-8") as f:
-                return json.load(f)
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if self.etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+            return Response(content=body, media_type="application/json", headers=headers)
+
+        @app.get("/metrics/stream")
+        async def stream_metrics(request: Request):
+            async def events():
+                last_etag = None
+                idle = 0.0
+                while not await request.is_disconnected():
+                    # stat/read/parse block, so they run on a worker thread instead of stalling every other stream
+                    body, etag = await asyncio.to_thread(self.load_metrics)
+                    if body is not None and etag != last_etag:
+                        last_etag = etag
+                        idle = 0.0
+                        yield b"event: metrics\nid: " + etag.strip('"').encode() + b"\ndata: " + body + b"\n\n"
+                    elif idle >= 15:
+                        idle = 0.0
+                        yield b": keep-alive\n\n"  # stops proxies from closing a quiet stream
+                    await asyncio.sleep(self.stream_interval)
+                    idle += self.stream_interval
+
+            return StreamingResponse(events(), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+        @app.get("/metrics/history")
+        def get_history(start: str | None = Query(None, alias="from"), end: str | None = Query(None, alias="to"),
+                        step: float | None = None, fields: str | None = None):
+            # min/max/avg per `step` seconds between from and to, from the history file rather than SQL
+            if self.history is None:
+                raise HTTPException(status_code=404, detail="Metrics history not configured")
+            if step is not None and not (math.isfinite(step) and step > 0):
+                raise HTTPException(status_code=400, detail="step must be a positive number of seconds")
+            result = self.history.query(self.parse_time(start, "from"), self.parse_time(end, "to"), step,
+                                        fields.split(",") if fields else None)
+            return Response(content=json.dumps(result, separators=(",", ":")), media_type="application/json")
+
+        @app.get("/metrics/snapshot")
+        def get_snapshot(column: str = "V_Views", top: int = 10):
+            # metrics plus percentiles and per-channel distributions, computed from the last export rather than SQL
+            if self.analytics is None:
+                raise HTTPException(status_code=404, detail="Snapshot not configured")
+            if column not in snapshot_analytics.SnapshotAnalytics.COUNTERS:
+                raise HTTPException(status_code=400, detail=f"column must be one of {', '.join(snapshot_analytics.SnapshotAnalytics.COUNTERS)}")
+            report = self.analytics.report(column, max(1, min(top, 100)))
+            if report is None:
+                raise HTTPException(status_code=404, detail="No snapshot exported yet")
+            return report
+
+        @app.get("/metrics/sql")
+        def get_sql_metrics():
+            # what the in-memory figures of /metrics are reconciled against, each query cached for the registry's ttl
+            if self.collector is None:
+                raise HTTPException(status_code=404, detail="SQL metrics not configured")
+            try:
+                return self.collector.collect()
+            except Exception as e:
+                raise HTTPException(status_code=503, detail=f"Database unavailable: {e}")
+
+        @app.get("/search")
+        def search(q: str = "", page: int = 1, page_size: int = 12):
+            if self.search_index is None:
+                raise HTTPException(status_code=404, detail="Search index not configured")
+            return self.search_index.search(q, page, page_size)
+
+        @app.get("/stats")
+        def get_stats():
+            # per-stage timings and counters of the ETL running in this process, Prometheus text format
+            return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+        return app
 
-        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    def run(self, host: str = "0.0.0.0", port: int = 8000):
+        uvicorn.run(self.create_app(), host=host, port=port)
@@ -0,0 +1,224 @@
+"""
+History of the numeric metrics_log.json figures, so trends can be charted without querying SQL Server.
+
+The file is a fixed-size ring buffer that is memory-mapped by the writer (ETLWorker) and by readers
+(MetricsAPI, possibly in another process). A 4 KB header holds the number of samples ever appended and
+the field names. After it come `capacity` rows of little-endian float64: the unix timestamp, then one
+column per field (NaN when missing). Samples are taken at most every min_interval seconds. The ring
+holds retention_s / min_interval of them, after which the oldest are overwritten.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+from startup import lazy_import
+
+np = lazy_import("numpy")
+
+
+class MetricsHistory:
+    MAGIC = b"MHIST\x00\x01\x00"
+    HEADER_SIZE = 4096
+    COUNTER = struct.Struct("<Q")  # samples ever appended, at offset 8
+    # dotted paths into the MetricsAggregator / CollectMetrics snapshot
+    FIELDS = ("video_count", "channel_count", "playlist_count",
+              "avg_video_duration", "avg_video_views", "avg_video_likes", "avg_playlist_duration",
+              "longest_playlist.total_duration", "top_video_by_views.V_Views", "top_video_by_likes.V_Likes",
+              "top_video_by_duration.V_Duration", "top_channel_by_videos.video_count")
+
+    def __init__(self, path: str, retention_s: float = 30 * 86400, min_interval: float = 10.0,
+                 fields: tuple = FIELDS, readonly: bool = False):
+        """
+        readonly opens an existing file with whatever fields it was written with (and retries on the
+        next query while it does not exist yet). A writer whose fields or capacity differ from the file's
+        moves the old file to <path>.old and starts a new one; a readonly instance notices the new file
+        on its next query and maps that instead.
+        """
+        self.path = Path(path)
+        self.min_interval = min_interval
+        self.fields = tuple(fields)
+        self.capacity = max(2, math.ceil(retention_s / min_interval))
+        self.readonly = readonly
+        self.map = None
+        self.identity = None  # (device, inode, size) of the mapped file
+        self.last_appended = float("-inf")
+        self.lock = threading.Lock()
+        self.open()
+
+    # ______FILE______
+    @property
+    def width(self) -> int:
+        return 1 + len(self.fields)
+
+    def open(self) -> bool:
+        if self.map is not None:
+            return True
+        if not self.readonly and not self.path.exists():
+            self.create()
+        try:
+            with open(self.path, "r+b" if not self.readonly else "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE)
+                stat = os.fstat(f.fileno())
+        except (FileNotFoundError, ValueError):  # ValueError: empty file
+            return False
+        header = self.read_header(mapped)
+        if header is None or (not self.readonly and (tuple(header["fields"]) != self.fields
+                                                     or header["capacity"] != self.capacity)):
+            mapped.close()
+            if self.readonly:
+                return False
+            os.replace(self.path, f"{self.path}.old")
+            print(f"[HISTORY] layout changed, previous history kept in {self.path}.old")
+            self.create()
+            return self.open()
+        self.fields = tuple(header["fields"])
+        self.capacity = header["capacity"]
+        self.map = mapped
+        self.identity = (stat.st_dev, stat.st_ino, stat.st_size)
+        newest = self.newest_timestamp()
+        if newest is not None:
+            self.last_appended = newest
+        return True
+
+    def create(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        header = json.dumps({"fields": list(self.fields), "capacity": self.capacity}).encode("utf-8")
+        if 20 + len(header) > self.HEADER_SIZE:
+            raise ValueError("too many history fields for the header")
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.MAGIC + self.COUNTER.pack(0) + struct.pack("<I", len(header)) + header)
+            f.truncate(self.HEADER_SIZE + self.capacity * self.width * 8)
+        os.replace(tmp_path, self.path)
+
+    def read_header(self, mapped) -> dict | None:
+        if len(mapped) < self.HEADER_SIZE or mapped[:8] != self.MAGIC:
+            return None
+        length = struct.unpack_from("<I", mapped, 16)[0]
+        try:
+            header = json.loads(mapped[20:20 + length])
+        except ValueError:
+            return None
+        if len(mapped) != self.HEADER_SIZE + header["capacity"] * (1 + len(header["fields"])) * 8:
+            return None
+        return header
+
+    def replaced(self) -> bool:
+        """True once the file at path is no longer the one mapped (a writer moved it to .old and started a new one)."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False  # between the move and the new file: keep reading the old one
+        return (stat.st_dev, stat.st_ino, stat.st_size) != self.identity
+
+    def close(self):
+        with self.lock:
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+
+    # ______WRITING______
+    @staticmethod
+    def lookup(metrics: dict, dotted: str) -> float:
+        value = metrics
+        for key in dotted.split("."):
+            if not isinstance(value, dict):
+                return math.nan
+            value = value.get(key)
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else math.nan
+
+    def append(self, metrics: dict, timestamp: float | None = None) -> bool:
+        """Adds one sample, unless the previous one is less than min_interval old (or newer, after a clock change)."""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if self.map is None or timestamp - self.last_appended < self.min_interval:
+                return False
+            appended = self.COUNTER.unpack_from(self.map, 8)[0]
+            offset = self.HEADER_SIZE + (appended % self.capacity) * self.width * 8
+            struct.pack_into(f"<{self.width}d", self.map, offset,
+                             timestamp, *(self.lookup(metrics, field) for field in self.fields))
+            self.COUNTER.pack_into(self.map, 8, appended + 1)  # the row is complete before readers can see it
+            self.last_appended = timestamp
+            return True
+
+    # ______READING______
+    def rows(self):
+        """All samples (oldest first) as one array per chronological run of slots; no copies."""
+        appended = self.COUNTER.unpack_from(self.map, 8)[0]
+        table = np.frombuffer(self.map, dtype="<f8", count=self.capacity * self.width,
+                              offset=self.HEADER_SIZE).reshape(self.capacity, self.width)
+        if appended <= self.capacity:
+            return [table[:appended]]
+        # wrapped: the oldest slot is the next one to be overwritten, so it is left out
+        end = appended % self.capacity
+        return [table[end + 1:], table[:end]]
+
+    def newest_timestamp(self) -> float | None:
+        appended = self.COUNTER.unpack_from(self.map, 8)[0]
+        if not appended:
+            return None
+        offset = self.HEADER_SIZE + ((appended - 1) % self.capacity) * self.width * 8
+        return struct.unpack_from("<d", self.map, offset)[0]
+
+    def query(self, start: float | None = None, end: float | None = None, step: float | None = None,
+              fields: list[str] | None = None, max_points: int = 500) -> dict:
+        """
+        Samples between start and end (unix seconds, inclusive) grouped into buckets of `step` seconds
+        (by default the span divided into max_points), with the sample count and the min, max and
+        average of every field per bucket. Buckets without samples are left out.
+        """
+        if step is not None and not (math.isfinite(step) and step > 0):
+            raise ValueError("step must be a positive number of seconds")
+        with self.lock:
+            if self.readonly and self.map is not None and self.replaced():
+                self.map = None  # the old mapping is closed once no array refers to it any more
+            opened = self.map is not None or self.open()
+            fields = [field for field in (fields or self.fields) if field in self.fields]
+            empty = {"from": start, "to": end, "step": step, "t": [], "count": [],
+                     "series": {field: {"min": [], "max": [], "avg": []} for field in fields}}
+            if not opened:
+                return empty
+            start = -math.inf if start is None else start
+            end = math.inf if end is None else end
+            columns = [0] + [1 + self.fields.index(field) for field in fields]
+            parts = []
+            for run in self.rows():
+                timestamps = run[:, 0]
+                selected = run[np.searchsorted(timestamps, start, side="left"):np.searchsorted(timestamps, end, side="right")]
+                parts.append(selected[:, columns])  # copies only the requested columns out of the map
+            data = np.concatenate(parts)
+        if not len(data):
+            return empty
+
+        start = data[0, 0] if start == -math.inf else start
+        end = data[-1, 0] if end == math.inf else end
+        step = step or max(self.min_interval, (end - start) / max(1, max_points))
+        buckets = ((data[:, 0] - start) // step).astype(np.int64)
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+
+        values = data[:, 1:]
+        present = ~np.isnan(values)
+        counts = np.add.reduceat(present, starts, axis=0)
+        sums = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = sums / counts
+        minimums = np.fmin.reduceat(values, starts, axis=0)
+        maximums = np.fmax.reduceat(values, starts, axis=0)
+
+        def column(array, index):
+            return [None if math.isnan(value) else value for value in array[:, index].tolist()]
+
+        return {
+            "from": start,
+            "to": end,
+            "step": step,
+            "t": (start + buckets[starts] * step).tolist(),
+            "count": np.diff(np.append(starts, len(data))).tolist(),
+            "series": {field: {"min": column(minimums, i), "max": column(maximums, i), "avg": column(averages, i)}
+                       for i, field in enumerate(fields)},
+        }
@@ -1,36 +1,27 @@
-import json
-from pymongo import MongoClient, ASCENDING
-from pymongo.errors import DuplicateKeyError
-from yt_search import YTSearch
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from etl_worker import ETLWorker
+from sinks import MongoSink
 
 class Mongo:
     """
     killed activation for ui and elastic search. needed to cut ties with mongo db to not over inflate
+    now runs the normal ETL pipeline into a MongoSink: one unordered bulk_write per batch instead of insert_one per record
     """
-    __inti__(self):
+    def __init__(self):
         self.MONGO_URI = "mongodb://localhost:27017"
         self.MONGO_DB_NAME = "YouTubeDB"
-        self.MONGO_COLLECTION_NAME = "UnlistedVideoMetadata"
+        # one document per video keyed by V_ID; the old {"YtMetadata": record} documents stay in UnlistedVideoMetadata
+        self.MONGO_COLLECTION_NAME = "VideoMetadata"
 
     def run(self):
-        # Mongo
-        mongo_client = MongoClient(self.MONGO_URI)
-        mongo_db = mongo_client[self.MONGO_DB_NAME]
-        coll = mongo_db[self.MONGO_COLLECTION_NAME]
-        record = json.load(YTSearch.fetch_random_video_metadata())
-        coll.create_index([("VideoId", ASCENDING)], unique=True)
-        if record is None:
-            continue
-        doc = {
-                "YtMetadata": record
-                }
+        worker = ETLWorker(batch_size=50, sink_factory=lambda: MongoSink(self.MONGO_URI, self.MONGO_DB_NAME,
+                                                                          self.MONGO_COLLECTION_NAME))
+        worker.run_pipelined()
 
-        try:
-                    coll.insert_one(doc)
-                    print(f"[INSERT] Saved metadata for {video_id}")
-        except DuplicateKeyError:
-                print(f"[SKIP] Duplicate VideoId in Mongo (already inserted): {video_id}")
-            continue
 
-        finally:
-            mongo_client.close()
\ No newline at end of file
+if __name__ == "__main__":
+    Mongo().run()
@@ -0,0 +1,97 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from instrumentation import METRIC_QUERY_SECONDS, METRIC_QUERY_CACHE_HITS
+
+
+class SinkPool:
+    """At most `size` sinks from sink_factory, each used by one thread at a time (ODBC connections are not shared between threads)."""
+    def __init__(self, sink_factory, size: int = 4):
+        self.sink_factory = sink_factory
+        self.size = max(1, size)
+        self.idle = queue.LifoQueue()
+        self.slots = threading.Semaphore(self.size)
+
+    @contextmanager
+    def checkout(self):
+        with self.slots:
+            try:
+                sink = self.idle.get_nowait()
+            except queue.Empty:
+                sink = self.sink_factory()
+            try:
+                yield sink
+            except Exception:
+                sink.close()  # the connection may be broken, the next checkout opens a new one
+                raise
+            self.idle.put(sink)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class QueryRegistry:
+    """
+    The metric queries of database/*.sql, read once and looked up by file name without .sql.
+    run() executes one on a pooled connection and keeps its first row for `ttl` seconds (per query
+    overrides in ttls); run_all() runs several at once, one pooled connection per query in flight.
+    """
+    DIRECTORY = Path(__file__).resolve().parent / "database"
+    SCHEMA_FILES = {"Database Creation.sql"}
+
+    def __init__(self, sink_factory, directory: str | None = None, pool_size: int = 4, ttl: float = 30.0,
+                 ttls: dict | None = None):
+        self.queries = self.load(Path(directory) if directory else self.DIRECTORY)
+        self.pool = SinkPool(sink_factory, pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="metric-query")
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.cache = {}  # name -> (expires_at, row)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory: Path) -> dict[str, str]:
+        queries = {}
+        for path in sorted(directory.glob("*.sql")):
+            if path.name not in cls.SCHEMA_FILES:
+                queries[path.stem] = path.read_text(encoding="utf-8")
+        return queries
+
+    def run(self, name: str):
+        with self.lock:
+            cached = self.cache.get(name)
+        if cached is not None and cached[0] > time.monotonic():
+            METRIC_QUERY_CACHE_HITS.labels(query=name).inc()
+            return cached[1]
+        sql = self.queries[name]
+        with self.pool.checkout() as sink, METRIC_QUERY_SECONDS.time(query=name):
+            sink.cursor.execute(sql)
+            row = sink.cursor.fetchone()
+            sink.cursor.fetchall()  # drain, so the connection is free for the next query
+        row = tuple(row) if row is not None else None
+        with self.lock:
+            self.cache[name] = (time.monotonic() + self.ttls.get(name, self.ttl), row)
+        return row
+
+    def run_all(self, names: list[str] | None = None) -> dict:
+        names = list(self.queries) if names is None else names
+        futures = {name: self.executor.submit(self.run, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+    def invalidate(self, name: str | None = None):
+        with self.lock:
+            if name is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(name, None)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pool.close()
@@ -0,0 +1,147 @@
+import itertools
+import random
+import threading
+import time
+from startup import load_word_list
+from instrumentation import REQUEST_BACKOFFS
+
+
+class RequestBudget:
+    """
+    Token bucket for outbound requests, shared by every YTSearch of a crawler: each extract_info call
+    takes one token, tokens refill at `rate` per second up to `burst`. After error_threshold failed
+    requests in a row every caller pauses for an exponentially growing backoff and the rate is halved;
+    successful requests win the rate back step by step. rate=None only applies the backoff.
+    clock/sleep can be replaced to run against a simulated clock.
+    """
+    def __init__(self, rate: float | None = 5.0, burst: float = 10.0, min_rate: float = 0.2,
+                 error_threshold: int = 3, backoff_base: float = 2.0, backoff_max: float = 300.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.min_rate = min(min_rate, rate) if rate else min_rate
+        self.error_threshold = max(1, error_threshold)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tokens = self.burst
+        self.updated = clock()
+        self.paused_until = None
+        self.consecutive_errors = 0
+        self.backoffs = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the caller may send one request."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                if self.paused_until is not None and now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.rate is None:
+                    return
+                else:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1 - 1e-9:  # refills of float time can land a hair below a whole token
+                        self.tokens = max(0.0, self.tokens - 1)
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def success(self):
+        with self.lock:
+            self.consecutive_errors = 0
+            if self.rate is not None and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def failure(self):
+        with self.lock:
+            self.consecutive_errors += 1
+            excess = self.consecutive_errors - self.error_threshold
+            if excess < 0:
+                return  # a single private or removed video is not throttling
+            delay = min(self.backoff_max, self.backoff_base * 2 ** min(excess, 30)) * random.uniform(0.5, 1.0)
+            self.paused_until = max(self.paused_until or 0.0, self.clock() + delay)
+            if self.rate is not None:
+                self.rate = max(self.min_rate, self.rate / 2)
+            self.backoffs += 1
+            errors, rate = self.consecutive_errors, self.rate
+        REQUEST_BACKOFFS.inc()
+        print(f"[BACKOFF] {errors} failed requests in a row, pausing {delay:.1f}s"
+              + (f", rate now {rate:.2f}/s" if rate is not None else ""))
+
+
+class QueryScheduler:
+    """
+    Picks the search queries of YTSearch. Every term that was searched gets a score: the new videos
+    (plus playlist_weight per new playlist) per outbound request of its queries, as a moving average
+    so exhausted terms fade out. Query words are sampled by score; with probability `explore` a word
+    is drawn uniformly from the word list instead, which keeps finding new terms.
+    One scheduler and its RequestBudget are shared by all fetch threads.
+    """
+    def __init__(self, word_list: list[str] | None = None, budget: RequestBudget | None = None,
+                 explore: float = 0.2, alpha: float = 0.5, playlist_weight: float = 0.5):
+        self.word_list = word_list or load_word_list("en", 50000)
+        self.budget = budget or RequestBudget()
+        self.explore = explore
+        self.alpha = alpha
+        self.playlist_weight = playlist_weight
+
+        self.scores = {}  # term -> [score, queries]
+        self.terms = None  # scored terms and their cumulative weights, rebuilt after every credit
+        self.cumulative = None
+        self.queries = 0
+        self.requests = 0
+        self.new_videos = 0
+        self.new_playlists = 0
+        self.lock = threading.Lock()
+
+    def next_query(self) -> str:
+        n = random.choice([1, 2, 2, 3])
+        with self.lock:
+            if self.terms is None:
+                self.terms = [term for term, (score, _) in self.scores.items() if score > 0]
+                self.cumulative = list(itertools.accumulate(self.scores[term][0] for term in self.terms))
+            words = []
+            for _ in range(n):
+                if self.terms and random.random() >= self.explore:
+                    words.append(random.choices(self.terms, cum_weights=self.cumulative)[0])
+                else:
+                    words.append(random.choice(self.word_list))
+        return " ".join(words)
+
+    def credit(self, query: str, requests: int, new_videos: int, new_playlists: int):
+        """Reports what one query produced and how many outbound requests it took."""
+        observed = (new_videos + self.playlist_weight * new_playlists) / max(1, requests)
+        with self.lock:
+            for term in set(query.split()):
+                entry = self.scores.get(term)
+                if entry is None:
+                    self.scores[term] = [observed, 1]
+                else:
+                    entry[0] += self.alpha * (observed - entry[0])
+                    entry[1] += 1
+            self.terms = None
+            self.queries += 1
+            self.requests += requests
+            self.new_videos += new_videos
+            self.new_playlists += new_playlists
+
+    def stats(self, top: int = 10) -> dict:
+        with self.lock:
+            best = sorted(self.scores.items(), key=lambda item: item[1][0], reverse=True)[:top]
+            return {
+                "queries": self.queries,
+                "requests": self.requests,
+                "new_videos": self.new_videos,
+                "new_playlists": self.new_playlists,
+                "new_videos_per_request": round(self.new_videos / self.requests, 4) if self.requests else None,
+                "scored_terms": len(self.scores),
+                "top_terms": {term: round(score, 3) for term, (score, _) in best},
+                "request_rate": self.budget.rate,
+                "backoffs": self.budget.backoffs,
+            }
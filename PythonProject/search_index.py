@@ -0,0 +1,440 @@
+"""
+Full-text search over video titles, descriptions and tags, inside the Python service instead of the
+Elasticsearch cluster.
+
+The ETL adds every newly stored video to an in-memory buffer. The buffer is written out as an immutable
+segment file every flush_docs videos or flush_interval seconds (checked on add and by a background
+timer), without holding up adds and searches while it is written. Once merge_factor segments exist, the
+smallest ones are merged in the background. Segments are memory-mapped, so opening the index reads only
+the small headers. Queries are OR'ed terms ranked with BM25, with title matches counting 3x and tags
+2x. The files listed in segments.json are the index; buffered videos not yet flushed are lost on a
+crash and come back with --rebuild.
+
+    python search_index.py --rebuild [--directory DIR]     # re-index all videos in SQL Server
+"""
+import argparse
+import collections
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from metrics import write_json_atomic
+from startup import lazy_import
+from video_record import VideoRecord
+
+np = lazy_import("numpy")
+
+TOKEN = re.compile(r"\w+")
+MAX_TOKEN_LENGTH = 40
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [token for token in TOKEN.findall(text.casefold()) if len(token) <= MAX_TOKEN_LENGTH]
+
+
+class Segment:
+    """
+    One immutable segment file: a header, then per term the posting doc ids (uint32, ascending) and
+    weighted term frequencies (uint16), the doc lengths (float32), the doc metadata ([video_id, title,
+    channel] as JSON) and the sorted term dictionary, each with its offset array.
+    """
+    MAGIC = b"SIDX\x00\x01\x00\x00"
+    # magic, docs, terms, sum of doc lengths, offsets of: postings, doc lengths, doc offsets, doc blob,
+    # term offsets, term blob, posting offsets
+    HEADER = struct.Struct("<8sIId7Q")
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.doc_count, self.term_count, self.total_length, *offsets = self.HEADER.unpack_from(self.map)
+        if magic != self.MAGIC:
+            raise ValueError(f"{path} is not a search segment")
+        (self.postings_start, lengths_start, doc_offsets_start, self.doc_blob_start,
+         term_offsets_start, self.term_blob_start, posting_offsets_start) = offsets
+        self.doc_lengths = np.frombuffer(self.map, "<f4", self.doc_count, lengths_start)
+        self.doc_offsets = np.frombuffer(self.map, "<u4", self.doc_count + 1, doc_offsets_start)
+        self.term_offsets = np.frombuffer(self.map, "<u4", self.term_count + 1, term_offsets_start)
+        self.posting_offsets = np.frombuffer(self.map, "<u8", self.term_count + 1, posting_offsets_start)
+
+    @classmethod
+    def write(cls, path: Path, doc_lengths, doc_offsets, doc_blob: bytes, postings):
+        """postings: (term as UTF-8, doc ids, frequencies) sorted by term bytes; written as they come."""
+        tmp_path = f"{path}.tmp"
+        term_blob = bytearray()
+        term_offsets = [0]
+        posting_offsets = [0]
+        with open(tmp_path, "wb") as f:
+            f.write(bytes(cls.HEADER.size))
+            postings_start = f.tell()
+            for term, docs, tfs in postings:
+                term_blob += term
+                term_offsets.append(len(term_blob))
+                f.write(np.asarray(docs, "<u4").tobytes())
+                f.write(np.asarray(tfs, "<u2").tobytes())
+                posting_offsets.append(posting_offsets[-1] + 6 * len(docs))
+            doc_lengths = np.asarray(doc_lengths, "<f4")
+            offsets = [postings_start]
+            for section in (doc_lengths.tobytes(), np.asarray(doc_offsets, "<u4").tobytes(), doc_blob,
+                            np.asarray(term_offsets, "<u4").tobytes(), bytes(term_blob),
+                            np.asarray(posting_offsets, "<u8").tobytes()):
+                f.write(bytes(-f.tell() % 8))
+                offsets.append(f.tell())
+                f.write(section)
+            f.seek(0)
+            f.write(cls.HEADER.pack(cls.MAGIC, len(doc_lengths), len(term_offsets) - 1,
+                                    float(doc_lengths.sum(dtype="f8")), *offsets))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def term(self, index: int) -> bytes:
+        start = self.term_blob_start + int(self.term_offsets[index])
+        return self.map[start:self.term_blob_start + int(self.term_offsets[index + 1])]
+
+    def find(self, term: bytes) -> int:
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.term_count and self.term(lo) == term else -1
+
+    def terms(self, tag=None):
+        """(term, tag, index) for every term in order, for merging several segments with heapq.merge."""
+        for index in range(self.term_count):
+            yield self.term(index), tag, index
+
+    def postings_at(self, index: int):
+        start, end = int(self.posting_offsets[index]), int(self.posting_offsets[index + 1])
+        count = (end - start) // 6
+        offset = self.postings_start + start
+        return (np.frombuffer(self.map, "<u4", count, offset),
+                np.frombuffer(self.map, "<u2", count, offset + 4 * count))
+
+    def postings(self, term: str):
+        index = self.find(term.encode("utf-8"))
+        return self.postings_at(index) if index >= 0 else None
+
+    def doc(self, index: int) -> list:
+        start = self.doc_blob_start + int(self.doc_offsets[index])
+        return json.loads(self.map[start:self.doc_blob_start + int(self.doc_offsets[index + 1])])
+
+    def doc_blob(self) -> bytes:
+        return self.map[self.doc_blob_start:self.doc_blob_start + int(self.doc_offsets[-1])]
+
+
+class Buffer:
+    """Videos added since the last flush, searchable the same way as a Segment."""
+    def __init__(self):
+        self.postings_lists = {}  # term -> (doc ids, frequencies)
+        self.metas = []
+        self.lengths = array("f")
+        self.started = time.monotonic()
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.metas)
+
+    def add(self, meta: bytes, counts: collections.Counter):
+        doc = len(self.metas)
+        self.metas.append(meta)
+        self.lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            docs, tfs = self.postings_lists.setdefault(term, (array("I"), array("H")))
+            docs.append(doc)
+            tfs.append(min(tf, 65535))
+
+    def view(self, terms: list[str]) -> "Buffer":
+        """Copy of what a search for `terms` needs, so it can be read without the index lock."""
+        view = Buffer()
+        view.metas = self.metas[:]
+        view.lengths = array("f", self.lengths)
+        view.postings_lists = {term: (array("I", self.postings_lists[term][0]), array("H", self.postings_lists[term][1]))
+                               for term in terms if term in self.postings_lists}
+        return view
+
+    @property
+    def total_length(self) -> float:
+        return float(sum(self.lengths))
+
+    @property
+    def doc_lengths(self):
+        return np.frombuffer(self.lengths, dtype="f4")
+
+    def postings(self, term: str):
+        found = self.postings_lists.get(term)
+        return (np.frombuffer(found[0], dtype="u4"), np.frombuffer(found[1], dtype="u2")) if found else None
+
+    def doc(self, index: int) -> list:
+        return json.loads(self.metas[index])
+
+    def write(self, path: Path):
+        doc_offsets = [0]
+        for meta in self.metas:
+            doc_offsets.append(doc_offsets[-1] + len(meta))
+        terms = sorted((term.encode("utf-8"), docs, tfs) for term, (docs, tfs) in self.postings_lists.items())
+        Segment.write(path, self.lengths, doc_offsets, b"".join(self.metas), terms)
+
+
+class SearchIndex:
+    FIELD_WEIGHTS = {"title": 3, "tags": 2, "description": 1}
+    MANIFEST = "segments.json"
+
+    def __init__(self, directory: str, flush_docs: int = 20000, flush_interval: float = 300.0,
+                 merge_factor: int = 8, k1: float = 1.2, b: float = 0.75):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.flush_docs = flush_docs
+        self.flush_interval = flush_interval
+        self.merge_factor = max(2, merge_factor)
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()  # buffer and segment list
+        self.flush_lock = threading.Lock()  # one flush at a time, so segments are listed in the order they were filled
+        self.manifest_lock = threading.Lock()  # taken before self.lock, never while holding it
+        self.merge_lock = threading.Lock()
+        self.buffer = Buffer()
+        self.flushing = []  # sealed buffers being written out, still searched until their segment is listed
+        self.segments = []
+        self.next_segment = 1
+        self.load()
+        self.closed = threading.Event()
+        if flush_interval:
+            # an idle ETL adds nothing, so add() alone would leave the last videos buffered indefinitely
+            threading.Thread(target=self.flush_periodically, name="search-flush", daemon=True).start()
+
+    # ______FILES______
+    def load(self):
+        manifest_path = self.directory / self.MANIFEST
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else {}
+        self.segments = [Segment(self.directory / name) for name in manifest.get("segments", [])]
+        self.next_segment = manifest.get("next_segment", 1)
+        # leftovers of an interrupted flush/merge, or merged segments that were still mapped (Windows)
+        listed = set(manifest.get("segments", []))
+        for path in self.directory.glob("seg-*"):
+            if path.name not in listed:
+                self.remove(path)
+
+    def write_manifest(self):
+        # the list is read and written under manifest_lock, so a slower writer cannot replace a newer list
+        with self.manifest_lock:
+            with self.lock:
+                manifest = {"segments": [segment.path.name for segment in self.segments], "next_segment": self.next_segment}
+            write_json_atomic(self.directory / self.MANIFEST, manifest)
+
+    def new_segment_path(self) -> Path:
+        path = self.directory / f"seg-{self.next_segment:06d}.idx"
+        self.next_segment += 1
+        return path
+
+    @staticmethod
+    def remove(path: Path):
+        try:
+            path.unlink()
+        except OSError:
+            pass  # still mapped by a search (Windows), removed on the next load
+
+    # ______INDEXING______
+    def add(self, record: VideoRecord):
+        counts = collections.Counter()
+        for field, text in (("title", record.title), ("description", record.description),
+                            ("tags", " ".join(tag for tag in record.tags or [] if isinstance(tag, str)))):
+            weight = self.FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                counts[token] += weight
+        meta = json.dumps([record.video_id, record.title, record.channel], ensure_ascii=False).encode("utf-8")
+        with self.lock:
+            self.buffer.add(meta, counts)
+            due = (self.buffer.doc_count >= self.flush_docs
+                   or time.monotonic() - self.buffer.started >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                if not self.buffer.doc_count:
+                    return
+                sealed, self.buffer = self.buffer, Buffer()
+                self.flushing.append(sealed)
+                path = self.new_segment_path()
+            sealed.write(path)  # written and fsynced outside the lock: adds and searches go on meanwhile
+            segment = Segment(path)
+            with self.lock:
+                self.segments.append(segment)
+                self.flushing.remove(sealed)
+                merge_due = len(self.segments) >= self.merge_factor
+            self.write_manifest()
+        if merge_due:
+            threading.Thread(target=self.merge, name="search-merge", daemon=True).start()
+
+    def flush_periodically(self):
+        while not self.closed.wait(max(1.0, min(self.flush_interval / 4, 60.0))):
+            with self.lock:
+                due = self.buffer.doc_count and time.monotonic() - self.buffer.started >= self.flush_interval
+            if due:
+                self.flush()
+
+    def close(self):
+        self.closed.set()
+        self.flush()
+
+    def merge(self):
+        """Merges the merge_factor smallest segments into one until fewer than merge_factor are left."""
+        if not self.merge_lock.acquire(blocking=False):
+            return
+        try:
+            while True:
+                with self.lock:
+                    if len(self.segments) < self.merge_factor:
+                        return
+                    merging = sorted(self.segments, key=lambda segment: segment.doc_count)[:self.merge_factor]
+                    path = self.new_segment_path()
+                self.merge_segments(merging, path)  # reads immutable files, so searches and flushes go on
+                merged = Segment(path)
+                with self.lock:
+                    self.segments = [segment for segment in self.segments if segment not in merging] + [merged]
+                self.write_manifest()
+                for segment in merging:
+                    self.remove(segment.path)
+        finally:
+            self.merge_lock.release()
+
+    @staticmethod
+    def merge_segments(segments: list[Segment], path: Path):
+        bases = np.cumsum([0] + [segment.doc_count for segment in segments])
+        blob_bases = np.cumsum([0] + [int(segment.doc_offsets[-1]) for segment in segments])
+        doc_offsets = np.concatenate([segment.doc_offsets[:-1].astype("i8") + blob_bases[i]
+                                      for i, segment in enumerate(segments)] + [blob_bases[-1:]])
+
+        def postings():
+            streams = [segment.terms(n) for n, segment in enumerate(segments)]
+            current, parts = None, []
+            for term, n, i in heapq.merge(*streams):
+                if term != current and parts:
+                    yield current, np.concatenate([docs for docs, _ in parts]), np.concatenate([tfs for _, tfs in parts])
+                    parts = []
+                current = term
+                docs, tfs = segments[n].postings_at(i)
+                parts.append((docs + np.uint32(bases[n]), tfs))  # segments in order, so doc ids stay ascending
+            if parts:
+                yield current, np.concatenate([docs for docs, _ in parts]), np.concatenate([tfs for _, tfs in parts])
+
+        Segment.write(path, np.concatenate([segment.doc_lengths for segment in segments]), doc_offsets,
+                      b"".join(segment.doc_blob() for segment in segments), postings())
+
+    def rebuild(self, cursor, batch_size: int = 5000):
+        """Replaces the index with every video in the database (Video, Channel and Tags tables)."""
+        with self.lock:
+            old, self.segments, self.buffer = self.segments, [], Buffer()
+        self.write_manifest()
+        for segment in old:
+            self.remove(segment.path)
+        cursor.execute("SELECT v.V_ID, v.V_Title, v.V_Description, c.C_Name, t.Tag FROM Video v "
+                       "LEFT JOIN Channel c ON c.C_ID = v.V_C_ID LEFT JOIN Tags t ON t.VT_V = v.V_ID ORDER BY v.V_ID")
+        record = None
+        count = 0
+        while rows := cursor.fetchmany(batch_size):
+            for video_id, title, description, channel, tag in rows:
+                if record is None or record.video_id != video_id:
+                    if record is not None:
+                        self.add(record)
+                        count += 1
+                    record = VideoRecord(video_id, title, None, channel=channel, description=description, tags=[])
+                if tag:
+                    record.tags.append(tag)
+        if record is not None:
+            self.add(record)
+            count += 1
+        self.flush()
+        return count
+
+    # ______SEARCH______
+    def search(self, query: str, page: int = 1, page_size: int = 12) -> dict:
+        """BM25 ranked matches of any query term, `page_size` per page (1-100) like VideosSearchService."""
+        started = time.perf_counter()
+        page = max(1, page)
+        page_size = 12 if page_size <= 0 else min(page_size, 100)
+        terms = list(dict.fromkeys(tokenize(query)))
+        result = {"query": query, "total": 0, "page": page, "page_size": page_size, "hits": []}
+        with self.lock:
+            sources = self.segments + self.flushing + [self.buffer.view(terms)]  # sealed buffers no longer change
+        bases = np.cumsum([0] + [source.doc_count for source in sources])
+        doc_total = int(bases[-1])
+        if not terms or not doc_total:
+            result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            return result
+        average_length = max(sum(source.total_length for source in sources) / doc_total, 1e-9)
+
+        ids, scores = [], []
+        for term in terms:
+            found = [(n, source.postings(term)) for n, source in enumerate(sources)]
+            found = [(n, postings) for n, postings in found if postings is not None and len(postings[0])]
+            frequency = sum(len(postings[0]) for _, postings in found)
+            if not frequency:
+                continue
+            idf = math.log(1 + (doc_total - frequency + 0.5) / (frequency + 0.5))
+            for n, (docs, tfs) in found:
+                tf = tfs.astype("f8")
+                norm = self.k1 * (1 - self.b + self.b * sources[n].doc_lengths[docs] / average_length)
+                ids.append(docs.astype("i8") + bases[n])
+                scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not ids:
+            result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            return result
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        if len(terms) > 1:
+            if len(ids) > doc_total // 8:  # dense: one slot per document beats sorting the postings
+                totals = np.bincount(ids, weights=scores, minlength=doc_total)
+                ids = np.flatnonzero(totals)
+                scores = totals[ids]
+            else:
+                ids, inverse = np.unique(ids, return_inverse=True)
+                scores = np.bincount(inverse, weights=scores)
+
+        end = page * page_size
+        top = np.argpartition(-scores, end - 1)[:end] if end < len(ids) else np.arange(len(ids))
+        top = top[np.lexsort((ids[top], -scores[top]))][(page - 1) * page_size:]
+        for doc_id, score in zip(ids[top].tolist(), scores[top].tolist()):
+            n = int(np.searchsorted(bases, doc_id, side="right")) - 1
+            video_id, title, channel = sources[n].doc(doc_id - int(bases[n]))
+            result["hits"].append({"video_id": video_id, "title": title, "channel": channel,
+                                   "video_url": f"https://www.youtube.com/watch?v={video_id}", "score": round(score, 4)})
+        result["total"] = len(ids)
+        result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def stats(self) -> dict:
+        with self.lock:
+            buffered = self.buffer.doc_count + sum(sealed.doc_count for sealed in self.flushing)
+            return {"segments": len(self.segments), "buffered": buffered,
+                    "documents": sum(segment.doc_count for segment in self.segments) + buffered}
+
+
+if __name__ == "__main__":
+    from etl_worker import ETLWorker
+    from sinks import SqlServerSink
+
+    parser = argparse.ArgumentParser(description="Rebuild the search index from SQL Server.")
+    parser.add_argument("--rebuild", action="store_true", required=True)
+    parser.add_argument("--directory", default=str(Path(__file__).resolve().parent / "search"))
+    args = parser.parse_args()
+    sink = SqlServerSink(ETLWorker.CONNECTION_STRING)
+    try:
+        index = SearchIndex(args.directory)
+        print(f"[SEARCH] {index.rebuild(sink.cursor)} videos indexed in {args.directory}")
+    finally:
+        sink.close()
@@ -0,0 +1,90 @@
+import hashlib
+import math
+import threading
+from video_record import VideoRecord
+
+
+class BloomFilter:
+    """
+    Compact set membership for millions of IDs: ~1.8 MB per million IDs at a 0.1% false positive rate.
+    A false positive means an ID is reported as seen when it is not, there are no false negatives.
+    bits/lock can be shared between processes (multiprocessing.RawArray("B", byte_size(...)) and
+    multiprocessing.Lock) so several crawlers fill one filter.
+    """
+    def __init__(self, capacity: int, error_rate: float = 0.001, bits=None, lock=None):
+        self.size_bits = self.bit_size(capacity, error_rate)
+        self.hash_count = max(1, round(self.size_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray(self.byte_size(capacity, error_rate))
+        self.lock = lock or threading.Lock()
+
+    @staticmethod
+    def bit_size(capacity: int, error_rate: float) -> int:
+        return max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+
+    @staticmethod
+    def byte_size(capacity: int, error_rate: float = 0.001) -> int:
+        return (BloomFilter.bit_size(capacity, error_rate) + 7) // 8
+
+    def positions(self, item: str) -> list[int]:
+        # double hashing: k positions out of one 128 bit digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        positions = self.positions(item)
+        with self.lock:
+            for pos in positions:
+                self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(item))
+
+
+class SeenIndex:
+    """
+    V_ID / P_ID / C_ID values that are already stored, so YTSearch can skip known videos before
+    extracting them and ETLWorker can skip redundant Channel/Playlist inserts.
+    Channels and playlists are always tracked exactly: ETLWorker leaves out their inserts based on this
+    index, and a false positive there would break the Video foreign keys. Videos, by far the largest set,
+    can use a BloomFilter; a false positive only means that one new video is not scraped.
+    """
+    def __init__(self, bloom_videos: bool = False, expected_videos: int = 1_000_000, error_rate: float = 0.001):
+        self.videos = BloomFilter(expected_videos, error_rate) if bloom_videos else set()
+        self.playlists = set()
+        self.channels = set()
+
+    def warm(self, cursor, fetch_size: int = 10000):
+        for table, column, ids in (("Video", "V_ID", self.videos),
+                                   ("Playlist", "P_ID", self.playlists),
+                                   ("Channel", "C_ID", self.channels)):
+            self.warm_table(cursor, table, column, ids, fetch_size)
+        print(f"[SEEN] warmed with {len(self.playlists)} playlists and {len(self.channels)} channels")
+
+    @staticmethod
+    def warm_table(cursor, table: str, column: str, ids, fetch_size: int = 10000):
+        cursor.execute(f"SELECT {column} FROM {table}")
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                ids.add(row[0])
+
+    def has_video(self, video_id) -> bool:
+        return video_id in self.videos
+
+    def has_playlist(self, playlist_id) -> bool:
+        # exact: ETLWorker leaves out the Playlist row of a known playlist
+        return playlist_id in self.playlists
+
+    def has_channel(self, channel_id) -> bool:
+        return channel_id in self.channels
+
+    def add_record(self, record: VideoRecord):
+        for ids, value in ((self.videos, record.video_id),
+                           (self.playlists, record.playlist_id),
+                           (self.channels, record.channel_id)):
+            if value:
+                ids.add(value)
@@ -0,0 +1,194 @@
+"""
+Sharded crawl: N worker processes, each searching a disjoint slice of the word list with its own
+YTSearch and sink, so yt_dlp's parsing runs on N cores instead of sharing one GIL.
+
+    python sharded_crawler.py --shards 8 --batch-size 25 --api
+
+Video IDs go into a BloomFilter in shared memory, so a video found by one shard is skipped by all of
+them. The shards send every new video's rows and their record counts back over a queue; the parent
+keeps the one MetricsAggregator and writes the metrics file. On shutdown the shards are asked to stop
+through a shared Event and write their batch in flight; only a shard that does not exit in time is
+terminated. Stage timings (/stats) are per process and not collected from the shards.
+"""
+import argparse
+import multiprocessing as mp
+import queue
+import time
+from threading import Thread
+
+from etl_worker import ETLWorker
+from seen_index import BloomFilter, SeenIndex
+from startup import load_word_list
+from video_record import VideoRecord
+from yt_search import YTSearch
+
+
+class SharedSeenIndex(SeenIndex):
+    """
+    SeenIndex of one shard. Videos are checked against the shared filter; the exact playlist/channel
+    sets that decide which rows get written stay local to the process.
+    """
+    def __init__(self, videos: BloomFilter):
+        super().__init__()
+        self.videos = videos
+
+    def warm(self, cursor, fetch_size: int = 10000):
+        # the shared filter is warmed once by the parent
+        self.warm_table(cursor, "Playlist", "P_ID", self.playlists, fetch_size)
+        self.warm_table(cursor, "Channel", "C_ID", self.channels, fetch_size)
+
+
+class ShardWorker(ETLWorker):
+    """ETLWorker inside one shard: searches only its words and reports to the parent instead of writing metrics."""
+    def __init__(self, shard: int, word_list: list[str], progress, **kwargs):
+        super().__init__(**kwargs)
+        self.shard = shard
+        self.word_list = word_list
+        self.progress = progress
+
+    def make_search(self) -> YTSearch:
+        return YTSearch(seen=self.seen, scheduler=self.query_scheduler(self.word_list))
+
+    def warm(self, sink):
+        if sink.cursor is not None and self.seen is not None:
+            self.seen.warm(sink.cursor)
+
+    def observe(self, record: VideoRecord):
+        self.progress.put(("observe", self.video_row(record), self.channel_row(record), self.playlist_row(record)))
+
+    def write_metrics(self, sink, path=None):
+        self.progress.put(("progress", self.shard, self.processed_count))
+
+
+def run_shard(worker_class, shard: int, word_list: list[str], shared: dict, progress, options: dict):
+    seen = SharedSeenIndex(BloomFilter(shared["capacity"], shared["error_rate"], bits=shared["videos"], lock=shared["lock"]))
+    worker = worker_class(shard, word_list, progress, seen=seen, **options)
+    if worker.fetch_workers > 1:
+        worker.run_pipelined(shared["stop"])
+    else:
+        worker.run(shared["stop"])
+
+
+class ShardedCrawler:
+    def __init__(self, shards: int | None = None, expected_videos: int = 5_000_000, error_rate: float = 0.001,
+                 metrics_path: str = ETLWorker.METRICS_PATH, report_every: float = 10.0, reconcile_every: int = 5000,
+                 requests_per_sec: float | None = 5.0, stop_timeout: float = 60.0, worker_class=ShardWorker,
+                 **worker_options):
+        """
+        worker_options go to every shard's ETLWorker (batch_size, fetch_workers, metrics_every, ...);
+        a sink_factory among them must be picklable, e.g. functools.partial(SQLiteSink, path).
+        requests_per_sec is the request budget of the whole crawl, every shard gets an equal share.
+        stop_timeout: seconds the shards get to finish their batch in flight before they are terminated.
+        """
+        self.shards = max(1, shards or mp.cpu_count() or 1)
+        worker_options["requests_per_sec"] = requests_per_sec / self.shards if requests_per_sec else None
+        self.expected_videos = expected_videos
+        self.error_rate = error_rate
+        self.metrics_path = metrics_path
+        self.report_every = report_every
+        self.stop_timeout = stop_timeout
+        self.worker_class = worker_class
+        self.worker_options = worker_options
+        # the parent's ETLWorker only provides the sink, the aggregate and the reconcile logic
+        self.parent = ETLWorker(reconcile_every=reconcile_every, sink_factory=worker_options.get("sink_factory"))
+        self.shard_counts = [0] * self.shards
+
+    def partitions(self) -> list[list[str]]:
+        words = load_word_list("en", 50000)
+        return [words[shard::self.shards] for shard in range(self.shards)]
+
+    def drain(self, progress, timeout: float = 0.0) -> bool:
+        """Handles one message from the shards; False if none came within timeout."""
+        try:
+            self.handle(progress.get(timeout=timeout) if timeout else progress.get_nowait())
+            return True
+        except queue.Empty:
+            return False
+
+    def handle(self, message: tuple):
+        if message[0] == "observe":
+            self.parent.metrics.observe(*message[1:])
+        elif message[0] == "progress":
+            _, shard, count = message
+            self.shard_counts[shard] = count
+            self.parent.processed_count = sum(self.shard_counts)
+
+    def run(self, max_records: int | None = None):
+        # spawn everywhere, so Linux runs behave like the Windows deployment
+        ctx = mp.get_context("spawn")
+        size = BloomFilter.byte_size(self.expected_videos, self.error_rate)
+        shared = {"videos": ctx.RawArray("B", size), "lock": ctx.Lock(), "stop": ctx.Event(),
+                  "capacity": self.expected_videos, "error_rate": self.error_rate}
+
+        sink = self.parent.connect()
+        if sink.cursor is not None:
+            videos = BloomFilter(self.expected_videos, self.error_rate, bits=shared["videos"], lock=shared["lock"])
+            SeenIndex.warm_table(sink.cursor, "Video", "V_ID", videos)
+            self.parent.metrics.seed(sink.cursor)
+
+        progress = ctx.Queue()
+        processes = [ctx.Process(target=run_shard, daemon=True, name=f"shard-{shard}",
+                                 args=(self.worker_class, shard, words, shared, progress, self.worker_options))
+                     for shard, words in enumerate(self.partitions())]
+        for process in processes:
+            process.start()
+        print(f"[SHARD] started {self.shards} shards")
+
+        started = last_report = time.monotonic()
+        try:
+            while any(process.is_alive() for process in processes):
+                self.drain(progress, timeout=1)
+                now = time.monotonic()
+                if now - last_report >= self.report_every:
+                    last_report = now
+                    self.report(sink, now - started)
+                if max_records is not None and self.parent.processed_count >= max_records:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop(processes, shared["stop"], progress)
+            self.report(sink, time.monotonic() - started)
+            sink.close()
+        return self.parent.processed_count
+
+    def stop(self, processes: list, stop, progress):
+        # a shard only exits once the parent has read what it queued, so keep draining while waiting
+        stop.set()
+        deadline = time.monotonic() + self.stop_timeout
+        while any(process.is_alive() for process in processes) and time.monotonic() < deadline:
+            self.drain(progress, timeout=0.5)
+        stuck = [process for process in processes if process.is_alive()]
+        for process in stuck:
+            # last resort: a shard killed while writing to the queue can leave a torn message in it
+            print(f"[SHARD] {process.name} did not stop within {self.stop_timeout:.0f}s, terminating")
+            process.terminate()
+        for process in processes:
+            process.join()
+        if not stuck:
+            while self.drain(progress):
+                pass
+
+    def report(self, sink, elapsed: float):
+        total = self.parent.processed_count
+        print(f"[SHARD] {total} records ({total / max(elapsed, 1e-9):.1f}/s), per shard: {self.shard_counts}")
+        self.parent.write_metrics(sink, self.metrics_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl with one process per slice of the word list.")
+    parser.add_argument("--shards", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--fetch-workers", type=int, default=1, help="fetch threads per shard")
+    parser.add_argument("--expected-videos", type=int, default=5_000_000, help="sizes the shared filters")
+    parser.add_argument("--requests-per-sec", type=float, default=5.0, help="extract_info budget of all shards together")
+    parser.add_argument("--max-records", type=int, default=None)
+    parser.add_argument("--api", action="store_true", help="also serve the metrics file on port 8000")
+    args = parser.parse_args()
+
+    crawler = ShardedCrawler(args.shards, expected_videos=args.expected_videos, requests_per_sec=args.requests_per_sec,
+                             batch_size=args.batch_size, fetch_workers=args.fetch_workers)
+    if args.api:
+        from metrics_api import MetricsAPI
+        Thread(target=MetricsAPI(crawler.metrics_path).run, daemon=True).start()
+    crawler.run(args.max_records)
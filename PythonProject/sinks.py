@@ -0,0 +1,551 @@
+import math
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from instrumentation import STAGE_SECONDS, TABLE_WRITE_SECONDS
+
+TABLE_COLUMNS = {
+    'Channel': ["C_ID", "C_Name", "C_URL", "C_Uploader"],
+    'Playlist': ["P_ID", "P_Title", "P_URL", "P_C_ID"],
+    'Video': ["V_ID", "V_Title", "V_URL", "V_P_ID", "V_Duration", "V_Views", "V_Likes", "V_UploadDate", "V_C_ID", "V_Description", "V_Embed"],
+    'Tags': ["Tag", "VT_V"],
+    'VideoCategoryJunc': ["VC_CT", "VC_V"],
+}
+TABLE_KEYS = {
+    'Channel': ["C_ID"],
+    'Playlist': ["P_ID"],
+    'Video': ["V_ID"],
+    'Tags': ["VT_V", "Tag"],
+    'VideoCategoryJunc': ["VC_CT", "VC_V"],
+    'VideoCategory': ["VC_V", "CT_Category"],  # junction rows before the category name is resolved to CT_ID
+}
+STATS_COLUMNS = ("V_Views", "V_Likes")
+SNAPSHOT_SEQ_KEYS = {'Channel': "C_Seq", 'Playlist': "P_Seq", 'Video': "V_Seq", 'Tags': "T_Seq"}
+
+
+def category_key(name: str) -> str:
+    # CT_Category compares case-insensitively and ignores trailing spaces
+    return name.strip().casefold()
+
+# rows of a table in insert order for snapshot_export.py; {top}/{limit} and the sequence columns are filled
+# in per dialect, references to other tables come back as that table's sequence number
+SNAPSHOT_SELECT = {
+    'Channel': """SELECT {top}c.{C_Seq}, c.C_ID, c.C_Name FROM Channel AS c
+                  WHERE c.{C_Seq} > ? AND c.{C_Seq} <= ? ORDER BY c.{C_Seq}{limit}""",
+    'Playlist': """SELECT {top}p.{P_Seq}, p.P_ID, p.P_Title, c.{C_Seq} FROM Playlist AS p
+                   LEFT JOIN Channel AS c ON c.C_ID = p.P_C_ID
+                   WHERE p.{P_Seq} > ? AND p.{P_Seq} <= ? ORDER BY p.{P_Seq}{limit}""",
+    'Video': """SELECT {top}v.{V_Seq}, v.V_ID, v.V_Title, v.V_Duration, v.V_Views, v.V_Likes, v.V_UploadDate,
+                       p.{P_Seq}, c.{C_Seq} FROM Video AS v
+                LEFT JOIN Playlist AS p ON p.P_ID = v.V_P_ID
+                LEFT JOIN Channel AS c ON c.C_ID = v.V_C_ID
+                WHERE v.{V_Seq} > ? AND v.{V_Seq} <= ? ORDER BY v.{V_Seq}{limit}""",
+    'Tags': """SELECT {top}t.{T_Seq}, t.Tag, v.{V_Seq} FROM Tags AS t
+               JOIN Video AS v ON v.V_ID = t.VT_V
+               WHERE t.{T_Seq} > ? AND t.{T_Seq} <= ? ORDER BY t.{T_Seq}{limit}""",
+}
+
+
+class Sink(ABC):
+    """
+    Where ETLWorker writes its rows. write_batch() gets one batch as rows per table (already
+    deduplicated by key, 'VideoCategory' rows carry the category name) and writes all of it in one
+    transaction, returning the V_IDs that were newly inserted. If it raises one of `errors`, the
+    batch has been rolled back. `cursor` is a DB-API cursor for the startup queries of SeenIndex and
+    MetricsAggregator, or None when the store is not SQL.
+    Refreshing counters (StatsSink) and snapshot export (SnapshotSink) are optional capabilities;
+    StatsRefresher and SnapshotExporter only run against a sink that has them.
+    """
+    errors: tuple = (Exception,)
+    cursor = None
+
+    @abstractmethod
+    def write_batch(self, rows: dict[str, list[dict]]) -> set[str]:
+        ...
+
+    @staticmethod
+    def junction_rows(rows: list[dict], category_ids: dict) -> list[dict]:
+        # a name that did not resolve to a CT_ID would insert a junction row with a NULL VC_CT
+        junction = [{'VC_CT': category_ids.get(category_key(row['CT_Category'])), 'VC_V': row['VC_V']} for row in rows]
+        unresolved = sum(1 for row in junction if row['VC_CT'] is None)
+        if unresolved:
+            print(f"[LOAD] {unresolved} video categories not resolved to a CT_ID, skipped")
+        return [row for row in junction if row['VC_CT'] is not None]
+
+    def healthy(self) -> bool:
+        """False when the store cannot be reached, as opposed to having rejected some rows."""
+        try:
+            self.cursor.execute("SELECT 1")
+            self.cursor.fetchall()
+            return True
+        except self.errors:
+            return False
+
+    @abstractmethod
+    def close(self):
+        ...
+
+
+class StatsSink(Sink):
+    """A sink that can hand out stale videos and write back refreshed counters (stats_refresh.py)."""
+    @abstractmethod
+    def stale_videos(self, limit: int, min_age_hours: float, playlist_ids: list[str] | None = None) -> list[tuple]:
+        """
+        Up to `limit` (V_ID, V_P_ID, V_Views, V_Likes) most in need of a stats refresh: hours since
+        V_StatsUpdated (NULL = very old) times 1 + log10(1 + V_Views). Videos refreshed or inserted less
+        than min_age_hours ago are left out; playlist_ids limits the result to videos of those playlists.
+        """
+
+    @abstractmethod
+    def update_stats(self, rows: list[dict]):
+        """
+        rows: V_ID plus only the counters (V_Views, V_Likes) that changed. Sets those and V_StatsUpdated
+        for every row, in one transaction.
+        """
+
+    @staticmethod
+    def group_stats(rows: list[dict]) -> dict[tuple, list[dict]]:
+        # one UPDATE per combination of changed counters, so unchanged counters are not written
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(col for col in STATS_COLUMNS if col in row), []).append(row)
+        return groups
+
+
+class SnapshotSink(Sink):
+    """A sink that can read its tables in insert order for the columnar snapshot (snapshot_export.py)."""
+    @abstractmethod
+    def snapshot_marks(self) -> tuple[str, dict[str, int]]:
+        """
+        The database clock and the highest sequence number of every SNAPSHOT_SELECT table. Read child
+        tables first: a row's parents are committed with or before it, so they are within their marks.
+        """
+
+    @abstractmethod
+    def snapshot_rows(self, table: str, after: int, upto: int, limit: int) -> list[tuple]:
+        """Up to `limit` rows of SNAPSHOT_SELECT[table] with sequence numbers in (after, upto], in order."""
+
+    @abstractmethod
+    def snapshot_count(self, table: str, upto: int) -> int:
+        """Number of rows of a SNAPSHOT_SELECT table with sequence numbers up to `upto`."""
+
+    @abstractmethod
+    def changed_counters(self, since: str, upto: int) -> list[tuple]:
+        """(V_Seq, V_Views, V_Likes) of the videos up to V_Seq `upto` whose counters were refreshed at or after `since`."""
+
+
+class SqlServerSink(StatsSink, SnapshotSink):
+    MAX_PARAMS_PER_STATEMENT = 2000  # SQL Server allows 2100 parameters per request
+
+    def __init__(self, connection_string: str):
+        import pyodbc
+        self.errors = (pyodbc.Error,)
+        self.conn = pyodbc.connect(connection_string)
+        self.cursor = self.conn.cursor()
+        self.category_ids = {}  # category_key(CT_Category) -> CT_ID, categories are never deleted so entries stay valid
+        self.categories_loaded = False
+        self.category_lock = threading.Lock()
+
+    def merge_rows(self, rows: list[dict], table: str) -> set:
+        """
+        Insert-if-missing for a whole batch: one multi-row MERGE per chunk instead of one INSERT per row.
+        Returns the keys of the rows that were actually inserted.
+        """
+        columns = TABLE_COLUMNS[table]
+        keys = TABLE_KEYS[table]
+        col_list = ", ".join(columns)
+        on = " AND ".join(f"target.{k} = src.{k}" for k in keys)
+        src_list = ", ".join(f"src.{col}" for col in columns)
+        row_placeholder = "(" + ", ".join(["?"] * len(columns)) + ")"
+        output = ", ".join(f"inserted.{k}" for k in keys)
+        chunk_size = max(1, self.MAX_PARAMS_PER_STATEMENT // len(columns))
+        inserted = set()
+        with TABLE_WRITE_SECONDS.time(table=table):
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                sql = f"""
+                MERGE {table} AS target
+                USING (VALUES {", ".join([row_placeholder] * len(chunk))}) AS src ({col_list})
+                    ON {on}
+                WHEN NOT MATCHED THEN
+                    INSERT ({col_list})
+                    VALUES ({src_list})
+                OUTPUT {output};
+                """
+                values = [row[col] for row in chunk for col in columns]
+                self.cursor.execute(sql, values)
+                inserted.update(tuple(row) for row in self.cursor.fetchall())
+        return inserted
+
+    def load_categories(self):
+        self.cursor.execute("SELECT CT_ID, CT_Category FROM Category")
+        with self.category_lock:
+            self.category_ids.update((category_key(name), ct_id) for ct_id, name in self.cursor.fetchall())
+            self.categories_loaded = True
+
+    def resolve_categories(self, categories: set[str]) -> dict:
+        """
+        Maps category_key(name) to CT_IDs from the cache. Misses are inserted by one set-based MERGE;
+        names that already existed but were not cached yet come back from one SELECT.
+        """
+        if not self.categories_loaded:
+            self.load_categories()
+        misses = {}
+        for name in categories:
+            if category_key(name) not in self.category_ids:
+                misses.setdefault(category_key(name), name)  # one spelling per key, or the MERGE inserts both
+        misses = list(misses.values())
+        if misses:
+            values = ", ".join(["(?)"] * len(misses))
+            sql = f"""
+            MERGE Category WITH (HOLDLOCK) AS target
+            USING (VALUES {values}) AS src (CT_Category)
+                ON target.CT_Category = src.CT_Category
+            WHEN NOT MATCHED THEN
+                INSERT (CT_Category)
+                VALUES (src.CT_Category)
+            OUTPUT inserted.CT_ID, inserted.CT_Category;
+            """
+            self.cursor.execute(sql, misses)
+            found = {category_key(name): ct_id for ct_id, name in self.cursor.fetchall()}
+            existing = [name for name in misses if category_key(name) not in found]
+            if existing:
+                placeholders = ", ".join(["?"] * len(existing))
+                self.cursor.execute(f"SELECT CT_ID, CT_Category FROM Category WHERE CT_Category IN ({placeholders})",
+                                    existing)
+                found.update((category_key(name), ct_id) for ct_id, name in self.cursor.fetchall())
+            with self.category_lock:
+                self.category_ids.update(found)
+        return {key: self.category_ids[key] for key in map(category_key, categories) if key in self.category_ids}
+
+    def forget_categories(self):
+        # after a rollback, IDs handed out by the rolled back MERGE no longer exist
+        with self.category_lock:
+            self.category_ids.clear()
+            self.categories_loaded = False
+
+    def write_batch(self, rows: dict[str, list[dict]]) -> set[str]:
+        try:
+            self.merge_rows(rows['Channel'], 'Channel')
+            self.merge_rows(rows['Playlist'], 'Playlist')
+            new_videos = self.merge_rows(rows['Video'], 'Video')
+            self.merge_rows(rows['Tags'], 'Tags')
+            with TABLE_WRITE_SECONDS.time(table="Category"):
+                category_ids = self.resolve_categories({row['CT_Category'] for row in rows['VideoCategory']})
+            self.merge_rows(self.junction_rows(rows['VideoCategory'], category_ids), 'VideoCategoryJunc')
+            with STAGE_SECONDS.time(stage="commit"):
+                self.conn.commit()
+        except self.errors:
+            self.conn.rollback()
+            self.forget_categories()
+            raise
+        return {key[0] for key in new_videos}
+
+    def stale_videos(self, limit: int, min_age_hours: float, playlist_ids: list[str] | None = None) -> list[tuple]:
+        in_playlists = f"AND V_P_ID IN ({', '.join(['?'] * len(playlist_ids))})" if playlist_ids else ""
+        self.cursor.execute(f"""
+        SELECT TOP (?) V_ID, V_P_ID, V_Views, V_Likes
+        FROM Video
+        WHERE (V_StatsUpdated IS NULL OR V_StatsUpdated < DATEADD(MINUTE, -?, SYSUTCDATETIME())) {in_playlists}
+        ORDER BY DATEDIFF(HOUR, ISNULL(V_StatsUpdated, '2000-01-01'), SYSUTCDATETIME())
+                 * (1 + LOG10(1 + ISNULL(V_Views, 0))) DESC
+        """, [limit, int(min_age_hours * 60), *(playlist_ids or [])])
+        return [tuple(row) for row in self.cursor.fetchall()]
+
+    def update_stats(self, rows: list[dict]):
+        try:
+            with TABLE_WRITE_SECONDS.time(table="VideoStats"):
+                for columns, group in self.group_stats(rows).items():
+                    chunk_size = max(1, self.MAX_PARAMS_PER_STATEMENT // (1 + len(columns)))
+                    assignments = "".join(f"{col} = src.{col}, " for col in columns)
+                    row_placeholder = "(" + ", ".join(["?"] * (1 + len(columns))) + ")"
+                    for start in range(0, len(group), chunk_size):
+                        chunk = group[start:start + chunk_size]
+                        self.cursor.execute(f"""
+                        UPDATE v SET {assignments}V_StatsUpdated = SYSUTCDATETIME()
+                        FROM Video AS v
+                        JOIN (VALUES {", ".join([row_placeholder] * len(chunk))}) AS src (V_ID{"".join(f", {col}" for col in columns)})
+                            ON v.V_ID = src.V_ID
+                        """, [row[col] for row in chunk for col in ('V_ID',) + columns])
+                self.conn.commit()
+        except self.errors:
+            self.conn.rollback()
+            raise
+
+    SNAPSHOT_SEQ = {"C_Seq": "C_Seq", "P_Seq": "P_Seq", "V_Seq": "V_Seq", "T_Seq": "T_Seq"}
+
+    def snapshot_marks(self) -> tuple[str, dict[str, int]]:
+        self.cursor.execute("SELECT CONVERT(VARCHAR(27), SYSUTCDATETIME(), 121)")
+        now = self.cursor.fetchone()[0]
+        marks = {}
+        for table, seq in (("Tags", "T_Seq"), ("Video", "V_Seq"), ("Playlist", "P_Seq"), ("Channel", "C_Seq")):
+            self.cursor.execute(f"SELECT ISNULL(MAX({seq}), 0) FROM {table}")
+            marks[table] = self.cursor.fetchone()[0]
+        self.conn.commit()
+        return now, marks
+
+    def snapshot_rows(self, table: str, after: int, upto: int, limit: int) -> list[tuple]:
+        self.cursor.execute(SNAPSHOT_SELECT[table].format(top="TOP (?) ", limit="", **self.SNAPSHOT_SEQ),
+                            [limit, after, upto])
+        rows = [tuple(row) for row in self.cursor.fetchall()]
+        self.conn.commit()
+        return rows
+
+    def snapshot_count(self, table: str, upto: int) -> int:
+        self.cursor.execute(f"SELECT COUNT_BIG(*) FROM {table} WHERE {self.SNAPSHOT_SEQ[SNAPSHOT_SEQ_KEYS[table]]} <= ?", [upto])
+        count = self.cursor.fetchone()[0]
+        self.conn.commit()
+        return count
+
+    def changed_counters(self, since: str, upto: int) -> list[tuple]:
+        self.cursor.execute("SELECT V_Seq, V_Views, V_Likes FROM Video WHERE V_StatsUpdated >= ? AND V_Seq <= ?",
+                            [since, upto])
+        rows = [tuple(row) for row in self.cursor.fetchall()]
+        self.conn.commit()
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+
+class SQLiteSink(StatsSink, SnapshotSink):
+    """
+    Local stand-in for SQL Server with the tables of database/Database Creation.sql, for measuring
+    and tuning load throughput without a server. WAL journaling, one transaction per batch.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Category (
+        CT_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+        CT_Category VARCHAR(30) COLLATE NOCASE UNIQUE NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS Channel (
+        C_ID VARCHAR(40) PRIMARY KEY,
+        C_Name VARCHAR(100),
+        C_URL VARCHAR(200),
+        C_Uploader VARCHAR(100)
+    );
+
+    CREATE TABLE IF NOT EXISTS Playlist (
+        P_ID VARCHAR(50) PRIMARY KEY,
+        P_Title VARCHAR(200),
+        P_URL VARCHAR(200),
+        P_C_ID VARCHAR(40),
+        CONSTRAINT FK_Playlist_Channel FOREIGN KEY (P_C_ID)
+            REFERENCES Channel (C_ID)
+    );
+
+    CREATE TABLE IF NOT EXISTS Video (
+        V_ID VARCHAR(50) PRIMARY KEY,
+        V_Title VARCHAR(200) NOT NULL,
+        V_URL VARCHAR(200) NOT NULL,
+        V_Duration BIGINT,
+        V_Views BIGINT,
+        V_Likes BIGINT,
+        V_UploadDate DATE,
+        V_Description TEXT,
+        V_Embed BIT,
+        V_P_ID VARCHAR(50),
+        V_C_ID VARCHAR(40),
+        V_StatsUpdated TEXT DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT FK_Video_Playlist FOREIGN KEY (V_P_ID)
+            REFERENCES Playlist (P_ID),
+        CONSTRAINT FK_Video_Channel FOREIGN KEY (V_C_ID)
+            REFERENCES Channel (C_ID)
+    );
+
+    CREATE TABLE IF NOT EXISTS VideoCategoryJunc (
+        VC_CT INT NOT NULL,
+        VC_V VARCHAR(50) NOT NULL,
+        CONSTRAINT PK_VideoCategoryJunc PRIMARY KEY (VC_CT, VC_V),
+        CONSTRAINT FK_VCJunc_Category FOREIGN KEY (VC_CT)
+            REFERENCES Category (CT_ID),
+        CONSTRAINT FK_VCJunc_Video FOREIGN KEY (VC_V)
+            REFERENCES Video (V_ID)
+    );
+
+    CREATE TABLE IF NOT EXISTS Tags (
+        Tag VARCHAR(50) COLLATE NOCASE NOT NULL,
+        VT_V VARCHAR(50) NOT NULL,
+        CONSTRAINT PK_Tags PRIMARY KEY (VT_V, Tag),
+        CONSTRAINT FK_Tags_Video FOREIGN KEY (VT_V)
+            REFERENCES Video (V_ID)
+    );
+
+    CREATE INDEX IF NOT EXISTS IX_Video_Views ON Video (V_Views DESC, V_Title);
+    CREATE INDEX IF NOT EXISTS IX_Video_Likes ON Video (V_Likes DESC, V_Title);
+    CREATE INDEX IF NOT EXISTS IX_Video_Duration ON Video (V_Duration DESC, V_Title);
+    CREATE INDEX IF NOT EXISTS IX_Video_Channel ON Video (V_C_ID);
+    CREATE INDEX IF NOT EXISTS IX_Video_Playlist ON Video (V_P_ID, V_Duration);
+    """
+    MAX_PARAMS_PER_STATEMENT = 900  # stay below SQLITE_MAX_VARIABLE_NUMBER on older builds
+
+    def __init__(self, path: str = "youtube.db"):
+        self.errors = (sqlite3.Error,)
+        # isolation_level=None: transactions are opened explicitly, one per batch
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+        if "V_StatsUpdated" not in {row[1] for row in self.conn.execute("PRAGMA table_info(Video)")}:
+            self.conn.execute("ALTER TABLE Video ADD COLUMN V_StatsUpdated TEXT")  # databases made before the column
+        self.conn.execute("CREATE INDEX IF NOT EXISTS IX_Video_StatsUpdated ON Video (V_StatsUpdated, V_Views, V_Likes, V_P_ID)")
+        self.conn.create_function("LOG10", 1, lambda x: math.log10(x) if x and x > 0 else 0.0, deterministic=True)
+        self.cursor = self.conn.cursor()
+
+    def insert_rows(self, rows: list[dict], table: str):
+        columns = TABLE_COLUMNS[table]
+        sql = f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+        with TABLE_WRITE_SECONDS.time(table=table):
+            self.cursor.executemany(sql, [[row[col] for col in columns] for row in rows])
+
+    def select_in(self, sql: str, values: list) -> list:
+        result = []
+        for start in range(0, len(values), self.MAX_PARAMS_PER_STATEMENT):
+            chunk = values[start:start + self.MAX_PARAMS_PER_STATEMENT]
+            self.cursor.execute(sql.format(placeholders=", ".join(["?"] * len(chunk))), chunk)
+            result.extend(self.cursor.fetchall())
+        return result
+
+    def write_batch(self, rows: dict[str, list[dict]]) -> set[str]:
+        try:
+            # IMMEDIATE takes the write lock up front: a deferred transaction that has read first cannot
+            # upgrade once another writer committed, and fails with "database is locked" without waiting
+            self.cursor.execute("BEGIN IMMEDIATE")
+            video_ids = [row['V_ID'] for row in rows['Video']]
+            existing = {row[0] for row in self.select_in("SELECT V_ID FROM Video WHERE V_ID IN ({placeholders})", video_ids)}
+            self.insert_rows(rows['Channel'], 'Channel')
+            self.insert_rows(rows['Playlist'], 'Playlist')
+            self.insert_rows(rows['Video'], 'Video')
+            self.insert_rows(rows['Tags'], 'Tags')
+            names = list({row['CT_Category'] for row in rows['VideoCategory']})
+            with TABLE_WRITE_SECONDS.time(table="Category"):
+                self.cursor.executemany("INSERT OR IGNORE INTO Category (CT_Category) VALUES (?)", [[name] for name in names])
+                category_ids = dict((category_key(name), ct_id) for ct_id, name in
+                                    self.select_in("SELECT CT_ID, CT_Category FROM Category WHERE CT_Category IN ({placeholders})", names))
+            self.insert_rows(self.junction_rows(rows['VideoCategory'], category_ids), 'VideoCategoryJunc')
+            with STAGE_SECONDS.time(stage="commit"):
+                self.cursor.execute("COMMIT")
+        except self.errors:
+            if self.conn.in_transaction:
+                self.cursor.execute("ROLLBACK")
+            raise
+        # OR IGNORE also skips rows that break NOT NULL, so only count videos that really landed
+        stored = {row[0] for row in self.select_in("SELECT V_ID FROM Video WHERE V_ID IN ({placeholders})", video_ids)}
+        return stored - existing
+
+    def stale_videos(self, limit: int, min_age_hours: float, playlist_ids: list[str] | None = None) -> list[tuple]:
+        in_playlists = f"AND V_P_ID IN ({', '.join(['?'] * len(playlist_ids))})" if playlist_ids else ""
+        self.cursor.execute(f"""
+        SELECT V_ID, V_P_ID, V_Views, V_Likes
+        FROM Video
+        WHERE (V_StatsUpdated IS NULL OR V_StatsUpdated < datetime('now', ?)) {in_playlists}
+        ORDER BY (julianday('now') - julianday(COALESCE(V_StatsUpdated, '2000-01-01'))) * 24
+                 * (1 + LOG10(1 + COALESCE(V_Views, 0))) DESC
+        LIMIT ?
+        """, [f"-{int(min_age_hours * 60)} minutes", *(playlist_ids or []), limit])
+        return self.cursor.fetchall()
+
+    def update_stats(self, rows: list[dict]):
+        try:
+            self.cursor.execute("BEGIN IMMEDIATE")
+            with TABLE_WRITE_SECONDS.time(table="VideoStats"):
+                for columns, group in self.group_stats(rows).items():
+                    assignments = "".join(f"{col} = ?, " for col in columns)
+                    self.cursor.executemany(f"UPDATE Video SET {assignments}V_StatsUpdated = CURRENT_TIMESTAMP WHERE V_ID = ?",
+                                            [[row[col] for col in columns + ('V_ID',)] for row in group])
+            self.cursor.execute("COMMIT")
+        except self.errors:
+            if self.conn.in_transaction:
+                self.cursor.execute("ROLLBACK")
+            raise
+
+    # every table here is a rowid table, and rowids only grow while nothing is deleted
+    SNAPSHOT_SEQ = {"C_Seq": "rowid", "P_Seq": "rowid", "V_Seq": "rowid", "T_Seq": "rowid"}
+
+    def snapshot_marks(self) -> tuple[str, dict[str, int]]:
+        self.cursor.execute("BEGIN")  # one read snapshot for the clock and all the marks
+        try:
+            now = self.cursor.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+            marks = {table: self.cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                     for table in ("Tags", "Video", "Playlist", "Channel")}
+        finally:
+            self.cursor.execute("COMMIT")
+        return now, marks
+
+    def snapshot_rows(self, table: str, after: int, upto: int, limit: int) -> list[tuple]:
+        self.cursor.execute(SNAPSHOT_SELECT[table].format(top="", limit=" LIMIT ?", **self.SNAPSHOT_SEQ),
+                            [after, upto, limit])
+        return self.cursor.fetchall()
+
+    def snapshot_count(self, table: str, upto: int) -> int:
+        return self.cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {self.SNAPSHOT_SEQ[SNAPSHOT_SEQ_KEYS[table]]} <= ?",
+                                   [upto]).fetchone()[0]
+
+    def changed_counters(self, since: str, upto: int) -> list[tuple]:
+        self.cursor.execute("SELECT rowid, V_Views, V_Likes FROM Video WHERE V_StatsUpdated >= ? AND rowid <= ?",
+                            [since, upto])
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+class MongoSink(Sink):
+    """
+    One document per video (_id = V_ID, tags and categories embedded, V_C_ID / V_P_ID pointing into the
+    Channel and Playlist collections), written with one unordered bulk_write per collection and batch.
+    Documents that are already stored come back as duplicate key errors and are left untouched.
+    Pass `client` to use an existing MongoClient (or a mongomock one in tests).
+    """
+    def __init__(self, uri: str = "mongodb://localhost:27017", database: str = "YouTubeDB",
+                 collection: str = "VideoMetadata", client=None):
+        from pymongo import MongoClient
+        from pymongo.errors import BulkWriteError, PyMongoError
+        self.errors = (PyMongoError,)
+        self.BulkWriteError = BulkWriteError
+        self.client = client or MongoClient(uri)
+        db = self.client[database]
+        self.videos = db[collection]
+        self.channels = db["Channel"]
+        self.playlists = db["Playlist"]
+
+    def insert_missing(self, coll, docs: list[dict]) -> set:
+        from pymongo import InsertOne
+        if not docs:
+            return set()
+        failed = set()
+        try:
+            # unordered: the server keeps going past a failed document and reports all of them at the end
+            with TABLE_WRITE_SECONDS.time(table=coll.name):
+                coll.bulk_write([InsertOne(doc) for doc in docs], ordered=False)
+        except self.BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in write_errors):
+                raise
+            failed = {error["index"] for error in write_errors}
+        return {doc["_id"] for i, doc in enumerate(docs) if i not in failed}
+
+    def write_batch(self, rows: dict[str, list[dict]]) -> set[str]:
+        tags, categories = {}, {}
+        for row in rows['Tags']:
+            tags.setdefault(row['VT_V'], []).append(row['Tag'])
+        for row in rows['VideoCategory']:
+            categories.setdefault(row['VC_V'], []).append(row['CT_Category'])
+        self.insert_missing(self.channels, [{"_id": row['C_ID'], **row} for row in rows['Channel']])
+        self.insert_missing(self.playlists, [{"_id": row['P_ID'], **row} for row in rows['Playlist']])
+        return self.insert_missing(self.videos, [
+            {"_id": row['V_ID'], **row, "Tags": tags.get(row['V_ID'], []), "Categories": categories.get(row['V_ID'], [])}
+            for row in rows['Video']
+        ])
+
+    def healthy(self) -> bool:
+        try:
+            self.client.admin.command("ping")
+            return True
+        except self.errors:
+            return False
+
+    def close(self):
+        self.client.close()
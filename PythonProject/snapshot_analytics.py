@@ -0,0 +1,163 @@
+"""
+The metrics_log.json figures, percentiles and per-channel distributions computed with NumPy over the
+columnar snapshot written by snapshot_export.py, instead of with the queries of database/*.sql over
+the live tables. metrics() returns the same keys and values as CollectMetrics.collect() (as of the
+last export); everything is a full vectorized pass over memory-mapped columns, no per-row Python.
+
+    python snapshot_analytics.py --directory <snapshot directory>
+"""
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+
+from startup import lazy_import
+from snapshot_export import Snapshot
+
+np = lazy_import("numpy")
+
+
+class SnapshotAnalytics:
+    COUNTERS = ("V_Views", "V_Likes", "V_Duration")
+    AVERAGES = {"V_Duration": "avg_video_duration", "V_Views": "avg_video_views", "V_Likes": "avg_video_likes"}
+    TOP = {"V_Views": "top_video_by_views", "V_Likes": "top_video_by_likes", "V_Duration": "top_video_by_duration"}
+
+    def __init__(self, directory: str):
+        self.snapshot = Snapshot(directory)
+        self.lock = threading.Lock()  # the API serves requests from several threads
+
+    def columns(self, table: str, *names: str) -> list:
+        return [self.snapshot.tables[table].column(name) for name in names]
+
+    # ______METRICS______
+    def metrics(self) -> dict | None:
+        """CollectMetrics.collect() over the snapshot; None until the first export."""
+        with self.lock:
+            if not self.snapshot.load():
+                return None
+            videos = self.snapshot.tables["Video"]
+            metrics = {
+                "video_count": videos.rows,
+                "channel_count": self.snapshot.tables["Channel"].rows,
+                "playlist_count": self.snapshot.tables["Playlist"].rows,
+            }
+            for col, key in self.AVERAGES.items():
+                values = self.present(videos.column(col))
+                # integer division to match SQL Server's AVG over BIGINT columns
+                metrics[key] = int(values.astype("i8").sum()) // len(values) if len(values) else None
+            metrics.update(self.playlist_metrics())
+            for col, key in self.TOP.items():
+                metrics[key] = self.top_video(col)
+            metrics["top_channel_by_videos"] = self.top_channel()
+            return metrics
+
+    @staticmethod
+    def present(values):
+        return values[~np.isnan(values)]
+
+    def top_video(self, col: str) -> dict | None:
+        videos = self.snapshot.tables["Video"]
+        values = videos.column(col)
+        if not len(values):
+            return None
+        if np.isnan(values).all():
+            return {"V_Title": videos.string("V_Title", 0), col: None}  # SQL Server sorts NULLs last
+        position = int(np.nanargmax(values))
+        return {"V_Title": videos.string("V_Title", position), col: int(values[position])}
+
+    def playlist_metrics(self) -> dict:
+        playlist, duration = self.columns("Video", "playlist", "V_Duration")
+        listed = playlist >= 0
+        size = self.snapshot.tables["Playlist"].rows
+        totals = np.bincount(playlist[listed], weights=np.nan_to_num(duration[listed]), minlength=size)
+        with_videos = np.bincount(playlist[listed], minlength=size) > 0
+        if not with_videos.any():
+            return {"longest_playlist": {"P_Title": None, "total_duration": 0}, "avg_playlist_duration": 0}
+        position = int(np.argmax(np.where(with_videos, totals, -1)))
+        return {"longest_playlist": {"P_Title": self.snapshot.tables["Playlist"].string("P_Title", position),
+                                     "total_duration": int(totals[position])},
+                "avg_playlist_duration": float(totals[with_videos].mean())}
+
+    def channel_counts(self):
+        channel, = self.columns("Video", "channel")
+        return np.bincount(channel[channel >= 0], minlength=self.snapshot.tables["Channel"].rows)
+
+    def top_channel(self) -> dict | None:
+        counts = self.channel_counts()
+        if not counts.any():
+            return None
+        position = int(np.argmax(counts))
+        return {"C_Name": self.snapshot.tables["Channel"].string("C_Name", position), "video_count": int(counts[position])}
+
+    # ______DISTRIBUTIONS______
+    def percentiles(self, columns: tuple = COUNTERS, q: tuple = (50, 90, 99)) -> dict:
+        """{column: {"p50": ..., ...}} over the videos where the column is not NULL."""
+        result = {}
+        for col in columns:
+            values = self.present(self.snapshot.tables["Video"].column(col))
+            result[col] = ({f"p{p:g}": float(v) for p, v in zip(q, np.percentile(values, q))} if len(values)
+                           else {f"p{p:g}": None for p in q})
+        return result
+
+    def channel_distribution(self, col: str = "V_Views", top: int = 10, q: tuple = (50, 90)) -> list[dict]:
+        """Count, total, mean, max and percentiles of `col` per channel, for the `top` channels with the most videos."""
+        channel, values = self.columns("Video", "channel", col)
+        counts = self.channel_counts()
+        top_channels = np.argsort(counts, kind="stable")[::-1][:min(top, 1000)]
+        top_channels = top_channels[counts[top_channels] > 0]
+        if not len(top_channels):
+            return []
+        # only the rows of the chosen channels are grouped, by a stable (radix) sort of their small rank
+        rank = np.full(len(counts), -1, dtype="i4")
+        rank[top_channels] = np.arange(len(top_channels))
+        keep = (channel >= 0) & ~np.isnan(values)
+        keep[keep] = rank[channel[keep]] >= 0
+        group = rank[channel[keep]].astype("u2")
+        order = np.argsort(group, kind="stable")
+        group_values = np.asarray(values[keep])[order]
+        sizes = np.bincount(group, minlength=len(top_channels))
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        names = self.snapshot.tables["Channel"].strings("C_Name", top_channels)
+        result = []
+        for n, position in enumerate(top_channels):
+            entry = {"C_Name": names[n], "video_count": int(counts[position]), "count": int(sizes[n])}
+            if sizes[n]:
+                member_values = group_values[starts[n]:starts[n] + sizes[n]]
+                total = float(member_values.sum())
+                entry.update({"sum": total, "mean": total / sizes[n], "max": float(member_values.max())})
+                entry.update({f"p{p:g}": float(v) for p, v in zip(q, np.percentile(member_values, q))})
+            result.append(entry)
+        return result
+
+    def top_tags(self, top: int = 20) -> list[dict]:
+        tag, = self.columns("Tags", "tag")
+        names = self.snapshot.tables["TagNames"]
+        counts = np.bincount(tag, minlength=names.rows)
+        positions = np.argsort(counts, kind="stable")[::-1][:top]
+        positions = positions[counts[positions] > 0]
+        return [{"Tag": name, "video_count": int(counts[p])} for name, p in zip(names.strings("Tag", positions), positions)]
+
+    def report(self, col: str = "V_Views", top: int = 10) -> dict | None:
+        """metrics() plus percentiles, the per-channel distribution of `col` and the most used tags."""
+        metrics = self.metrics()
+        if metrics is None:
+            return None
+        with self.lock:
+            return {**metrics,
+                    "percentiles": self.percentiles(),
+                    "channels": self.channel_distribution(col, top),
+                    "top_tags": self.top_tags(top),
+                    "exported_at": self.snapshot.manifest.get("exported_at")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metrics and distributions over the columnar snapshot.")
+    parser.add_argument("--directory", default=str(Path(__file__).resolve().parent / "snapshot"))
+    parser.add_argument("--column", default="V_Views", choices=SnapshotAnalytics.COUNTERS)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    report = SnapshotAnalytics(args.directory).report(args.column, args.top)
+    print(json.dumps(report, indent=2, default=str))
+    print(f"[SNAPSHOT] computed in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,363 @@
+"""
+Columnar copy of the Channel, Playlist, Video and Tags tables for snapshot_analytics.py, so the heavy
+metrics run over local arrays instead of the tables the ETL is writing to.
+
+Every table is a directory of column files: fixed-width columns are raw little-endian arrays that
+readers memory-map with NumPy (rows in insert order), text columns are a uint64 end-offset array plus
+the concatenated UTF-8 bytes. References to other tables are stored as row positions in that table's
+files (-1 = none), tags as positions in the TagNames table. snapshot.json records how many rows of
+each table are complete and the highest sequence number exported; it is replaced atomically after
+every appended chunk, and anything past it in the files is cut off on the next open.
+
+Each export() only reads the rows inserted since the previous one (by V_Seq etc., see
+Sink.snapshot_rows), in chunks of chunk_rows, and then patches V_Views / V_Likes of the videos that
+stats_refresh.py has updated since. A count per table catches rows committed too far below the
+previous mark to be read again, and references that did not resolve yet (manifest "unresolved")
+are looked up again on every export.
+
+    python snapshot_export.py --every 300
+"""
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+
+from startup import lazy_import
+from metrics import write_json_atomic
+from sinks import Sink, SnapshotSink, SqlServerSink
+from instrumentation import SNAPSHOT_LATE_ROWS, STAGE_SECONDS
+
+np = lazy_import("numpy")
+
+
+def default_sink() -> Sink:
+    from etl_worker import ETLWorker
+    return SqlServerSink(ETLWorker.CONNECTION_STRING)
+
+
+class ColumnTable:
+    """The column files of one table, `rows` of them complete. Writers append, readers memory-map."""
+    def __init__(self, directory: Path, columns: dict[str, str], rows: int = 0, sorted_seq: bool = True):
+        """columns: name -> NumPy dtype, or "str" for text."""
+        self.directory = directory
+        self.columns = columns
+        self.rows = rows
+        self.sorted_seq = sorted_seq  # seq ascending with the rows, so positions() can binary search
+        self.seq_order = None  # argsort of seq when it is not, built on demand
+
+    def path(self, name: str, suffix: str = ".bin") -> Path:
+        return self.directory / f"{name}{suffix}"
+
+    def truncate(self):
+        """Cuts off what a crashed writer appended past `rows`."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name, dtype in self.columns.items():
+            if dtype == "str":
+                offsets = self.column(name)
+                self.cut(self.path(name, ".offsets"), self.rows * 8)
+                self.cut(self.path(name, ".data"), int(offsets[-1]) if self.rows else 0)
+            else:
+                self.cut(self.path(name), self.rows * np.dtype(dtype).itemsize)
+
+    @staticmethod
+    def cut(path: Path, size: int):
+        with open(path, "ab") as f:
+            if f.tell() != size:
+                f.truncate(size)
+
+    # ______WRITING______
+    def append(self, arrays: dict):
+        """arrays: every column, as NumPy arrays (lists of str for text columns) of equal length."""
+        count = len(arrays["seq"])
+        if not count:
+            return
+        if self.rows and self.sorted_seq and arrays["seq"][0] <= self.column("seq")[-1]:
+            self.sorted_seq = False
+        for name, dtype in self.columns.items():
+            if dtype == "str":
+                encoded = [(value or "").encode("utf-8") for value in arrays[name]]
+                end = int(self.column(name)[-1]) if self.rows else 0
+                offsets = end + np.cumsum([len(value) for value in encoded], dtype="<u8")
+                with open(self.path(name, ".data"), "ab") as f:
+                    f.write(b"".join(encoded))
+                with open(self.path(name, ".offsets"), "ab") as f:
+                    f.write(offsets.tobytes())
+            else:
+                with open(self.path(name), "ab") as f:
+                    f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        self.rows += count
+        self.seq_order = None
+
+    def patch(self, name: str, positions, values):
+        column = np.memmap(self.path(name), dtype=self.columns[name], mode="r+", shape=(self.rows,))
+        column[positions] = values
+        column.flush()
+        del column
+
+    # ______READING______
+    def column(self, name: str):
+        dtype = self.columns[name]
+        path, dtype = (self.path(name, ".offsets"), "<u8") if dtype == "str" else (self.path(name), dtype)
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(self.rows,))
+
+    def strings(self, name: str, positions) -> list[str]:
+        offsets = self.column(name)
+        with open(self.path(name, ".data"), "rb") as f:
+            values = []
+            for position in positions:
+                start = int(offsets[position - 1]) if position else 0
+                f.seek(start)
+                values.append(f.read(int(offsets[position]) - start).decode("utf-8"))
+        return values
+
+    def string(self, name: str, position: int) -> str:
+        return self.strings(name, [position])[0]
+
+    def positions(self, seqs):
+        """Row positions of the given sequence numbers, -1 where the row is not in the snapshot."""
+        seqs = np.asarray(seqs, dtype="i8")
+        seq = self.column("seq")
+        if not len(seq):
+            return np.full(len(seqs), -1, dtype="i8")
+        if self.sorted_seq:
+            order = None
+        else:
+            if self.seq_order is None:
+                self.seq_order = np.argsort(seq, kind="stable")
+            order = self.seq_order
+            seq = seq[order]
+        found = np.minimum(np.searchsorted(seq, seqs), len(seq) - 1)
+        hit = seq[found] == seqs
+        if order is not None:
+            found = order[found]
+        return np.where(hit, found, -1)
+
+
+class Snapshot:
+    """The manifest and the tables of one snapshot directory."""
+    MANIFEST = "snapshot.json"
+    TABLES = {
+        "Channel": {"seq": "<i8", "C_ID": "str", "C_Name": "str"},
+        "Playlist": {"seq": "<i8", "P_ID": "str", "P_Title": "str", "channel": "<i4"},
+        "Video": {"seq": "<i8", "V_ID": "str", "V_Title": "str", "V_Duration": "<f8", "V_Views": "<f8",
+                  "V_Likes": "<f8", "V_UploadDate": "<M8[D]", "playlist": "<i4", "channel": "<i4"},
+        "TagNames": {"seq": "<i8", "Tag": "str"},  # seq: position, the tags are numbered as they are first seen
+        "Tags": {"seq": "<i8", "tag": "<i4", "video": "<i4"},
+    }
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.manifest = {"tables": {}, "counters_since": None, "exported_at": None}
+        self.tables = {}
+        self.stamp = None
+
+    def load(self) -> bool:
+        """(Re)reads the manifest if it changed since the last call; False while there is none."""
+        path = self.directory / self.MANIFEST
+        try:
+            stat = path.stat()
+            if (stat.st_mtime_ns, stat.st_size) == self.stamp:
+                return True
+            with open(path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            return self.stamp is not None
+        self.stamp = (stat.st_mtime_ns, stat.st_size)
+        for name, columns in self.TABLES.items():
+            entry = self.manifest["tables"].get(name, {})
+            self.tables[name] = ColumnTable(self.directory / name, columns, entry.get("rows", 0), entry.get("sorted", True))
+        return True
+
+    def save(self):
+        for name, table in self.tables.items():
+            entry = self.manifest["tables"].setdefault(name, {"seq": 0})
+            entry["rows"] = table.rows
+            entry["sorted"] = table.sorted_seq
+        write_json_atomic(str(self.directory / self.MANIFEST), self.manifest)
+
+
+class SnapshotExporter:
+    EXPORT_ORDER = ("Channel", "Playlist", "Video", "Tags")  # parents first, so every reference resolves
+    REFERENCES = {("Playlist", "channel"): "Channel", ("Video", "playlist"): "Playlist",
+                  ("Video", "channel"): "Channel", ("Tags", "video"): "Video"}
+
+    def __init__(self, directory: str, sink_factory=None, chunk_rows: int = 50000, lookback: int = 1000):
+        """
+        lookback: sequence numbers below the previous high mark that are read again. SQL Server hands out
+        IDENTITY values before commit, so a slow transaction can commit a row below a mark already
+        exported; rows already in the snapshot are skipped. Rows committed further below are found by
+        comparing counts, logged, and read again from the start of the table.
+        """
+        self.snapshot = Snapshot(directory)
+        self.snapshot.directory.mkdir(parents=True, exist_ok=True)
+        self.snapshot.load()
+        for name, columns in Snapshot.TABLES.items():
+            self.snapshot.tables.setdefault(name, ColumnTable(self.snapshot.directory / name, columns))
+            self.snapshot.tables[name].truncate()
+        self.sink_factory = sink_factory or default_sink
+        self.chunk_rows = max(1, chunk_rows)
+        self.lookback = max(0, lookback)
+        tag_names = self.snapshot.tables["TagNames"]
+        self.tag_ids = {tag: n for n, tag in enumerate(tag_names.strings("Tag", range(tag_names.rows)))}
+
+    def export(self, sink: SnapshotSink) -> dict[str, int]:
+        """Appends the rows added since the last export; returns the number of new rows per table."""
+        manifest = self.snapshot.manifest
+        now, marks = sink.snapshot_marks()
+        added = {}
+        with STAGE_SECONDS.time(stage="snapshot_export"):
+            for name in self.EXPORT_ORDER:
+                table = self.snapshot.tables[name]
+                entry = manifest["tables"].setdefault(name, {"seq": 0})
+                after = max(0, entry["seq"] - self.lookback) if table.rows else 0
+                added[name] = self.append_rows(sink, name, after, marks[name])
+                if after:
+                    # everything up to `after` was exported before, unless it was committed after that export
+                    late = sink.snapshot_count(name, after) - int(np.count_nonzero(table.column("seq") <= after))
+                    if late > 0:
+                        print(f"[SNAPSHOT] {late} {name} rows committed more than {self.lookback} below the last mark, "
+                              f"reading the table again")
+                        SNAPSHOT_LATE_ROWS.labels(table=name).inc(late)
+                        added[name] += self.append_rows(sink, name, 0, after)
+            self.resolve_references()
+            if manifest["counters_since"] is not None:
+                self.patch_counters(sink, manifest["counters_since"], marks["Video"])
+            manifest["counters_since"] = now
+            manifest["exported_at"] = time.time()
+            self.snapshot.save()
+        return added
+
+    def append_rows(self, sink: SnapshotSink, name: str, after: int, upto: int) -> int:
+        """Appends the rows with sequence numbers in (after, upto] that are not in the snapshot yet."""
+        table = self.snapshot.tables[name]
+        entry = self.snapshot.manifest["tables"][name]
+        added = 0
+        while True:
+            rows = sink.snapshot_rows(name, after, upto, self.chunk_rows)
+            if not rows:
+                break
+            after = rows[-1][0]
+            arrays = self.to_arrays(name, rows)
+            if table.rows and arrays["seq"][0] <= entry["seq"]:
+                fresh = table.positions(arrays["seq"]) < 0  # only rows that were not exported yet
+                arrays = {key: [v for v, keep in zip(values, fresh) if keep] if isinstance(values, list)
+                          else values[fresh] for key, values in arrays.items()}
+            self.defer_unresolved(name, table.rows, arrays)
+            table.append(arrays)
+            added += len(arrays["seq"])
+            entry["seq"] = max(entry["seq"], int(after))
+            self.snapshot.save()
+            if len(rows) < self.chunk_rows:
+                break
+        return added
+
+    def defer_unresolved(self, name: str, first: int, arrays: dict):
+        # a referenced row that is not in the snapshot yet (committed late) is looked up again on later exports
+        unresolved = self.snapshot.manifest.setdefault("unresolved", {})
+        for (table, column), _ in self.REFERENCES.items():
+            if table != name:
+                continue
+            seqs = arrays[f"{column}_seq"]
+            missing = np.flatnonzero((arrays[column] < 0) & (seqs >= 0))
+            if len(missing):
+                unresolved.setdefault(f"{name}.{column}", []).extend(
+                    [first + int(n), int(seqs[n])] for n in missing)
+
+    def resolve_references(self):
+        unresolved = self.snapshot.manifest.get("unresolved") or {}
+        for key, pending in list(unresolved.items()):
+            name, column = key.split(".")
+            positions, seqs = np.array(pending, dtype="i8").reshape(-1, 2).T
+            found = self.snapshot.tables[self.REFERENCES[(name, column)]].positions(seqs)
+            resolved = found >= 0
+            if resolved.any():
+                self.snapshot.tables[name].patch(column, positions[resolved], found[resolved])
+                print(f"[SNAPSHOT] {int(resolved.sum())} {key} references resolved")
+            unresolved[key] = [[int(p), int(s)] for p, s in zip(positions[~resolved], seqs[~resolved])]
+            if not unresolved[key]:
+                del unresolved[key]
+
+    def to_arrays(self, name: str, rows: list[tuple]) -> dict:
+        columns = list(zip(*rows))
+        tables = self.snapshot.tables
+        seq = np.asarray(columns[0], dtype="<i8")
+        if name == "Channel":
+            return {"seq": seq, "C_ID": list(columns[1]), "C_Name": list(columns[2])}
+        if name == "Playlist":
+            return {"seq": seq, "P_ID": list(columns[1]), "P_Title": list(columns[2]),
+                    **self.references("channel", tables["Channel"], columns[3])}
+        if name == "Video":
+            return {"seq": seq, "V_ID": list(columns[1]), "V_Title": list(columns[2]),
+                    "V_Duration": np.array(columns[3], dtype="<f8"), "V_Views": np.array(columns[4], dtype="<f8"),
+                    "V_Likes": np.array(columns[5], dtype="<f8"), "V_UploadDate": np.array(columns[6], dtype="<M8[D]"),
+                    **self.references("playlist", tables["Playlist"], columns[7]),
+                    **self.references("channel", tables["Channel"], columns[8])}
+        return {"seq": seq, "tag": self.tag_codes(columns[1]), **self.references("video", tables["Video"], columns[2])}
+
+    @staticmethod
+    def references(column: str, table: ColumnTable, seqs: tuple) -> dict:
+        """The positions for `column`, and the sequence numbers (-1 = NULL) as column_seq for defer_unresolved()."""
+        seqs = np.array([-1 if seq is None else seq for seq in seqs], dtype="i8")
+        return {column: table.positions(seqs).astype("<i4"), f"{column}_seq": seqs}
+
+    def tag_codes(self, tags: tuple):
+        new = [tag for tag in dict.fromkeys(tags) if tag not in self.tag_ids]
+        if new:
+            tag_names = self.snapshot.tables["TagNames"]
+            for tag in new:
+                self.tag_ids[tag] = len(self.tag_ids)
+            tag_names.append({"seq": np.arange(tag_names.rows, tag_names.rows + len(new), dtype="<i8"), "Tag": new})
+        return np.fromiter((self.tag_ids[tag] for tag in tags), dtype="<i4", count=len(tags))
+
+    def patch_counters(self, sink: SnapshotSink, since: str, upto: int):
+        changed = sink.changed_counters(since, upto)
+        if not changed:
+            return
+        videos = self.snapshot.tables["Video"]
+        seqs, views, likes = zip(*changed)
+        positions = videos.positions(seqs)
+        known = positions >= 0
+        videos.patch("V_Views", positions[known], np.array(views, dtype="<f8")[known])
+        videos.patch("V_Likes", positions[known], np.array(likes, dtype="<f8")[known])
+
+    def run(self, every: float = 300.0, stop: threading.Event | None = None):
+        stop = stop or threading.Event()
+        sink = self.sink_factory()
+        if not isinstance(sink, SnapshotSink):
+            print(f"[SNAPSHOT] {type(sink).__name__} cannot be exported, exporter not started")
+            sink.close()
+            return
+        try:
+            while not stop.is_set():
+                start = time.monotonic()
+                try:
+                    added = self.export(sink)
+                except sink.errors as e:
+                    print(f"[SNAPSHOT] export failed: {e}")
+                else:
+                    print(f"[SNAPSHOT] {', '.join(f'{n} {name}' for name, n in added.items())} "
+                          f"added in {time.monotonic() - start:.1f}s")
+                stop.wait(every)
+        finally:
+            sink.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the tables to the columnar snapshot.")
+    parser.add_argument("--directory", default=str(Path(__file__).resolve().parent / "snapshot"))
+    parser.add_argument("--every", type=float, default=0, help="seconds between exports (0 = export once)")
+    parser.add_argument("--chunk-rows", type=int, default=50000)
+    args = parser.parse_args()
+    exporter = SnapshotExporter(args.directory, chunk_rows=args.chunk_rows)
+    if args.every:
+        exporter.run(args.every)
+    else:
+        sink = exporter.sink_factory()
+        if isinstance(sink, SnapshotSink):
+            print(exporter.export(sink))
+        else:
+            print(f"[SNAPSHOT] {type(sink).__name__} cannot be exported")
+        sink.close()
@@ -0,0 +1,246 @@
+"""
+Durable hand-off between YTSearch and the loaders: every fetched record is appended to a local spool
+before anything is written to the database, so a slow or unreachable database or a crash never costs a
+scrape.
+
+    python spool.py <spool dir> [--sqlite youtube.db]     # load every retained record again
+
+<dir>/00000001.jsonl, 00000002.jsonl, ... are append-only segments of one VideoRecord per line; a new
+segment is started at segment_bytes and after every restart (so a torn last line is never appended to).
+<dir>/committed.json holds the position up to which every record has been loaded; on start, reading
+resumes there. Committed segments are kept up to retain_bytes as a replay source.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from metrics import write_json_atomic
+from video_record import VideoRecord
+
+
+class Spool:
+    INDEX_NAME = "committed.json"
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024, retain_bytes: int = 1024 ** 3,
+                 fsync_interval: float = 1.0):
+        """
+        fsync_interval: appends are flushed to the OS right away (safe against a process crash) and
+        fsync'ed at most this often (bounds the loss on power failure).
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.retain_bytes = retain_bytes
+        self.fsync_interval = fsync_interval
+
+        self.committed = self.load_index()
+        existing = self.segments()
+        self.active_segment = (existing[-1] if existing else 0) + 1
+        self.writer = None  # opened on the first append
+        self.written = 0
+        self.last_fsync = time.monotonic()
+        self.write_lock = threading.Lock()
+
+        # one loader reads at a time, so batches are handed out in file order; the committed position
+        # only moves past a batch once every batch before it has been committed too
+        self.read_lock = threading.Lock()
+        self.available = threading.Condition()
+        self.appended = 0  # bumped on every append, so a reader never misses a notify
+        self.read_position = self.committed
+        self.reader = None
+        self.commit_lock = threading.Lock()
+        self.in_flight = []  # [end_position, done] in read order
+
+    # ______FILES______
+    def segment_path(self, segment: int) -> Path:
+        return self.directory / f"{segment:08d}.jsonl"
+
+    def segments(self) -> list[int]:
+        return sorted(int(path.stem) for path in self.directory.glob("*.jsonl") if path.stem.isdigit())
+
+    def load_index(self) -> tuple[int, int]:
+        try:
+            with open(self.directory / self.INDEX_NAME, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            return index["segment"], index["offset"]
+        except (FileNotFoundError, ValueError, KeyError):
+            existing = self.segments()
+            return (existing[0] if existing else 1), 0
+
+    # ______WRITING______
+    def append(self, record: VideoRecord):
+        line = json.dumps(record.as_dict(), separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+        with self.write_lock:
+            if self.writer is None:
+                self.writer = open(self.segment_path(self.active_segment), "ab")
+            elif self.written and self.written + len(line) > self.segment_bytes:
+                self.roll_segment()
+            self.writer.write(line)
+            self.writer.flush()
+            self.written += len(line)
+            if time.monotonic() - self.last_fsync >= self.fsync_interval:
+                os.fsync(self.writer.fileno())
+                self.last_fsync = time.monotonic()
+        with self.available:
+            self.appended += 1
+            self.available.notify_all()
+
+    def roll_segment(self):
+        os.fsync(self.writer.fileno())
+        self.writer.close()
+        self.active_segment += 1
+        self.writer = open(self.segment_path(self.active_segment), "ab")
+        self.written = 0
+
+    # ______READING______
+    def read_line(self) -> bytes | None:
+        """Next complete line at read_position, moving over finished segments; None when caught up."""
+        while True:
+            segment, offset = self.read_position
+            if self.reader is None or self.reader[0] != segment:
+                if self.reader is not None:
+                    self.reader[1].close()
+                    self.reader = None
+                if not self.segment_path(segment).exists():
+                    later = [s for s in self.segments() if s > segment]
+                    if not later or segment >= self.active_segment:
+                        return None
+                    self.read_position = (later[0], 0)
+                    continue
+                self.reader = (segment, open(self.segment_path(segment), "rb"))
+            f = self.reader[1]
+            f.seek(offset)
+            line = f.readline()
+            if line.endswith(b"\n"):
+                self.read_position = (segment, offset + len(line))
+                return line
+            with self.write_lock:
+                active = self.active_segment
+            if segment >= active:
+                return None  # the writer is still on this segment, wait for more
+            if line:
+                print(f"[SPOOL] skipping torn record at the end of segment {segment}")
+            self.read_position = (segment + 1, 0)
+
+    def read_batch(self, max_records: int, timeout: float) -> tuple[list[VideoRecord], tuple[int, int] | None]:
+        """
+        Up to max_records records, waiting at most `timeout` seconds for the batch to fill. Pass the
+        returned position to commit() once the records are loaded.
+        """
+        deadline = time.monotonic() + timeout
+        records = []
+        with self.read_lock:
+            while len(records) < max_records:
+                with self.available:
+                    appended = self.appended
+                line = self.read_line()
+                if line is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    with self.available:
+                        if self.appended == appended:
+                            self.available.wait(remaining)
+                    continue
+                try:
+                    records.append(VideoRecord(**json.loads(line)))
+                except (ValueError, TypeError):
+                    print(f"[SPOOL] skipping unreadable record before {self.read_position}")
+            if not records:
+                return [], None
+            position = self.read_position
+            with self.commit_lock:
+                self.in_flight.append([position, False])
+        return records, position
+
+    def commit(self, position: tuple[int, int]):
+        with self.commit_lock:
+            for entry in self.in_flight:
+                if entry[0] == position:
+                    entry[1] = True
+                    break
+            advanced = None
+            while self.in_flight and self.in_flight[0][1]:
+                advanced = self.in_flight.pop(0)[0]
+            if advanced is None:
+                return
+            self.committed = advanced
+            write_json_atomic(str(self.directory / self.INDEX_NAME),
+                              {"segment": advanced[0], "offset": advanced[1], "committed_at": time.time()})
+        self.prune()
+
+    def prune(self):
+        # committed segments beyond retain_bytes are deleted, oldest first
+        committed_segment = self.committed[0]
+        done = [s for s in self.segments() if s < committed_segment]
+        sizes = {s: self.segment_path(s).stat().st_size for s in done}
+        total = sum(sizes.values())
+        for segment in done:
+            if total <= self.retain_bytes:
+                break
+            try:
+                self.segment_path(segment).unlink()
+            except OSError:
+                break  # still open somewhere (Windows), try again on a later commit
+            total -= sizes[segment]
+
+    # ______REPLAY______
+    def replay(self, start: tuple[int, int] | None = None):
+        """Yields every record still on disk from `start` (default: the oldest segment) without touching the index."""
+        for segment in self.segments():
+            if start and segment < start[0]:
+                continue
+            with open(self.segment_path(segment), "rb") as f:
+                if start and segment == start[0]:
+                    f.seek(start[1])
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        yield VideoRecord(**json.loads(line))
+                    except (ValueError, TypeError):
+                        continue
+
+    def close(self):
+        with self.write_lock:
+            if self.writer is not None:
+                os.fsync(self.writer.fileno())
+                self.writer.close()
+                self.writer = None
+        with self.read_lock:
+            if self.reader is not None:
+                self.reader[1].close()
+                self.reader = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reload every record kept in a spool directory.")
+    parser.add_argument("directory")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--sqlite", default=None, help="load into this SQLite file instead of SQL Server")
+    args = parser.parse_args()
+
+    from etl_worker import ETLWorker
+    sink_factory = None
+    if args.sqlite:
+        from sinks import SQLiteSink
+        sink_factory = lambda: SQLiteSink(args.sqlite)
+    worker = ETLWorker(batch_size=args.batch_size, sink_factory=sink_factory)
+    sink = worker.connect()
+    spool = Spool(args.directory)
+    batch, total = [], 0
+    for record in spool.replay():
+        batch.append(record)
+        if len(batch) >= args.batch_size:
+            worker.process_batch(batch, sink)
+            total += len(batch)
+            batch = []
+    if batch:
+        worker.process_batch(batch, sink)
+        total += len(batch)
+    spool.close()
+    sink.close()
+    print(f"[SPOOL] replayed {total} records")
@@ -0,0 +1,147 @@
+"""
+Keeps a worker's cold start short: heavy modules are imported on first use, and the search word list is
+read from a precompiled file instead of being rebuilt by wordfreq in every process.
+
+    python startup.py [--lang en] [--size 50000]     # (re)build the word list cache
+"""
+import argparse
+import importlib
+import importlib.util
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).resolve().parent / "cache"
+
+
+IMPORT_LOCK = threading.Lock()
+
+
+class LazyModule:
+    """
+    Stands in for a module until its first attribute access, which imports it. Unlike importlib's
+    LazyLoader this is safe when several threads touch the module at once: the import runs under a
+    lock, and nobody sees the module before it is fully executed.
+    """
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with IMPORT_LOCK:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_name"])
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self.__dict__['_name']}'>"
+
+
+def lazy_import(name: str):
+    """The module, imported on its first attribute access instead of now (already imported modules are returned as is)."""
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    return LazyModule(name)
+
+
+class WordList:
+    """
+    Read-only sequence of words backed by a memory-mapped file, so opening it costs a few syscalls and
+    only the words actually drawn are decoded. File: header, count + 1 little-endian uint32 offsets,
+    then the UTF-8 words back to back.
+    """
+    MAGIC = b"WORDS\x00\x01\x00"
+    HEADER = struct.Struct("<8sI")
+
+    def __init__(self, path: str | Path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self.map)
+        magic, self.count = self.HEADER.unpack_from(self.map) if size >= self.HEADER.size else (None, 0)
+        self.data_start = self.HEADER.size + 4 * (self.count + 1)
+        if magic != self.MAGIC or size < self.data_start or \
+                self.data_start + struct.unpack_from("<I", self.map, self.data_start - 4)[0] != size:
+            self.map.close()  # unmapped, so the file can be rebuilt in place on Windows
+            raise ValueError(f"{path} is not a complete word list")
+        if sys.byteorder == "little":
+            self.offsets = memoryview(self.map)[self.HEADER.size:self.data_start].cast("I")
+        else:
+            self.offsets = array("I", self.map[self.HEADER.size:self.data_start])
+            self.offsets.byteswap()
+
+    @classmethod
+    def write(cls, path: str | Path, words: list[str]):
+        encoded = [word.encode("utf-8") for word in words]
+        offsets = array("I", [0])
+        for word in encoded:
+            offsets.append(offsets[-1] + len(word))
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(encoded)))
+            f.write(offsets.tobytes())
+            f.write(b"".join(encoded))
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("word list index out of range")
+        start = self.data_start + self.offsets[index]
+        return self.map[start:self.data_start + self.offsets[index + 1]].decode("utf-8")
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+
+def load_word_list(lang: str = "en", size: int = 50000, cache_dir: str | Path | None = None,
+                   rebuild: bool = False) -> WordList | list[str]:
+    """wordfreq's top_n_list(lang, size), from the cache file; the first call per machine builds it."""
+    path = Path(cache_dir or CACHE_DIR) / f"words-{lang}-{size}.bin"
+    if not rebuild:
+        try:
+            return WordList(path)
+        except (FileNotFoundError, ValueError):
+            pass
+    from wordfreq import top_n_list
+    words = top_n_list(lang, size)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        WordList.write(path, words)
+        return WordList(path)
+    except OSError as e:  # read-only checkout, or the old file still mapped by another process (Windows)
+        print(f"[WORDS] word list cache not written: {e}")
+        return words
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompile the search word list cache.")
+    parser.add_argument("--lang", default="en")
+    parser.add_argument("--size", type=int, default=50000)
+    args = parser.parse_args()
+    words = load_word_list(args.lang, args.size, rebuild=True)
+    print(f"[WORDS] {len(words)} words cached in {CACHE_DIR}")
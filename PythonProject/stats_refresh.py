@@ -0,0 +1,166 @@
+"""
+Bulk refresh of V_Views / V_Likes for videos already in the database. Each round takes the stalest,
+most viewed videos (Sink.stale_videos), re-reads their counters and writes back only the ones that
+changed, one UPDATE per batch (Sink.update_stats).
+Requests come out of a RequestBudget of their own (requests_per_hour), and the refresher waits
+whenever the discovery budget it yields to is backing off, so a refresh never takes requests from
+the crawler.
+
+    python stats_refresh.py --requests-per-hour 600 --batch-size 100
+"""
+import argparse
+import threading
+import time
+from collections import defaultdict
+
+from startup import lazy_import
+from yt_search import YTSearch
+from query_scheduler import QueryScheduler, RequestBudget
+from sinks import Sink, SqlServerSink, StatsSink
+from instrumentation import STATS_REFRESHED
+
+yt_dlp = lazy_import("yt_dlp")
+
+
+def default_sink() -> Sink:
+    from etl_worker import ETLWorker
+    return SqlServerSink(ETLWorker.CONNECTION_STRING)
+
+
+class StatsRefresher:
+    def __init__(self, sink_factory=None, requests_per_hour: float = 600, batch_size: int = 100,
+                 min_age_hours: float = 24, min_playlist_videos: int = 2, full_every: int = 4,
+                 yield_to: RequestBudget | None = None, search: YTSearch | None = None, idle_sleep: float = 600):
+        """
+        A playlist with at least min_playlist_videos candidates in the round is read with one flat
+        request, which also refreshes its other stale videos; flat entries carry views but not likes,
+        so every full_every-th round reads all candidates one by one (0 = never use playlists).
+        yield_to is the crawler's RequestBudget (ETLWorker.query_scheduler().budget).
+        idle_sleep: seconds to wait when no video is stale.
+        """
+        self.sink_factory = sink_factory or default_sink
+        self.batch_size = max(1, batch_size)
+        self.min_age_hours = min_age_hours
+        self.min_playlist_videos = max(2, min_playlist_videos)
+        self.full_every = full_every
+        self.yield_to = yield_to
+        self.idle_sleep = idle_sleep
+        # a word list is only needed for discovery queries, which the refresher never makes
+        self.search = search or YTSearch(scheduler=QueryScheduler(
+            ["refresh"], RequestBudget(requests_per_hour / 3600, burst=min(10.0, requests_per_hour / 60))))
+        self.rounds = 0
+
+    PLAYLISTS_PER_QUERY = 500  # keeps the IN list under SQL Server's parameter limit
+
+    # ______READING______
+    def wait_for_discovery(self):
+        # discovery is being throttled: more requests from the same address would only prolong it
+        budget = self.yield_to
+        while budget is not None and budget.paused_until is not None and budget.clock() < budget.paused_until:
+            budget.sleep(budget.paused_until - budget.clock())
+
+    def extract(self, flavor: str, url: str):
+        self.wait_for_discovery()
+        try:
+            return self.search.extract(flavor, url, stage="refresh")
+        except yt_dlp.utils.DownloadError:
+            return None
+
+    def read_playlist(self, playlist_id: str) -> dict[str, dict] | None:
+        """V_Views of every listed video, or None if the playlist could not be read."""
+        info = self.extract("flat", f"https://www.youtube.com/playlist?list={playlist_id}")
+        if not info:
+            return None
+        return {entry["id"]: {"V_Views": entry.get("view_count")} for entry in info.get("entries") or []
+                if entry and entry.get("id")}
+
+    def read_video(self, video_id: str) -> dict | None:
+        info = self.extract("stats", YTSearch.normalize_video_url(video_id, None))
+        if not info:
+            return None
+        return {"V_Views": info.get("view_count"), "V_Likes": info.get("like_count")}
+
+    # ______REFRESHING______
+    def refresh_once(self, sink: StatsSink) -> dict:
+        """One round over up to batch_size videos; returns the number of videos per result."""
+        candidates = sink.stale_videos(self.batch_size, self.min_age_hours)
+        self.rounds += 1
+        fresh = {}  # V_ID -> counters read this round
+        if self.full_every and self.rounds % self.full_every != 0:
+            by_playlist = defaultdict(int)
+            for _, playlist_id, *_ in candidates:
+                by_playlist[playlist_id] += 1
+            playlists = [p for p, count in by_playlist.items() if p and count >= self.min_playlist_videos]
+            # the playlist request returns every video of it, so its other stale videos come along for free
+            known = {candidate[0] for candidate in candidates}
+            for start in range(0, len(playlists), self.PLAYLISTS_PER_QUERY):
+                chunk = playlists[start:start + self.PLAYLISTS_PER_QUERY]
+                candidates.extend(video for video in sink.stale_videos(100 * len(chunk), self.min_age_hours, chunk)
+                                  if video[0] not in known)
+            read = set()
+            for playlist_id in playlists:
+                entries = self.read_playlist(playlist_id)
+                if entries is not None:
+                    fresh.update(entries)
+                    read.add(playlist_id)
+            # not listed in a playlist that was read: private or removed, no need to ask again
+            fresh.update({video_id: None for video_id, playlist_id, *_ in candidates
+                          if playlist_id in read and video_id not in fresh})
+        for video_id, *_ in candidates:
+            if video_id not in fresh:
+                fresh[video_id] = self.read_video(video_id)
+
+        rows = []
+        counts = {"changed": 0, "unchanged": 0, "unavailable": 0}
+        for video_id, _, views, likes in candidates:
+            stats = fresh.get(video_id)
+            row = {"V_ID": video_id}
+            if stats is None:
+                result = "unavailable"  # private or removed: only V_StatsUpdated moves, so it is not retried at once
+            else:
+                if stats.get("V_Views") is not None and stats["V_Views"] != views:
+                    row["V_Views"] = stats["V_Views"]
+                if stats.get("V_Likes") is not None and stats["V_Likes"] != likes:
+                    row["V_Likes"] = stats["V_Likes"]
+                result = "changed" if len(row) > 1 else "unchanged"
+            counts[result] += 1
+            rows.append(row)
+        if rows:
+            sink.update_stats(rows)
+        for result, count in counts.items():
+            STATS_REFRESHED.labels(result=result).inc(count)
+        return counts
+
+    def run(self, stop: threading.Event | None = None):
+        stop = stop or threading.Event()
+        sink = self.sink_factory()
+        if not isinstance(sink, StatsSink):
+            print(f"[REFRESH] {type(sink).__name__} cannot refresh counters, refresher not started")
+            sink.close()
+            return
+        try:
+            while not stop.is_set():
+                start = time.monotonic()
+                try:
+                    counts = self.refresh_once(sink)
+                except sink.errors as e:
+                    print(f"[REFRESH] round failed: {e}")
+                    stop.wait(60)
+                    continue
+                total = sum(counts.values())
+                print(f"[REFRESH] {total} videos in {time.monotonic() - start:.0f}s: {counts['changed']} changed, "
+                      f"{counts['unchanged']} unchanged, {counts['unavailable']} unavailable")
+                if total < self.batch_size:
+                    stop.wait(self.idle_sleep)  # caught up, wait for more videos to go stale
+        finally:
+            sink.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh view and like counts of stored videos.")
+    parser.add_argument("--requests-per-hour", type=float, default=600)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--min-age-hours", type=float, default=24)
+    args = parser.parse_args()
+    StatsRefresher(requests_per_hour=args.requests_per_hour, batch_size=args.batch_size,
+                   min_age_hours=args.min_age_hours).run()
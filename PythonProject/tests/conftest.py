@@ -0,0 +1,14 @@
+"""The tests run offline, on SQLite files and temp directories; stubs.py has the stand-ins."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tests.stubs import FakeClock
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
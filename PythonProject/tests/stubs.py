@@ -0,0 +1,92 @@
+"""
+Stand-ins for the parts that need a network or wall-clock time: a simulated clock for RequestBudget,
+a yt_dlp stand-in served from a dict (as in benchmarks/bench_refresh.py), a YTSearch stand-in,
+a VideoRecord factory and the database/*.sql metric queries in SQLite's dialect.
+"""
+import re
+from contextlib import contextmanager
+
+from video_record import VideoRecord
+
+
+class FakeClock:
+    """Time only moves when someone sleeps; every sleep is recorded."""
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeYoutubeDL:
+    """Answers playlist (flat) and video extractions from `catalog` (V_ID -> (views, likes)) and counts the requests."""
+    def __init__(self, catalog: dict, playlists: dict | None = None, on_request=None):
+        self.catalog = catalog
+        self.playlists = playlists or {}
+        self.on_request = on_request
+        self.requests = []
+
+    def extract_info(self, url: str, download: bool = False):
+        self.requests.append(url)
+        if self.on_request is not None:
+            self.on_request(url)
+        if "list=" in url:
+            playlist_id = url.split("list=")[1]
+            return {"id": playlist_id, "entries": [{"id": v, "view_count": self.catalog[v][0]}
+                                                   for v in self.playlists.get(playlist_id, []) if v in self.catalog]}
+        video_id = url.split("v=")[1]
+        if video_id not in self.catalog:
+            return None
+        views, likes = self.catalog[video_id]
+        return {"id": video_id, "view_count": views, "like_count": likes}
+
+
+class FakePool:
+    def __init__(self, ydl: FakeYoutubeDL):
+        self.ydl = ydl
+
+    @contextmanager
+    def checkout(self, flavor: str):
+        yield self.ydl
+
+
+class StubSearch:
+    """
+    Stands in for YTSearch: iter_video_metadata() yields `records`, then raises `fail` if given. With a
+    `gate` (threading.Event) the stream stalls before record `pause_at` until the gate is set.
+    """
+    def __init__(self, records: list, fail: BaseException | None = None, pause_at: int | None = None, gate=None):
+        self.records = records
+        self.fail = fail
+        self.pause_at = pause_at
+        self.gate = gate
+
+    def iter_video_metadata(self):
+        for n, record in enumerate(self.records):
+            if n == self.pause_at:
+                self.gate.wait(10)
+            yield record
+        if self.fail is not None:
+            raise self.fail
+
+
+def make_record(n: int, **fields) -> VideoRecord:
+    values = {"video_id": f"v{n:05d}", "title": f"video {n}", "video_url": f"https://www.youtube.com/watch?v=v{n:05d}",
+              "channel": f"channel {n % 3}", "channel_id": f"UC{n % 3:05d}", "duration": 60 + n,
+              "view_count": 100 * n, "like_count": n, "tags": [f"tag{n % 4}"], "categories": ["Music"],
+              "playlist_id": f"PL{n % 2:05d}", "playlist_title": f"playlist {n % 2}"}
+    values.update(fields)
+    return VideoRecord(**values)
+
+
+def sqlite_dialect(sql: str) -> str:
+    """The T-SQL of database/*.sql for SQLite: TOP 1 as LIMIT 1, ISNULL as IFNULL, AVG over integers truncated like SQL Server's."""
+    sql = re.sub(r"AVG\((V_\w+)\)", r"SUM(\1) / COUNT(\1)", sql.replace("ISNULL(", "IFNULL("))
+    if "TOP 1 " in sql:
+        sql = sql.replace("TOP 1 ", "") + "\nLIMIT 1"
+    return sql
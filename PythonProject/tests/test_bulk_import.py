@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from bulk_import import iter_raw_records, run_import
+from etl_worker import ETLWorker
+from sinks import SQLiteSink
+
+
+def document(n: int) -> dict:
+    video_id = f"v{n:05d}"
+    # brackets, braces and escaped quotes inside strings must not confuse the record scanner
+    return {"VideoId": video_id, "VideoUrl": f"https://www.youtube.com/watch?v={video_id}", "PlaylistId": "PL1",
+            "YtMetadata": {"id": video_id, "title": f'video {n} [live] {{"q"}} \\ "end"', "duration": n,
+                           "channel_id": "UC1", "channel": "channel", "tags": ["a", "b"], "categories": ["Music"]}}
+
+
+@pytest.fixture
+def dump(tmp_path):
+    path = tmp_path / "dump.json"
+    path.write_text(json.dumps([document(n) for n in range(20)], indent=1), encoding="utf-8")
+    return path
+
+
+@pytest.fixture(autouse=True)
+def metrics_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(ETLWorker, "METRICS_PATH", str(tmp_path / "metrics_log.json"))
+
+
+def stored(db: str) -> list[str]:
+    sink = SQLiteSink(db)
+    try:
+        return [row[0] for row in sink.cursor.execute("SELECT V_ID FROM Video ORDER BY V_ID")]
+    finally:
+        sink.close()
+
+
+def test_records_and_offsets(dump, tmp_path):
+    records = list(iter_raw_records(str(dump), chunk_size=64))
+    assert [json.loads(raw)["VideoId"] for raw, _ in records] == [f"v{n:05d}" for n in range(20)]
+    # every end offset is a record boundary to resume from
+    resumed = list(iter_raw_records(str(dump), records[6][1]))
+    assert resumed == [(raw, end) for raw, end in records[7:]]
+
+    lines = tmp_path / "dump.jsonl"
+    lines.write_text("".join(json.dumps(document(n)) + "\n" for n in range(5)), encoding="utf-8")
+    offsets = [end for _, end in iter_raw_records(str(lines))]
+    assert [json.loads(raw)["VideoId"] for raw, _ in iter_raw_records(str(lines), offsets[1])] == ["v00002", "v00003", "v00004"]
+
+
+def test_interrupted_import_resumes_at_the_checkpoint(dump, tmp_path):
+    db = str(tmp_path / "youtube.db")
+    checkpoint_path = tmp_path / "dump.json.checkpoint.json"
+    written = []
+
+    def failing_sink():
+        sink = SQLiteSink(db)
+        write_batch = sink.write_batch
+
+        def write(rows):
+            if len(written) == 2:
+                raise KeyboardInterrupt  # stopped while the third batch is being written
+            written.append(rows)
+            return write_batch(rows)
+        sink.write_batch = write
+        return sink
+
+    with pytest.raises(KeyboardInterrupt):
+        run_import(str(dump), batch_size=6, workers=1, sink_factory=failing_sink)
+    checkpoint = json.loads(checkpoint_path.read_text(encoding="utf-8"))
+    assert checkpoint["records"] == 12
+    assert stored(db) == [f"v{n:05d}" for n in range(12)]
+
+    run_import(str(dump), batch_size=6, workers=1, sink_factory=lambda: SQLiteSink(db))
+    assert json.loads(checkpoint_path.read_text(encoding="utf-8"))["records"] == 20
+    assert stored(db) == [f"v{n:05d}" for n in range(20)]
+
+
+def test_restart_ignores_the_checkpoint(dump, tmp_path):
+    db = str(tmp_path / "youtube.db")
+    run_import(str(dump), batch_size=8, workers=1, sink_factory=lambda: SQLiteSink(db))
+    run_import(str(dump), batch_size=8, workers=1, restart=True, sink_factory=lambda: SQLiteSink(db))
+    assert json.loads((tmp_path / "dump.json.checkpoint.json").read_text(encoding="utf-8"))["records"] == 20
+    assert stored(db) == [f"v{n:05d}" for n in range(20)]  # known rows are skipped, not duplicated
@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+from etl_worker import ETLWorker
+from sinks import SQLiteSink
+from spool import Spool
+from tests.stubs import StubSearch, make_record
+
+
+class Events:
+    def __init__(self):
+        self.logged = []
+
+    def log(self, message: str, values: list | None = None, kind: str | None = None):
+        self.logged.append(message)
+
+
+@pytest.fixture(autouse=True)
+def metrics_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(ETLWorker, "METRICS_PATH", str(tmp_path / "metrics_log.json"))
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "youtube.db")
+
+
+class RecordingSink(SQLiteSink):
+    """Remembers the V_IDs of every batch handed to write_batch."""
+    def __init__(self, path: str, batches: list):
+        super().__init__(path)
+        self.batches = batches
+
+    def write_batch(self, rows: dict[str, list[dict]]) -> set[str]:
+        self.batches.append([row["V_ID"] for row in rows["Video"]])
+        return super().write_batch(rows)
+
+
+def worker_for(db: str, searches, batches: list | None = None, **options) -> ETLWorker:
+    batches = [] if batches is None else batches
+    worker = ETLWorker(sink_factory=lambda: RecordingSink(db, batches), event_log=Events(), **options)
+    searches = iter(searches)
+    worker.make_search = lambda: next(searches)
+    return worker
+
+
+def stored(db: str) -> list[str]:
+    sink = SQLiteSink(db)
+    try:
+        return [row[0] for row in sink.cursor.execute("SELECT V_ID FROM Video ORDER BY V_ID")]
+    finally:
+        sink.close()
+
+
+def join_fetchers():
+    # a dying fetcher raises after it set stop; let it finish inside the test that expects it
+    for thread in threading.enumerate():
+        if thread.name.startswith("fetch-"):
+            thread.join(10)
+
+
+def finishes(target, timeout: float = 20.0) -> bool:
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def ids(numbers) -> list[str]:
+    return [f"v{n:05d}" for n in numbers]
+
+
+# ______ROWS______
+def test_clean_names():
+    names = ["  Rock ", "rock", "ROCK", "", None, 7, "x" * 60 + " ", "Live"]
+    assert ETLWorker.clean_names(names, 50) == ["Rock", "x" * 50, "Live"]
+    assert ETLWorker.clean_names(["abc   def"], 4) == ["abc"]  # cut to the column width, then trimmed
+
+
+def test_batch_rows_dedupe_across_records():
+    worker = ETLWorker(sink_factory=lambda: None)
+    records = [make_record(1, tags=["Rock", "rock"]), make_record(1, tags=["ROCK"]), make_record(4),
+               make_record(7, channel_id=None)]
+    rows = worker.batch_rows(records)
+    assert [row["V_ID"] for row in rows["Video"]] == ["v00001", "v00004", "v00007"]
+    assert [row["C_ID"] for row in rows["Channel"]] == ["UC00001"]  # v00004 shares it, v00007 has none
+    assert [row["P_ID"] for row in rows["Playlist"]] == ["PL00001", "PL00000"]
+    assert [(row["VT_V"], row["Tag"]) for row in rows["Tags"]] == [("v00001", "Rock"), ("v00004", "tag0"), ("v00007", "tag3")]
+
+
+# ______RUN______
+def test_run_flushes_full_batches_and_the_rest(db):
+    batches = []
+    worker = worker_for(db, [StubSearch([make_record(n) for n in range(7)])], batches,
+                        batch_size=3, batch_timeout_ms=60000)
+    assert finishes(worker.run)
+    assert batches == [ids(range(3)), ids(range(3, 6)), ids([6])]
+    assert stored(db) == ids(range(7))
+
+
+def test_run_flushes_a_partial_batch_while_the_search_stalls(db):
+    batches = []
+    gate = threading.Event()
+    worker = worker_for(db, [StubSearch([make_record(n) for n in range(3)], pause_at=2, gate=gate)], batches,
+                        batch_size=10, batch_timeout_ms=200)
+    run = threading.Thread(target=worker.run, daemon=True)
+    run.start()
+    deadline = time.monotonic() + 10
+    while not batches and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert batches == [ids(range(2))]  # written on the timeout, no third record has arrived
+    gate.set()
+    run.join(10)
+    assert not run.is_alive()
+    assert batches == [ids(range(2)), ids([2])]
+
+
+def test_run_writes_the_batch_in_flight_on_stop(db):
+    batches = []
+    gate, stop = threading.Event(), threading.Event()
+    worker = worker_for(db, [StubSearch([make_record(n) for n in range(3)], pause_at=2, gate=gate)], batches,
+                        batch_size=10, batch_timeout_ms=60000)
+    run = threading.Thread(target=worker.run, args=(stop,), daemon=True)
+    run.start()
+    time.sleep(0.2)
+    stop.set()
+    run.join(10)
+    assert not run.is_alive()
+    assert batches == [ids(range(2))]
+    gate.set()
+
+
+# ______PIPELINED RUN______
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_pipeline_stops_when_a_fetcher_dies(db):
+    searches = [StubSearch([make_record(n) for n in range(5)], fail=RuntimeError("parser broke")),
+                StubSearch([make_record(n) for n in range(5, 8)], pause_at=1, gate=threading.Event())]
+    worker = worker_for(db, searches, batch_size=2, batch_timeout_ms=200, fetch_workers=2)
+    assert finishes(worker.run_pipelined)
+    # what was fetched before the failure is loaded, the stalled fetcher is not waited for
+    assert set(stored(db)) >= {f"v{n:05d}" for n in range(5)}
+    assert "fetcher died: RuntimeError('parser broke')" in worker.event_log.logged
+    searches[1].gate.set()
+    join_fetchers()
+
+
+def test_pipeline_ends_when_the_fetchers_run_out(db):
+    searches = [StubSearch([make_record(n) for n in range(0, 7)]), StubSearch([make_record(n) for n in range(7, 10)])]
+    worker = worker_for(db, searches, batch_size=4, batch_timeout_ms=200, fetch_workers=2)
+    assert finishes(worker.run_pipelined)
+    assert stored(db) == [f"v{n:05d}" for n in range(10)]
+    assert worker.event_log.logged == []
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_spooled_pipeline_stops_when_a_fetcher_dies(db, tmp_path):
+    spool = Spool(str(tmp_path / "spool"))
+    worker = worker_for(db, [StubSearch([make_record(n) for n in range(3)], fail=ValueError("bad page"))],
+                        batch_size=10, batch_timeout_ms=200, fetch_workers=1, spool=spool)
+    assert finishes(worker.run_pipelined)
+    assert len(list(spool.replay())) == 3  # spooled records are kept for the next start
+    assert "fetcher died: ValueError('bad page')" in worker.event_log.logged
+    join_fetchers()
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from event_log import EventLog
+from instrumentation import EVENTS_DROPPED
+
+SQL_SERVER = ("[23000] [Microsoft][ODBC Driver 17 for SQL Server][SQL Server]Violation of PRIMARY KEY constraint "
+              "'PK_Video'. Cannot insert duplicate key in object 'dbo.Video'. The duplicate key value is ({}). (2627)")
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = EventLog(str(tmp_path / "events.jsonl"), flush_interval=3600)
+    yield log
+    log.close()
+
+
+def lines(path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_duplicates_are_summarized_per_table(log, tmp_path):
+    for n in range(8):
+        log.log(SQL_SERVER.format(f"v{n}"), [f"v{n}"])
+    log.log("UNIQUE constraint failed: Tags.Tag, Tags.VT_V", ["t1"])
+    log.log("UNIQUE constraint failed: Tags.Tag, Tags.VT_V", ["t2"])
+    log.log("E11000 duplicate key error collection: YouTubeDB.Videos index: _id_ dup key: { _id: \"v1\" }", ["v1"])
+    log.log("batch of 3 failed, retrying per record: timeout", [])
+    log.close()
+
+    events = lines(tmp_path / "events.jsonl")
+    errors = [event for event in events if event["kind"] == "error"]
+    summaries = {event["table"]: event for event in events if event["kind"] == "duplicate_key"}
+    assert [event["message"] for event in errors] == ["batch of 3 failed, retrying per record: timeout"]
+    assert {table: event["count"] for table, event in summaries.items()} == {"dbo.Video": 8, "Tags.Tag": 2, "YouTubeDB.Videos": 1}
+    assert summaries["dbo.Video"]["sample"] == ["v0", "v1", "v2", "v3", "v4"]  # SAMPLE_SIZE values per table
+    assert summaries["Tags.Tag"]["sample"] == ["t1", "t2"]
+
+
+def test_summaries_reset_after_writing(log):
+    log.log(SQL_SERVER.format("v1"), ["v1"])
+    assert len(log.summaries()) == 1
+    assert log.summaries() == []
+
+
+def test_full_buffer_drops_events(tmp_path):
+    log = EventLog(str(tmp_path / "events.jsonl"), capacity=2, flush_interval=3600)
+    dropped = EVENTS_DROPPED.labels().value
+    for n in range(5):
+        log.log(f"error {n}", kind="error")
+    log.log(SQL_SERVER.format("v1"), ["v1"])  # duplicates are only counted, they never fill the buffer
+    log.close()
+    assert EVENTS_DROPPED.labels().value - dropped == 3
+    events = lines(tmp_path / "events.jsonl")
+    assert [event.get("message") for event in events if event["kind"] == "error"] == ["error 0", "error 1"]
+    assert [event["count"] for event in events if event["kind"] == "duplicate_key"] == [1]
+
+
+def test_rotation(tmp_path):
+    path = tmp_path / "events.jsonl"
+    log = EventLog(str(path), max_bytes=200, backups=2, flush_interval=3600)
+    for n in range(3):
+        log.write([json.dumps({"n": n, "padding": "x" * 200})])
+    log.close()
+    assert not path.exists()  # the last write went over max_bytes and was rotated too
+    assert json.loads((tmp_path / "events.jsonl.1").read_text(encoding="utf-8"))["n"] == 2
+    assert json.loads((tmp_path / "events.jsonl.2").read_text(encoding="utf-8"))["n"] == 1
+    assert not (tmp_path / "events.jsonl.3").exists()
@@ -0,0 +1,96 @@
+import pytest
+
+from etl_worker import ETLWorker
+from metrics import CollectMetrics, MetricsAggregator
+from query_registry import QueryRegistry
+from sinks import SQLiteSink
+from tests.stubs import make_record, sqlite_dialect
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "youtube.db")
+
+
+def sql_metrics(db: str) -> dict:
+    """What database/*.sql report over the same data, through CollectMetrics."""
+    registry = QueryRegistry(lambda: SQLiteSink(db), pool_size=2, ttl=0)
+    registry.queries = {name: sqlite_dialect(sql) for name, sql in registry.queries.items()}
+    try:
+        return CollectMetrics(registry).collect()
+    finally:
+        registry.close()
+
+
+def video(n: int, channel: tuple | None, playlist: tuple | None, duration: int, views: int, likes: int):
+    return make_record(n, channel_id=channel and channel[0], channel=channel and channel[1],
+                       playlist_id=playlist and playlist[0], playlist_title=playlist and playlist[1],
+                       duration=duration, view_count=views, like_count=likes)
+
+
+# two channels named "Music" with 2 videos each, "Solo" with 3; by name "Music" would lead with 4
+MUSIC_1, MUSIC_2, SOLO = ("UC1", "Music"), ("UC2", "Music"), ("UC3", "Solo")
+# two playlists titled "Favorites" (200 and 250 s), "Long" with 300 s; by title "Favorites" would lead with 450
+FAVORITES_1, FAVORITES_2, LONG = ("PLa", "Favorites"), ("PLb", "Favorites"), ("PLc", "Long")
+RECORDS = [
+    video(1, MUSIC_1, FAVORITES_1, 100, 10, 1),
+    video(2, MUSIC_1, FAVORITES_1, 100, 20, 2),
+    video(3, MUSIC_2, FAVORITES_2, 150, 30, 3),
+    video(4, MUSIC_2, FAVORITES_2, 100, 40, 4),
+    video(5, SOLO, LONG, 300, 50, 5),
+    video(6, SOLO, None, 61, 7, 9),
+    video(7, SOLO, None, None, None, None),
+    video(8, None, None, 5, 3, 0),
+]
+
+
+def load(db: str, records, batch_size: int = 3) -> ETLWorker:
+    sink = SQLiteSink(db)
+    worker = ETLWorker(batch_size=batch_size, sink_factory=lambda: sink)
+    worker.metrics.seed(sink.cursor)
+    for start in range(0, len(records), batch_size):
+        worker.process_batch(records[start:start + batch_size], sink)
+    sink.close()
+    return worker
+
+
+def test_observed_metrics_match_the_sql_queries(db):
+    worker = load(db, RECORDS)
+    observed = worker.metrics.snapshot()
+    assert observed == sql_metrics(db)
+    assert observed["top_channel_by_videos"] == {"C_Name": "Solo", "video_count": 3}
+    assert observed["longest_playlist"] == {"P_Title": "Long", "total_duration": 300}
+    assert observed["avg_playlist_duration"] == pytest.approx(250.0)
+    assert (observed["video_count"], observed["channel_count"], observed["playlist_count"]) == (8, 3, 3)
+    assert observed["avg_video_duration"] == (100 + 100 + 150 + 100 + 300 + 61 + 5) // 7  # NULLs left out
+
+
+def test_seeding_matches_observing(db):
+    observed = load(db, RECORDS).metrics.snapshot()
+    seeded = MetricsAggregator()
+    sink = SQLiteSink(db)
+    seeded.seed(sink.cursor)
+    sink.close()
+    assert seeded.snapshot() == observed
+
+
+def test_ties_report_one_of_the_leaders(db):
+    records = [video(1, MUSIC_1, FAVORITES_1, 100, 90, 1), video(2, MUSIC_2, FAVORITES_2, 100, 90, 1),
+               video(3, SOLO, LONG, 50, 5, 1), video(4, SOLO, LONG, 50, 5, 1), video(5, MUSIC_1, FAVORITES_1, 0, 1, 1)]
+    observed = load(db, records, batch_size=1).metrics.snapshot()
+    expected = sql_metrics(db)
+    for key, column in (("top_video_by_views", "V_Views"), ("top_video_by_likes", "V_Likes")):
+        assert observed[key][column] == expected[key][column]
+        assert observed[key]["V_Title"] in {"video 1", "video 2", "video 3", "video 4", "video 5"}
+    assert observed["top_video_by_views"]["V_Title"] in {"video 1", "video 2"}
+    # UC1 and UC3 both have 2 videos, all three playlists 100 s
+    assert observed["top_channel_by_videos"]["video_count"] == expected["top_channel_by_videos"]["video_count"] == 2
+    assert observed["top_channel_by_videos"]["C_Name"] in {"Music", "Solo"}
+    assert observed["longest_playlist"]["total_duration"] == expected["longest_playlist"]["total_duration"] == 100
+
+
+def test_empty_database(db):
+    SQLiteSink(db).close()
+    observed = load(db, []).metrics.snapshot()
+    assert observed == sql_metrics(db)
+    assert observed["top_channel_by_videos"] is None and observed["longest_playlist"] == {"P_Title": None, "total_duration": 0}
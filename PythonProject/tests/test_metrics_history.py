@@ -0,0 +1,92 @@
+import math
+import os
+
+import pytest
+
+from metrics_history import MetricsHistory
+
+FIELDS = ("video_count", "top_video_by_views.V_Views")
+
+
+def sample(n: int) -> dict:
+    return {"video_count": n, "top_video_by_views": {"V_Views": 10 * n}}
+
+
+@pytest.fixture
+def history(tmp_path):
+    # 50s at one sample per 10s: a ring of 5 slots
+    history = MetricsHistory(str(tmp_path / "history.bin"), retention_s=50, min_interval=10, fields=FIELDS)
+    yield history
+    history.close()
+
+
+def test_min_interval(history):
+    assert history.append(sample(1), timestamp=100)
+    assert not history.append(sample(2), timestamp=105)
+    assert not history.append(sample(2), timestamp=90)  # clock went back
+    assert history.append(sample(2), timestamp=110)
+
+
+def test_wraparound_keeps_the_newest_samples(history):
+    for n in range(12):
+        history.append(sample(n), timestamp=n * 10)
+    result = history.query(step=10)
+    # the oldest slot of a full ring is the next to be overwritten, so capacity - 1 samples are served
+    assert result["t"] == [80.0, 90.0, 100.0, 110.0]
+    assert result["count"] == [1, 1, 1, 1]
+    assert result["series"]["video_count"]["avg"] == [8.0, 9.0, 10.0, 11.0]
+    assert result["series"]["top_video_by_views.V_Views"]["max"] == [80.0, 90.0, 100.0, 110.0]
+
+
+def test_buckets_across_the_wrap(history):
+    for n in range(7):
+        history.append(sample(n), timestamp=n * 10)
+    result = history.query(start=25, end=60, step=20, fields=["video_count"])
+    assert result["t"] == [25.0, 45.0]
+    assert result["count"] == [2, 2]
+    series = result["series"]["video_count"]
+    assert (series["min"], series["max"], series["avg"]) == ([3.0, 5.0], [4.0, 6.0], [3.5, 5.5])
+    assert list(result["series"]) == ["video_count"]
+
+
+def test_missing_values_are_none(history):
+    history.append({"video_count": 1}, timestamp=0)
+    assert history.query(step=10)["series"]["top_video_by_views.V_Views"]["avg"] == [None]
+
+
+def test_reopen_and_readonly(tmp_path, history):
+    for n in range(3):
+        history.append(sample(n), timestamp=n * 10)
+    reader = MetricsHistory(str(tmp_path / "history.bin"), readonly=True)
+    assert reader.fields == FIELDS and reader.capacity == 5
+    assert reader.query(step=10)["count"] == [1, 1, 1]
+    history.close()
+    reopened = MetricsHistory(str(tmp_path / "history.bin"), retention_s=50, min_interval=10, fields=FIELDS)
+    assert not reopened.append(sample(3), timestamp=25)  # the newest timestamp survives the restart
+    assert reopened.append(sample(3), timestamp=30)
+    assert reader.query(step=10)["count"] == [1, 1, 1, 1]
+    reopened.close()
+    reader.close()
+
+
+def test_layout_change_is_followed_by_readers(tmp_path, history):
+    path = str(tmp_path / "history.bin")
+    history.append(sample(1), timestamp=0)
+    reader = MetricsHistory(path, readonly=True)
+    assert reader.query()["count"] == [1]
+    history.close()
+    writer = MetricsHistory(path, retention_s=100, min_interval=10, fields=("video_count",))
+    assert os.path.exists(path + ".old")
+    writer.append(sample(5), timestamp=50)
+    writer.append(sample(6), timestamp=60)
+    result = reader.query(step=10)
+    assert reader.fields == ("video_count",)
+    assert result["series"]["video_count"]["avg"] == [5.0, 6.0]
+    writer.close()
+    reader.close()
+
+
+@pytest.mark.parametrize("step", [0, -1, math.nan, math.inf])
+def test_rejects_bad_steps(history, step):
+    with pytest.raises(ValueError):
+        history.query(step=step)
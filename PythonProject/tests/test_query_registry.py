@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import types
+from contextlib import ExitStack
+
+import pytest
+
+import query_registry
+from metrics import CollectMetrics
+from query_registry import QueryRegistry, SinkPool
+from sinks import SQLiteSink
+from tests.stubs import sqlite_dialect
+
+
+class TrackedSink(SQLiteSink):
+    def __init__(self, path: str, opened: list):
+        super().__init__(path)
+        self.closed = False
+        opened.append(self)
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "youtube.db")
+    sink = SQLiteSink(path)
+    sink.cursor.executemany("INSERT INTO Video (V_ID, V_Title, V_URL, V_Duration, V_Views, V_Likes) VALUES (?, ?, '', ?, ?, ?)",
+                            [("a", "first", 60, 100, 7), ("b", "second", 240, 50, 9)])
+    sink.close()
+    return path
+
+
+@pytest.fixture
+def registry(db, clock, monkeypatch):
+    monkeypatch.setattr(query_registry, "time", types.SimpleNamespace(monotonic=clock))
+    opened = []
+    registry = QueryRegistry(lambda: TrackedSink(db, opened), pool_size=2, ttl=30, ttls={"channel_count": 5})
+    registry.queries = {name: sqlite_dialect(sql) for name, sql in registry.queries.items()}
+    registry.opened = opened
+    yield registry
+    registry.close()
+
+
+def add_video(db: str, video_id: str):
+    sink = SQLiteSink(db)
+    sink.cursor.execute("INSERT INTO Video (V_ID, V_Title, V_URL) VALUES (?, ?, '')", [video_id, video_id])
+    sink.close()
+
+
+def test_results_are_cached_for_the_ttl(registry, db, clock):
+    assert registry.run("video_count") == (2,)
+    add_video(db, "c")
+    assert registry.run("video_count") == (2,)  # served from the cache
+    clock.sleep(29.9)
+    assert registry.run("video_count") == (2,)
+    clock.sleep(0.2)
+    assert registry.run("video_count") == (3,)
+    add_video(db, "d")
+    registry.invalidate("video_count")
+    assert registry.run("video_count") == (4,)
+
+
+def test_per_query_ttl(registry, clock):
+    registry.run("channel_count")
+    registry.run("video_count")
+    clock.sleep(6)
+    assert set(registry.cache) == {"channel_count", "video_count"}
+    expiry = dict((name, expires_at) for name, (expires_at, _) in registry.cache.items())
+    assert expiry["channel_count"] < clock() < expiry["video_count"]
+
+
+def test_failed_query_closes_its_sink_and_frees_the_slot(registry):
+    registry.queries["broken"] = "SELECT nope FROM nowhere"
+    for _ in range(3):  # more failures than the pool has slots
+        with pytest.raises(sqlite3.Error):
+            registry.run("broken")
+    assert all(sink.closed for sink in registry.opened)
+    assert registry.run("video_count") == (2,)
+    assert not registry.opened[-1].closed  # the new connection went back to the pool
+    assert registry.pool.idle.qsize() == 1
+
+
+def test_pool_reuses_and_bounds_its_sinks(db):
+    opened = []
+    pool = SinkPool(lambda: TrackedSink(db, opened), size=2)
+    with pool.checkout() as first:
+        pass
+    got = []
+    with ExitStack() as held:
+        assert held.enter_context(pool.checkout()) is first  # an idle sink is reused
+        held.enter_context(pool.checkout())
+        waiter = threading.Thread(target=lambda: got.append(pool.checkout().__enter__()))
+        waiter.start()
+        waiter.join(0.2)
+        assert waiter.is_alive() and len(opened) == 2  # a third checkout waits for a free slot
+    waiter.join(10)
+    assert got and got[0] in opened and len(opened) == 2
+    pool.close()
+    assert sum(sink.closed for sink in opened) == 1  # the one still checked out is left alone
+    got[0].close()
+
+
+def test_collect_metrics(registry):
+    metrics = CollectMetrics(registry).collect()
+    assert metrics == {
+        "video_count": 2, "channel_count": 0, "playlist_count": 0,
+        "avg_video_duration": 150, "avg_video_views": 75, "avg_video_likes": 8,
+        "longest_playlist": {"P_Title": None, "total_duration": 0}, "avg_playlist_duration": 0,
+        "top_video_by_views": {"V_Title": "first", "V_Views": 100},
+        "top_video_by_likes": {"V_Title": "second", "V_Likes": 9},
+        "top_video_by_duration": {"V_Title": "second", "V_Duration": 240},
+        "top_channel_by_videos": None,
+    }
+    assert len(registry.opened) <= 2
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from query_scheduler import QueryScheduler, RequestBudget
+
+
+@pytest.fixture(autouse=True)
+def full_backoff(monkeypatch):
+    # the jitter factor is drawn from [0.5, 1.0]; pin it so the pauses are exact
+    monkeypatch.setattr(random, "uniform", lambda low, high: high)
+
+
+def budget(clock, **kwargs) -> RequestBudget:
+    return RequestBudget(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+# ______REQUEST BUDGET______
+def test_burst_then_rate(clock):
+    b = budget(clock, rate=2.0, burst=2.0)
+    for _ in range(4):
+        b.acquire()
+    assert sum(clock.sleeps) == pytest.approx(1.0)  # the burst is free, two more tokens take 0.5s each
+
+
+def test_failures_below_threshold_do_not_pause(clock):
+    b = budget(clock, error_threshold=3)
+    b.failure()
+    b.failure()
+    assert b.paused_until is None and b.backoffs == 0 and b.rate == 5.0
+
+
+def test_backoff_grows_and_halves_rate(clock):
+    b = budget(clock, rate=4.0, error_threshold=3, backoff_base=2.0, backoff_max=300.0, min_rate=0.5)
+    pauses = []
+    for _ in range(6):
+        b.failure()
+        if b.paused_until is not None:
+            pauses.append(b.paused_until - clock.now)
+    assert pauses == [2.0, 4.0, 8.0, 16.0]
+    assert b.backoffs == 4
+    assert b.rate == 0.5  # 4 -> 2 -> 1 -> 0.5, then held at min_rate
+
+
+def test_backoff_is_capped(clock):
+    b = budget(clock, error_threshold=1, backoff_base=2.0, backoff_max=10.0)
+    for _ in range(10):
+        b.failure()
+    assert b.paused_until - clock.now == 10.0
+
+
+def test_acquire_waits_out_the_pause(clock):
+    b = budget(clock, rate=None, error_threshold=1, backoff_base=2.0)
+    b.failure()
+    paused_until = b.paused_until
+    b.acquire()
+    assert clock.now == paused_until
+    assert clock.sleeps == [2.0]
+
+
+def test_success_resets_errors_and_wins_rate_back(clock):
+    b = budget(clock, rate=4.0, error_threshold=1)
+    b.failure()
+    assert b.rate == 2.0
+    b.success()
+    assert b.consecutive_errors == 0
+    assert b.rate == pytest.approx(2.2)  # one twentieth of the full rate per success
+    for _ in range(100):
+        b.success()
+    assert b.rate == 4.0
+
+
+# ______QUERY SCHEDULER______
+def test_queries_follow_scores(clock):
+    random.seed(1)
+    scheduler = QueryScheduler(["filler"], budget(clock), explore=0.0)
+    scheduler.credit("good", requests=2, new_videos=10, new_playlists=0)
+    scheduler.credit("bad", requests=5, new_videos=0, new_playlists=0)
+    words = [word for _ in range(50) for word in scheduler.next_query().split()]
+    assert set(words) == {"good"}  # terms without new content are not drawn, the word list only by exploring
+
+
+def test_scores_fade_and_rank(clock):
+    scheduler = QueryScheduler(["filler"], budget(clock), alpha=0.5, playlist_weight=0.5)
+    scheduler.credit("alpha beta", requests=1, new_videos=4, new_playlists=2)
+    scheduler.credit("beta", requests=1, new_videos=0, new_playlists=0)
+    stats = scheduler.stats()
+    assert stats["top_terms"] == {"alpha": 5.0, "beta": 2.5}
+    assert list(stats["top_terms"]) == ["alpha", "beta"]
+    assert (stats["queries"], stats["requests"], stats["new_videos"], stats["new_playlists"]) == (2, 2, 4, 2)
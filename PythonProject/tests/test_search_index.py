@@ -0,0 +1,89 @@
+import json
+import threading
+
+import pytest
+
+from search_index import SearchIndex
+from tests.stubs import make_record
+
+
+def wait_for_merges():
+    for thread in threading.enumerate():
+        if thread.name == "search-merge":
+            thread.join()
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path), flush_docs=5, flush_interval=3600, merge_factor=3)
+    yield index
+    index.close()
+
+
+def fill(index: SearchIndex, count: int):
+    for n in range(count):
+        title = f"guitar lesson {n}" if n % 2 else f"piano lesson {n}"
+        index.add(make_record(n, title=title, description="music", tags=["guitar"] if n % 3 == 0 else []))
+
+
+def hit_ids(result: dict) -> list[str]:
+    return [hit["video_id"] for hit in result["hits"]]
+
+
+def test_buffered_documents_are_searchable(index):
+    fill(index, 4)
+    assert index.stats() == {"segments": 0, "buffered": 4, "documents": 4}
+    result = index.search("guitar", page_size=10)
+    assert set(hit_ids(result)) == {"v00000", "v00001", "v00003"}
+    assert hit_ids(result)[0] in ("v00001", "v00003")  # a title match outweighs a tag match
+
+
+def test_merge_keeps_results(tmp_path):
+    index = SearchIndex(str(tmp_path), flush_docs=5, flush_interval=3600, merge_factor=100)
+    fill(index, 24)
+    before = index.search("guitar lesson", page_size=100)
+    assert index.stats()["segments"] == 4
+
+    index.merge_factor = 3
+    index.merge()
+    stats = index.stats()
+    assert stats == {"segments": 2, "buffered": 4, "documents": 24}
+    segments = json.loads((tmp_path / SearchIndex.MANIFEST).read_text(encoding="utf-8"))["segments"]
+    assert sorted(path.name for path in tmp_path.glob("seg-*")) == sorted(segments)  # merged inputs are removed
+    after = index.search("guitar lesson", page_size=100)
+    assert after["total"] == before["total"] == 24
+    # the merged segment moves to the end, so only ties can change places
+    assert {hit["video_id"]: hit["score"] for hit in after["hits"]} == {hit["video_id"]: hit["score"] for hit in before["hits"]}
+    index.close()
+
+
+def test_flushes_trigger_a_merge(index):
+    fill(index, 14)
+    wait_for_merges()
+    assert index.stats()["segments"] < index.merge_factor
+    assert index.stats()["documents"] == 14
+
+
+def test_reopen_serves_the_flushed_segments(tmp_path):
+    index = SearchIndex(str(tmp_path), flush_docs=5, flush_interval=3600, merge_factor=3)
+    fill(index, 23)
+    wait_for_merges()
+    before = index.search("piano", page=2, page_size=5)
+    index.close()  # flushes the last buffered documents
+
+    reopened = SearchIndex(str(tmp_path), flush_docs=5, flush_interval=3600, merge_factor=3)
+    assert reopened.stats()["documents"] == 23 and reopened.stats()["buffered"] == 0
+    after = reopened.search("piano", page=2, page_size=5)
+    assert (after["total"], after["hits"]) == (before["total"], before["hits"])
+    reopened.close()
+
+
+def test_leftover_segment_files_are_removed_on_load(tmp_path):
+    index = SearchIndex(str(tmp_path), flush_docs=5, flush_interval=3600)
+    fill(index, 5)
+    index.close()
+    (tmp_path / "seg-999999.idx").write_bytes(b"half written")
+    reopened = SearchIndex(str(tmp_path), flush_interval=3600)
+    assert not (tmp_path / "seg-999999.idx").exists()
+    assert reopened.stats()["documents"] == 5
+    reopened.close()
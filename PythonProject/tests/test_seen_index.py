@@ -0,0 +1,104 @@
+import multiprocessing as mp
+
+import pytest
+
+from etl_worker import ETLWorker
+from seen_index import BloomFilter, SeenIndex
+from sharded_crawler import SharedSeenIndex
+from sinks import SQLiteSink
+from tests.stubs import make_record
+
+
+# ______BLOOM FILTER______
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(20000, 0.001)
+    added = [f"v{n:08d}" for n in range(20000)]
+    for video_id in added:
+        bloom.add(video_id)
+    assert all(video_id in bloom for video_id in added)
+    false_positives = sum(f"x{n:08d}" in bloom for n in range(20000))
+    assert false_positives < 20000 * 0.001 * 3
+    assert len(bloom.bits) == BloomFilter.byte_size(20000, 0.001)
+
+
+def fill_in_shard(bits, lock, capacity: int, error_rate: float, found):
+    # runs in a spawned process: attaches to the parent's buffer, reads its IDs and adds its own
+    bloom = BloomFilter(capacity, error_rate, bits=bits, lock=lock)
+    found.value = sum(f"parent{n}" in bloom for n in range(100))
+    for n in range(100):
+        bloom.add(f"shard{n}")
+
+
+def test_shared_filter_round_trip_through_a_spawned_process():
+    ctx = mp.get_context("spawn")
+    bits, lock = ctx.RawArray("B", BloomFilter.byte_size(1000)), ctx.Lock()
+    found = ctx.Value("i", 0)
+    parent = BloomFilter(1000, bits=bits, lock=lock)
+    for n in range(100):
+        parent.add(f"parent{n}")
+    shard = ctx.Process(target=fill_in_shard, args=(bits, lock, 1000, 0.001, found))
+    shard.start()
+    shard.join(60)
+    assert shard.exitcode == 0
+    assert found.value == 100
+    # the shard is gone, what it added stays in the shared buffer
+    assert all(f"shard{n}" in parent for n in range(100))
+    assert all(f"shard{n}" in BloomFilter(1000, bits=bits, lock=lock) for n in range(100))
+
+
+# ______SEEN INDEX______
+class Events:
+    def log(self, message: str, values: list | None = None, kind: str | None = None):
+        pass
+
+
+@pytest.fixture
+def sink(tmp_path):
+    sink = SQLiteSink(str(tmp_path / "youtube.db"))
+    yield sink
+    sink.close()
+
+
+@pytest.mark.parametrize("bloom_videos", [False, True])
+def test_index_follows_committed_batches(sink, bloom_videos):
+    seen = SeenIndex(bloom_videos=bloom_videos, expected_videos=1000)
+    worker = ETLWorker(batch_size=10, sink_factory=lambda: sink, seen=seen)
+    worker.process_batch([make_record(1), make_record(2)], sink)
+    assert seen.has_video("v00001") and seen.has_video("v00002")
+    assert seen.has_playlist("PL00001") and seen.has_playlist("PL00000") and seen.has_channel("UC00002")
+    assert not seen.has_video("v00003") and not seen.has_channel("UC00000")
+
+    # known channels/playlists are left out of later batches, known videos are dropped
+    rows = worker.batch_rows([make_record(3), make_record(4)])
+    assert [row["C_ID"] for row in rows["Channel"]] == ["UC00000"]
+    assert rows["Playlist"] == []
+    assert worker.unseen([make_record(1), make_record(5)]) == [make_record(5)]
+
+
+def test_failed_writes_are_not_marked_seen(sink):
+    seen = SeenIndex()
+    worker = ETLWorker(batch_size=10, sink_factory=lambda: sink, seen=seen, event_log=Events())
+
+    def fail(rows):
+        raise sink.errors[0]("disk full")
+    sink.write_batch = fail
+    assert worker.process_batch([make_record(1), make_record(2)], sink) == 2
+    assert not seen.has_video("v00001") and not seen.has_playlist("PL00001") and not seen.has_channel("UC00001")
+
+
+def test_warm_reads_what_is_stored(sink):
+    ETLWorker(batch_size=10, sink_factory=lambda: sink).process_batch([make_record(n) for n in range(4)], sink)
+    seen = SeenIndex()
+    seen.warm(sink.cursor, fetch_size=3)
+    assert seen.videos == {"v00000", "v00001", "v00002", "v00003"}
+    assert seen.playlists == {"PL00000", "PL00001"}
+    assert seen.channels == {"UC00000", "UC00001", "UC00002"}
+
+
+def test_shared_index_warms_only_the_local_sets(sink):
+    ETLWorker(batch_size=10, sink_factory=lambda: sink).process_batch([make_record(1)], sink)
+    videos = BloomFilter(100)
+    seen = SharedSeenIndex(videos)
+    seen.warm(sink.cursor)
+    assert seen.has_playlist("PL00001") and seen.has_channel("UC00001")
+    assert not seen.has_video("v00001")  # the parent fills the shared filter once for all shards
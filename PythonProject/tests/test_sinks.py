@@ -0,0 +1,106 @@
+import sqlite3
+
+import pytest
+
+from etl_worker import ETLWorker
+from sinks import MongoSink, SQLiteSink
+from tests.stubs import make_record
+
+mongomock = pytest.importorskip("mongomock")
+
+
+class Events:
+    """Collects what ETLWorker.events() would queue for the EventLog."""
+    def __init__(self):
+        self.logged = []
+
+    def log(self, message: str, values: list | None = None, kind: str | None = None):
+        self.logged.append((message, values))
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def sink(request, tmp_path):
+    sink = SQLiteSink(str(tmp_path / "youtube.db")) if request.param == "sqlite" else MongoSink(client=mongomock.MongoClient())
+    yield sink
+    sink.close()
+
+
+@pytest.fixture
+def worker(sink):
+    return ETLWorker(batch_size=10, sink_factory=lambda: sink, event_log=Events())
+
+
+def stored_videos(sink) -> list[str]:
+    if isinstance(sink, MongoSink):
+        return sorted(doc["_id"] for doc in sink.videos.find())
+    return [row[0] for row in sink.cursor.execute("SELECT V_ID FROM Video ORDER BY V_ID")]
+
+
+def test_write_batch_returns_the_new_videos(sink, worker):
+    assert sink.write_batch(worker.batch_rows([make_record(1), make_record(2)])) == {"v00001", "v00002"}
+    # a resent video is skipped, not inserted twice
+    assert sink.write_batch(worker.batch_rows([make_record(2), make_record(3)])) == {"v00003"}
+    assert stored_videos(sink) == ["v00001", "v00002", "v00003"]
+
+
+def test_names_differing_in_case_are_one_row(sink, worker):
+    records = [make_record(1, tags=["Rock", "rock ", " ROCK", "Live"], categories=["Music", "MUSIC"]),
+               make_record(2, tags=["rock"], categories=["music"])]
+    rows = worker.batch_rows(records)
+    assert [row["Tag"] for row in rows["Tags"]] == ["Rock", "Live", "rock"]
+    assert [row["CT_Category"] for row in rows["VideoCategory"]] == ["Music", "music"]
+    sink.write_batch(rows)
+    if isinstance(sink, MongoSink):
+        assert sink.videos.find_one({"_id": "v00001"})["Categories"] == ["Music"]
+        return
+    assert sink.cursor.execute("SELECT COUNT(*) FROM Category").fetchone()[0] == 1
+    assert sink.cursor.execute("SELECT COUNT(*) FROM VideoCategoryJunc").fetchone()[0] == 2
+    # a later batch with another spelling resolves to the same category and tag rows
+    sink.write_batch(worker.batch_rows([make_record(3, tags=["ROCK"], categories=["MuSiC"])]))
+    assert sink.cursor.execute("SELECT COUNT(*) FROM Category").fetchone()[0] == 1
+    assert sink.cursor.execute("SELECT COUNT(*) FROM Tags WHERE VT_V = 'v00001'").fetchone()[0] == 2
+
+
+def test_failed_batch_falls_back_to_single_records(sink, worker):
+    write_batch = sink.write_batch
+
+    def reject_bad(rows):
+        if any(row["V_ID"] == "bad" for row in rows["Video"]):
+            raise sink.errors[0]("rejected")
+        return write_batch(rows)
+    sink.write_batch = reject_bad
+
+    records = [make_record(1), make_record(2, video_id="bad"), make_record(3)]
+    assert worker.process_batch(records, sink) == 1
+    assert stored_videos(sink) == ["v00001", "v00003"]
+    messages = [message for message, _ in worker.event_log.logged]
+    assert messages[0].startswith("batch of 3 failed, retrying per record")
+    assert worker.event_log.logged[1] == ("rejected", ["bad"])
+
+
+# ______MONGO______
+def test_mongo_ignores_duplicate_keys_only(monkeypatch):
+    from pymongo.errors import BulkWriteError
+    sink = MongoSink(client=mongomock.MongoClient())
+    docs = [{"_id": "a"}, {"_id": "b"}]
+    assert sink.insert_missing(sink.videos, docs) == {"a", "b"}
+    assert sink.insert_missing(sink.videos, docs + [{"_id": "c"}]) == {"c"}  # E11000 for a and b
+
+    def fail(requests, ordered=True):
+        raise BulkWriteError({"writeErrors": [{"index": 0, "code": 11000}, {"index": 1, "code": 121}]})
+    monkeypatch.setattr(sink.videos, "bulk_write", fail)
+    with pytest.raises(BulkWriteError):
+        sink.insert_missing(sink.videos, [{"_id": "d"}, {"_id": "e"}])  # a validation error is not a duplicate
+    sink.close()
+
+
+def test_sqlite_rolls_back_a_failed_batch(tmp_path):
+    sink = SQLiteSink(str(tmp_path / "youtube.db"))
+    worker = ETLWorker(batch_size=10, sink_factory=lambda: sink)
+    rows = worker.batch_rows([make_record(1)])
+    rows["Tags"].append({"Tag": "x", "VT_V": "missing"})  # breaks the Tags -> Video foreign key
+    with pytest.raises(sqlite3.Error):
+        sink.write_batch(rows)
+    assert not sink.conn.in_transaction
+    assert stored_videos(sink) == []
+    sink.close()
@@ -0,0 +1,79 @@
+import json
+
+from spool import Spool
+from tests.stubs import make_record
+
+
+def ids(records) -> list[str]:
+    return [record.video_id for record in records]
+
+
+def crash(spool: Spool):
+    # a killed process: buffers are already flushed to the OS, nothing else happens
+    spool.writer.close()
+    if spool.reader is not None:
+        spool.reader[1].close()
+
+
+def test_uncommitted_batches_are_read_again_after_a_crash(tmp_path):
+    spool = Spool(str(tmp_path))
+    for n in range(10):
+        spool.append(make_record(n))
+    first, first_position = spool.read_batch(4, timeout=0)
+    second, _ = spool.read_batch(4, timeout=0)
+    spool.commit(first_position)
+    crash(spool)
+
+    restarted = Spool(str(tmp_path))
+    records, _ = restarted.read_batch(100, timeout=0)
+    assert ids(first) == [f"v{n:05d}" for n in range(4)]
+    assert ids(records) == [f"v{n:05d}" for n in range(4, 10)]  # the second batch was never committed
+    assert ids(second) == ids(records)[:4]
+    restarted.close()
+
+
+def test_commit_only_moves_past_finished_batches(tmp_path):
+    spool = Spool(str(tmp_path))
+    for n in range(6):
+        spool.append(make_record(n))
+    _, first = spool.read_batch(3, timeout=0)
+    _, second = spool.read_batch(3, timeout=0)
+    spool.commit(second)  # a faster loader finished the later batch first
+    assert spool.committed != second
+    spool.commit(first)
+    assert spool.committed == second
+    index = json.loads((tmp_path / Spool.INDEX_NAME).read_text(encoding="utf-8"))
+    assert (index["segment"], index["offset"]) == second
+    spool.close()
+
+
+def test_torn_record_is_skipped_and_replay_returns_everything(tmp_path, capsys):
+    spool = Spool(str(tmp_path))
+    for n in range(3):
+        spool.append(make_record(n))
+    crash(spool)
+    with open(spool.segment_path(1), "ab") as f:
+        f.write(b'{"video_id": "torn", "ti')  # the process died in the middle of a line
+
+    restarted = Spool(str(tmp_path))
+    assert restarted.active_segment == 2  # a new segment, the torn line is never appended to
+    restarted.append(make_record(3))
+    records, position = restarted.read_batch(100, timeout=0)
+    assert ids(records) == [f"v{n:05d}" for n in range(4)]
+    assert position == (2, restarted.segment_path(2).stat().st_size)
+    assert "skipping torn record at the end of segment 1" in capsys.readouterr().out
+    assert ids(restarted.replay()) == [f"v{n:05d}" for n in range(4)]
+    assert ids(restarted.replay((2, 0))) == ["v00003"]
+    restarted.close()
+
+
+def test_segments_roll_and_committed_ones_are_pruned(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=600, retain_bytes=0)
+    for n in range(12):
+        spool.append(make_record(n))
+    assert len(spool.segments()) > 2
+    records, position = spool.read_batch(100, timeout=0)
+    assert len(records) == 12
+    spool.commit(position)
+    assert spool.segments() == [position[0]]  # everything before the committed segment is gone
+    spool.close()
@@ -0,0 +1,137 @@
+"""
+SqlServerSink's category cache against a pyodbc stand-in: the MERGE statements run as INSERT OR IGNORE on
+a SQLite file with SQLiteSink's schema (CT_Category compares case-insensitively, as the server collation
+does), one connection per sink. HOLDLOCK serializes concurrent MERGEs on the server; here they run in turn.
+"""
+import re
+import sqlite3
+import sys
+import types
+
+import pytest
+
+from etl_worker import ETLWorker
+from sinks import TABLE_COLUMNS, TABLE_KEYS, SQLiteSink, SqlServerSink
+from tests.stubs import make_record
+
+
+class FakeCursor:
+    def __init__(self, conn: sqlite3.Connection, statements: list, fail_on: set):
+        self.conn = conn
+        self.statements = statements
+        self.fail_on = fail_on
+        self.rows = []
+
+    def execute(self, sql: str, params=()):
+        merge = re.match(r"\s*MERGE (\w+)", sql)
+        if merge is None:
+            self.statements.append(sql.split()[0])
+            self.rows = self.conn.execute(sql, params).fetchall()
+            return
+        table = merge.group(1)
+        self.statements.append(f"MERGE {table}")
+        if table in self.fail_on:
+            raise FakePyodbc.Error(f"write to {table} failed")
+        columns = ["CT_Category"] if table == "Category" else TABLE_COLUMNS[table]
+        self.rows = []
+        for start in range(0, len(params), len(columns)):
+            values = params[start:start + len(columns)]
+            inserted = self.conn.execute(f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+                                         f"VALUES ({', '.join(['?'] * len(columns))})", values)
+            if inserted.rowcount:
+                row = dict(zip(columns, values))
+                self.rows.append((inserted.lastrowid, values[0]) if table == "Category"
+                                 else tuple(row[key] for key in TABLE_KEYS[table]))
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.statements = []
+        self.fail_on = set()
+
+    def cursor(self):
+        return FakeCursor(self.conn, self.statements, self.fail_on)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+class FakePyodbc(types.ModuleType):
+    class Error(Exception):
+        pass
+
+    def __init__(self):
+        super().__init__("pyodbc")
+        self.connect = FakeConnection
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyodbc", FakePyodbc())
+    path = str(tmp_path / "server.db")
+    SQLiteSink(path).close()  # the tables of database/Database Creation.sql
+    return path
+
+
+def batch(*records) -> dict:
+    return ETLWorker(sink_factory=lambda: None).batch_rows(list(records))
+
+
+def categories(path: str) -> list[tuple]:
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT CT_ID, CT_Category FROM Category ORDER BY CT_ID").fetchall()
+
+
+def junction(path: str) -> dict:
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT VC_V, CT_Category FROM VideoCategoryJunc JOIN Category ON CT_ID = VC_CT"))
+
+
+def test_two_writers_share_one_new_category(db):
+    first, second = SqlServerSink(db), SqlServerSink(db)
+    first.write_batch(batch(make_record(1, categories=["Music"])))
+    second.write_batch(batch(make_record(2, categories=["Music"])))  # both have loaded the cache already
+    first.write_batch(batch(make_record(3, categories=["Gaming"])))
+    second.write_batch(batch(make_record(4, categories=["gaming"])))  # MERGE matches, the SELECT finds the ID
+
+    assert [name for _, name in categories(db)] == ["Music", "Gaming"]
+    gaming = categories(db)[1][0]
+    assert first.category_ids["gaming"] == second.category_ids["gaming"] == gaming
+    assert junction(db) == {"v00001": "Music", "v00002": "Music", "v00003": "Gaming", "v00004": "Gaming"}
+    first.close()
+    second.close()
+
+
+def test_cached_categories_need_no_statement(db):
+    sink = SqlServerSink(db)
+    sink.write_batch(batch(make_record(1, categories=["Music"])))
+    sink.conn.statements.clear()
+    sink.write_batch(batch(make_record(2, categories=["MUSIC"])))
+    assert "MERGE Category" not in sink.conn.statements and "SELECT" not in sink.conn.statements
+    sink.close()
+
+
+def test_rolled_back_ids_are_resolved_again(db):
+    sink, other = SqlServerSink(db), SqlServerSink(db)
+    sink.conn.fail_on.add("VideoCategoryJunc")
+    with pytest.raises(FakePyodbc.Error):
+        sink.write_batch(batch(make_record(1, categories=["Fresh"])))  # the MERGE handed out an ID, then rolled back
+    assert categories(db) == [] and sink.category_ids == {}
+
+    other.write_batch(batch(make_record(2, categories=["Other"])))  # may take the ID "Fresh" had
+    sink.conn.fail_on.clear()
+    sink.write_batch(batch(make_record(1, categories=["Fresh"])))
+    assert junction(db) == {"v00001": "Fresh", "v00002": "Other"}
+    assert sink.category_ids == {"fresh": categories(db)[1][0], "other": categories(db)[0][0]}
+    sink.close()
+    other.close()
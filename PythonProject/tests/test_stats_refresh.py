@@ -0,0 +1,65 @@
+import pytest
+
+from query_scheduler import QueryScheduler, RequestBudget
+from sinks import SQLiteSink
+from stats_refresh import StatsRefresher
+from yt_search import YTSearch
+from tests.stubs import FakePool, FakeYoutubeDL
+
+
+@pytest.fixture
+def sink(tmp_path):
+    sink = SQLiteSink(str(tmp_path / "youtube.db"))
+    sink.cursor.executemany("INSERT INTO Playlist (P_ID) VALUES (?)", [("PL1",), ("PL2",)])
+    sink.cursor.executemany(
+        "INSERT INTO Video (V_ID, V_Title, V_URL, V_Views, V_Likes, V_P_ID, V_StatsUpdated) "
+        "VALUES (?, ?, '', ?, ?, ?, datetime('now', '-3 days'))",
+        [("a1", "a1", 10, 1, "PL1"), ("a2", "a2", 20, 2, "PL1"), ("a3", "a3", 30, 3, "PL1"),
+         ("b1", "b1", 40, 4, "PL2"), ("gone", "gone", 50, 5, "PL2")])
+    yield sink
+    sink.close()
+
+
+def refresher(sink, ydl, **kwargs) -> StatsRefresher:
+    search = YTSearch(pool=FakePool(ydl), scheduler=QueryScheduler(["refresh"], RequestBudget(None)))
+    return StatsRefresher(sink_factory=lambda: sink, search=search, batch_size=10, **kwargs)
+
+
+def counters(sink) -> dict:
+    return {row[0]: (row[1], row[2]) for row in sink.cursor.execute("SELECT V_ID, V_Views, V_Likes FROM Video")}
+
+
+CATALOG = {"a1": (11, 1), "a2": (20, 2), "a3": (33, 7), "b1": (40, 9)}
+PLAYLISTS = {"PL1": ["a1", "a2", "a3"], "PL2": ["b1"]}
+
+
+def test_per_video_round_writes_changed_counters(sink):
+    ydl = FakeYoutubeDL(CATALOG, PLAYLISTS)
+    counts = refresher(sink, ydl, full_every=1).refresh_once(sink)
+    assert counts == {"changed": 3, "unchanged": 1, "unavailable": 1}
+    assert len(ydl.requests) == 5
+    assert counters(sink) == {"a1": (11, 1), "a2": (20, 2), "a3": (33, 7), "b1": (40, 9), "gone": (50, 5)}
+    assert sink.stale_videos(10, min_age_hours=1) == []  # every video was stamped, the unavailable one too
+
+
+def test_playlist_round_reads_each_playlist_once(sink):
+    ydl = FakeYoutubeDL(CATALOG, PLAYLISTS)
+    counts = refresher(sink, ydl, full_every=4, min_playlist_videos=2).refresh_once(sink)
+    # PL1 is read flat (views only), PL2's two candidates too: "gone" is not listed, so it is unavailable
+    assert sorted(ydl.requests) == ["https://www.youtube.com/playlist?list=PL1",
+                                    "https://www.youtube.com/playlist?list=PL2"]
+    assert counts == {"changed": 2, "unchanged": 2, "unavailable": 1}
+    assert counters(sink)["a3"] == (33, 3)  # likes wait for the next full round
+
+
+def test_waits_for_a_paused_discovery_budget(sink, clock):
+    discovery = RequestBudget(clock=clock, sleep=clock.sleep, error_threshold=1, backoff_base=8.0)
+    discovery.failure()
+    resumes_at = discovery.paused_until
+    requested_at = []
+    ydl = FakeYoutubeDL(CATALOG, PLAYLISTS, on_request=lambda url: requested_at.append(clock()))
+    refresh = refresher(sink, ydl, full_every=1, yield_to=discovery)
+    assert refresh.read_video("a1") == {"V_Views": 11, "V_Likes": 1}
+    assert requested_at == [resumes_at]  # no refresh request while the crawler is backing off
+    assert refresh.read_video("a2") is not None
+    assert len(clock.sleeps) == 1  # once the pause is over the refresher does not wait again
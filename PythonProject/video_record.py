@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+
+
+@dataclass(slots=True)
+class VideoRecord:
+    """
+    One video as the ETL needs it, projected straight from the yt_dlp info dict: ~20 fields instead of
+    the full payload with formats, thumbnails and captions. `raw` holds the complete JSON-safe info dict
+    only when YTSearch was created with keep_raw=True.
+    """
+    video_id: str | None
+    title: str | None
+    video_url: str | None
+    availability: str | None = None
+    channel: str | None = None
+    channel_id: str | None = None
+    channel_url: str | None = None
+    uploader: str | None = None
+    duration: int | None = None
+    view_count: int | None = None
+    like_count: int | None = None
+    upload_date: str | None = None  # YYYYMMDD as yt_dlp reports it
+    description: str | None = None
+    playable_in_embed: bool | None = None
+    tags: list | None = None
+    categories: list | None = None
+    playlist_id: str | None = None
+    playlist_title: str | None = None
+    playlist_url: str | None = None
+    playlist_index: int | None = None
+    raw: dict | None = None
+
+    @classmethod
+    def from_info(cls, metadata: dict, item: dict, video_url: str, pl_id, pl_title, playlist_url,
+                  raw: dict | None = None) -> "VideoRecord":
+        get = metadata.get
+        return cls(
+            video_id=get("id"),
+            title=get("title"),
+            video_url=video_url,
+            availability=get("availability"),
+            channel=get("channel"),
+            channel_id=get("channel_id"),
+            channel_url=get("channel_url"),
+            uploader=get("uploader"),
+            duration=get("duration"),
+            view_count=get("view_count"),
+            like_count=get("like_count"),
+            upload_date=get("upload_date"),
+            description=get("description"),
+            playable_in_embed=get("playable_in_embed"),
+            tags=list(get("tags") or []),
+            categories=list(get("categories") or []),
+            playlist_id=pl_id,
+            playlist_title=pl_title,
+            playlist_url=playlist_url,
+            playlist_index=item.get("playlist_index"),
+            raw=raw,
+        )
+
+    @classmethod
+    def from_dict(cls, record: dict) -> "VideoRecord":
+        """Legacy dict records: YTSearch's old output, JSON dumps of it and the {"YtMetadata": record} Mongo documents."""
+        inner = record.get("YtMetadata")
+        if isinstance(inner, dict) and isinstance(inner.get("YtMetadata"), dict):
+            record = inner
+        yt_meta = record.get("YtMetadata") or {}
+        projected = cls.from_info(yt_meta, {"playlist_index": record.get("PlaylistIndex")}, record.get("VideoUrl"),
+                                  record.get("PlaylistId"), record.get("PlaylistTitle"), record.get("PlaylistUrl"))
+        projected.video_id = projected.video_id or record.get("VideoId")
+        return projected
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def coerce(cls, record) -> "VideoRecord":
+        return record if isinstance(record, cls) else cls.from_dict(record)
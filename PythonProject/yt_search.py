@@ -1,16 +1,101 @@
-import random
+import queue
+import threading
+import time
 import urllib.parse
-from datetime import datetime
-import yt_dlp
-from yt_dlp.utils import DownloadError
-from wordfreq import top_n_list
+from contextlib import contextmanager
 import json
+from startup import lazy_import
+from video_record import VideoRecord
+from query_scheduler import QueryScheduler
+from instrumentation import STAGE_SECONDS, VIDEOS_FETCHED, DUPLICATES_SKIPPED, DOWNLOAD_ERRORS, OUTBOUND_REQUESTS
+
+yt_dlp = lazy_import("yt_dlp")  # ~0.3 s of imports, paid by the first extraction instead of at startup
+
+
+class YoutubeDLPool:
+    """
+    Keeps long-lived YoutubeDL instances per flavor (e.g. "flat" and "full") so extractors and HTTP
+    sessions are set up once instead of on every extract_info call. A YoutubeDL instance is not safe
+    to use from two threads at once, so each checkout gets exclusive use of one instance; at most
+    `size` instances exist per flavor and further callers wait for one to be returned. Instances are
+    closed and replaced after max_uses checkouts or max_age_s seconds.
+    """
+    def __init__(self, opts_by_flavor: dict, size: int = 1, max_uses: int = 500, max_age_s: float = 1800,
+                 factory=None):
+        self.opts_by_flavor = opts_by_flavor
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.max_age_s = max_age_s
+        self.factory = factory  # None: yt_dlp.YoutubeDL, resolved on first use
+        self.idle = {flavor: queue.LifoQueue() for flavor in opts_by_flavor}
+        self.created = {flavor: 0 for flavor in opts_by_flavor}
+        self.lock = threading.Lock()
+
+    def acquire(self, flavor: str) -> list:
+        # entries are [ydl, uses, created_at]
+        while True:
+            try:
+                return self.idle[flavor].get_nowait()
+            except queue.Empty:
+                pass
+            with self.lock:
+                if self.created[flavor] < self.size:
+                    self.created[flavor] += 1
+                    break
+            try:
+                return self.idle[flavor].get(timeout=0.5)
+            except queue.Empty:
+                continue  # an instance may have been recycled meanwhile, re-check capacity
+        try:
+            return [(self.factory or yt_dlp.YoutubeDL)(self.opts_by_flavor[flavor]), 0, time.monotonic()]
+        except Exception:
+            with self.lock:
+                self.created[flavor] -= 1
+            raise
+
+    def release(self, flavor: str, entry: list):
+        entry[1] += 1
+        if entry[1] >= self.max_uses or time.monotonic() - entry[2] >= self.max_age_s:
+            self.discard(flavor, entry)
+        else:
+            self.idle[flavor].put(entry)
+
+    def discard(self, flavor: str, entry: list):
+        close = getattr(entry[0], "close", None)
+        if close:
+            close()
+        with self.lock:
+            self.created[flavor] -= 1
+
+    @contextmanager
+    def checkout(self, flavor: str):
+        entry = self.acquire(flavor)
+        try:
+            yield entry[0]
+        finally:
+            self.release(flavor, entry)
+
+    def close(self):
+        for flavor, idle in self.idle.items():
+            while True:
+                try:
+                    entry = idle.get_nowait()
+                except queue.Empty:
+                    break
+                self.discard(flavor, entry)
 
 
 class YTSearch:
-    def __init__(self):
+    def __init__(self, pool: YoutubeDLPool | None = None, seen=None, keep_raw: bool = False,
+                 word_list: list[str] | None = None, scheduler: QueryScheduler | None = None):
+        self.seen = seen  # optional SeenIndex: known videos are skipped before extraction
+        self.keep_raw = keep_raw  # also carry the full sanitized info dict on every record (VideoRecord.raw)
         self.RATE_LIMIT_BYTES_PER_SEC = 3 * 1024 * 1024  # 3 MB/s
-        self.WORD_LIST = top_n_list("en", 50000)  # random word list
+        # picks the queries and paces every extract_info call; ETLWorker shares one between its fetchers
+        self.scheduler = scheduler or QueryScheduler(word_list)  # a shard passes its own slice of words
+        self.WORD_LIST = self.scheduler.word_list
+        self.query_requests = 0  # outbound requests and new playlists of the current query
+        self.query_playlists = 0
 
         self.QUIET_LOGGER = self.QuietLogger()
 
@@ -25,6 +110,13 @@ class YTSearch:
             "socket_timeout": 30,
         }
 
+        self.pool = pool or YoutubeDLPool({
+            "flat": {**self.COMMON_YTDLP_OPTS, "extract_flat": True},
+            "full": self.COMMON_YTDLP_OPTS,
+            # view/like counts only (StatsRefresher): no HLS/DASH manifest requests
+            "stats": {**self.COMMON_YTDLP_OPTS, "extractor_args": {"youtube": {"skip": ["hls", "dash", "translated_subs"]}}},
+        })
+
     class QuietLogger:
         def debug(self, msg): pass
         def info(self, msg): pass
@@ -32,9 +124,27 @@ class YTSearch:
         def error(self, msg): pass
 
     # ---------------- HELPERS ----------------
-    def random_query(self):
-        n = random.choice([1, 2, 2, 3])
-        return " ".join(random.choices(self.WORD_LIST, k=n))
+    def next_query(self):
+        return self.scheduler.next_query()
+
+    def extract(self, flavor: str, url: str, stage: str):
+        """One outbound request: waits for the shared request budget and reports the outcome back to it."""
+        self.scheduler.budget.acquire()
+        self.query_requests += 1
+        OUTBOUND_REQUESTS.labels(stage=stage).inc()
+        try:
+            with self.pool.checkout(flavor) as ydl, STAGE_SECONDS.time(stage=stage):
+                info = ydl.extract_info(url, download=False)
+        except yt_dlp.utils.DownloadError:
+            DOWNLOAD_ERRORS.labels(stage=stage).inc()
+            self.scheduler.budget.failure()
+            raise
+        # with ignoreerrors yt_dlp reports failed extractions (throttling included) as None
+        if isinstance(info, dict):
+            self.scheduler.budget.success()
+        else:
+            self.scheduler.budget.failure()
+        return info
 
     @staticmethod
     def sanitize_for_json(obj):
@@ -53,98 +163,104 @@ class YTSearch:
             return f"https://www.youtube.com/watch?v={urllib.parse.quote_plus(video_id)}"
         return video_url or ""
 
+    @staticmethod
+    def build_record(metadata: dict, item: dict, video_url: str, pl_id, pl_title, playlist_url,
+                     keep_raw: bool = False) -> VideoRecord:
+        # only the fields the ETL stores are copied; the JSON round trip of the whole info dict
+        # (formats, thumbnails, captions) is only paid when the raw payload is asked for
+        with STAGE_SECONDS.time(stage="project"):
+            record = VideoRecord.from_info(metadata, item, video_url, pl_id, pl_title, playlist_url)
+        if keep_raw:
+            with STAGE_SECONDS.time(stage="sanitize"):
+                record.raw = YTSearch.sanitize_for_json(metadata)
+        return record
+
     # ---------------- MAIN FUNCTION ----------------
-    def fetch_random_video_metadata(self, max_attempts=10) -> dict | None:
-        for attempt in range(max_attempts):
-            query = self.random_query()
-            search_url = self.make_playlist_search_url(query)
+    def iter_video_metadata(self, max_queries: int | None = None):
+        """
+        Lazily yields a record for every video of every playlist candidate of each search.
+        Runs until max_queries searches have been used up, or forever when it is None.
+        What every query produced per request is credited back to the scheduler.
+        """
+        query_count = 0
+        while max_queries is None or query_count < max_queries:
+            query_count += 1
+            query = self.next_query()
+            self.query_requests = self.query_playlists = 0
+            new_videos = 0
+            try:
+                for record in self.iter_query(query, query_count, max_queries):
+                    new_videos += 1
+                    yield record
+            finally:
+                self.scheduler.credit(query, self.query_requests, new_videos, self.query_playlists)
+
+    def iter_query(self, query: str, query_count: int, max_queries: int | None):
+        search_url = self.make_playlist_search_url(query)
+
+        print(f"[SEARCH] Query {query_count}{f'/{max_queries}' if max_queries else ''} - query=\"{query}\"")
+
+        try:
+            search_results = self.extract("flat", search_url, "search")
+        except yt_dlp.utils.DownloadError:
+            return
+
+        if not isinstance(search_results, dict):
+            return
 
-            print(f"[SEARCH] Attempt {attempt+1}/{max_attempts} - query=\"{query}\"")
+        playlist_entries = list(search_results.get("entries") or [])
+        print(f"[SEARCH] Found {len(playlist_entries)} playlist candidates")
+
+        for playlist in playlist_entries:
+            if not isinstance(playlist, dict):
+                continue
+
+            playlist_url = playlist.get("url") or playlist.get("webpage_url")
+            if not playlist_url:
+                continue
 
             try:
-                with yt_dlp.YoutubeDL(
-                    {**self.COMMON_YTDLP_OPTS, "extract_flat": True}
-                ) as ydl:
-                    search_results = ydl.extract_info(search_url, download=False)
-            except DownloadError:
+                pl_data = self.extract("flat", playlist_url, "playlist")
+            except yt_dlp.utils.DownloadError:
                 continue
 
-            if not isinstance(search_results, dict):
+            if not isinstance(pl_data, dict):
                 continue
 
-            playlist_entries = list(search_results.get("entries") or [])
-            print(f"[SEARCH] Found {len(playlist_entries)} playlist candidates")
+            pl_id = pl_data.get("id")
+            pl_title = pl_data.get("title")
+            pl_entries = list(pl_data.get("entries") or [])
+            # a known playlist is still listed: a crawl interrupted halfway through it left videos to fetch,
+            # and the per-video check below skips the ones already stored
+            if not (self.seen is not None and self.seen.has_playlist(pl_id)):
+                self.query_playlists += 1
 
-            for playlist in playlist_entries:
-                if not isinstance(playlist, dict):
+            print(f"[PLAYLIST] {pl_title} ({len(pl_entries)} videos)")
+            for item in pl_entries:
+                if not isinstance(item, dict):
                     continue
 
-                playlist_url = playlist.get("url") or playlist.get("webpage_url")
-                if not playlist_url:
+                video_id = item.get("id")
+                if not video_id:
+                    continue
+                if self.seen is not None and self.seen.has_video(video_id):
+                    DUPLICATES_SKIPPED.labels(kind="video").inc()
                     continue
 
+                video_url = self.normalize_video_url(video_id, item.get("url"))
                 try:
-                    with yt_dlp.YoutubeDL(
-                        {**self.COMMON_YTDLP_OPTS, "extract_flat": True}
-                    ) as ydl:
-                        pl_data = ydl.extract_info(playlist_url, download=False)
-                except DownloadError:
+                    metadata = self.extract("full", video_url, "video")
+                except yt_dlp.utils.DownloadError:
                     continue
 
-                if not isinstance(pl_data, dict):
+                if not isinstance(metadata, dict):
                     continue
 
-                pl_id = pl_data.get("id")
-                pl_title = pl_data.get("title")
-                pl_entries = list(pl_data.get("entries") or [])
-
-                print(f"[PLAYLIST] {pl_title} ({len(pl_entries)} videos)")
-                for item in pl_entries:
-                    if not isinstance(item, dict):
-                        continue
-
-                    video_id = item.get("id")
-                    if not video_id:
-                        continue
-
-                    video_url = self.normalize_video_url(video_id, item.get("url"))
-                    try:
-                        with yt_dlp.YoutubeDL(self.COMMON_YTDLP_OPTS) as ydl:
-                            metadata = ydl.extract_info(video_url, download=False)
-                    except DownloadError:
-                        continue
-
-                    if not isinstance(metadata, dict):
-                        continue
-
-                    upload_date = metadata.get("upload_date")
-                    upload_date_obj = None
-                    if upload_date and len(upload_date) == 8:
-                        try:
-                            upload_date_obj = datetime.strptime(upload_date, "%Y%m%d").date()
-                        except ValueError:
-                            pass
-
-                    record = {
-                        "VideoId": metadata.get("id"),
-                        "VideoTitle": metadata.get("title"),
-                        "Availability": metadata.get("availability"),
-                        "VideoUrl": video_url,
-                        "Channel": metadata.get("channel"),
-                        "ChannelId": metadata.get("channel_id"),
-                        "Uploader": metadata.get("uploader"),
-                        "DurationSeconds": metadata.get("duration"),
-                        "ViewCount": metadata.get("view_count"),
-                        "LikeCount": metadata.get("like_count"),
-                        "UploadDate": upload_date_obj,
-                        "YtMetadata": self.sanitize_for_json(metadata),
-                        "PlaylistId": pl_id,
-                        "PlaylistTitle": pl_title,
-                        "PlaylistUrl": playlist_url,
-                        "PlaylistIndex": item.get("playlist_index"),
-                    }
-
-                    print(f"[FOUND] {record['VideoTitle']} (Playlist: {pl_title})")
-                    return record
-
-        return None
\ No newline at end of file
+                record = self.build_record(metadata, item, video_url, pl_id, pl_title, playlist_url, self.keep_raw)
+                VIDEOS_FETCHED.inc()
+                print(f"[FOUND] {record.title} (Playlist: {pl_title})")
+                yield record
+
+    def fetch_random_video_metadata(self, max_attempts=10) -> VideoRecord | None:
+        # kept for single-shot callers; streaming consumers should use iter_video_metadata()
+        return next(self.iter_video_metadata(max_attempts), None)